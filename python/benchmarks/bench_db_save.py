@@ -0,0 +1,53 @@
+"""Full vs incremental save_state_to_db after a small change.
+
+Usage: PYTHONPATH=src python benchmarks/bench_db_save.py [--pods N ...] [--changes N]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from kclone.db import save_state_to_db
+from kclone.models import Node, PodSpec
+from kclone.state import ClusterState
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run(n_pods: int, n_changes: int, path: str) -> None:
+    state = ClusterState()
+    state.add_node(Node(name="n", cpu_capacity=64, mem_capacity=65536))
+    spec = PodSpec(name="web", image="nginx", labels={"app": "web"})
+    uids = [state.add_pod(spec, name=f"web-{i}").uid for i in range(n_pods)]
+    initial = timed(save_state_to_db, state, path)
+
+    for uid in uids[:n_changes]:
+        state.set_pod_labels(uid, {"app": "web", "rev": "2"})
+    full = timed(save_state_to_db, state, path, full=True)
+
+    for uid in uids[:n_changes]:
+        state.set_pod_labels(uid, {"app": "web", "rev": "3"})
+    incremental = timed(save_state_to_db, state, path)
+
+    print(f"pods={n_pods:7d} changed={n_changes}  first save={initial * 1000:8.1f} ms  full={full * 1000:8.1f} ms  incremental={incremental * 1000:7.2f} ms  speedup={full / incremental:7.1f}x")
+    state.close()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, nargs="+", default=[10_000, 100_000])
+    p.add_argument("--changes", type=int, default=10)
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, n in enumerate(args.pods):
+            run(n, args.changes, os.path.join(tmp, f"bench-{i}.db"))
+
+
+if __name__ == "__main__":
+    main()
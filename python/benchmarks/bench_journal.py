@@ -0,0 +1,61 @@
+"""Full JSON save vs journaling after a small change, and recovery time.
+
+Usage: PYTHONPATH=src python benchmarks/bench_journal.py [--pods N ...] [--changes N]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from kclone.journal import Journal, recover_state
+from kclone.models import Node, PodSpec
+from kclone.persistence import save_state
+from kclone.state import ClusterState
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run(n_pods: int, n_changes: int, tmp: str) -> None:
+    state = ClusterState()
+    state.add_node(Node(name="n", cpu_capacity=64, mem_capacity=65536))
+    spec = PodSpec(name="web", image="nginx", labels={"app": "web"})
+    uids = [state.add_pod(spec, name=f"web-{i}").uid for i in range(n_pods)]
+    directory = os.path.join(tmp, f"journal-{n_pods}")
+    journal = Journal(state, directory, snapshot_every=10 * n_changes)
+
+    def change(rev: str) -> None:
+        for uid in uids[:n_changes]:
+            state.set_pod_labels(uid, {"app": "web", "rev": rev})
+
+    change("2")
+    full = timed(save_state, state, os.path.join(tmp, f"state-{n_pods}.json"))
+
+    start = time.perf_counter()
+    change("3")
+    journal.sync()
+    journaled = time.perf_counter() - start
+    journal.close()
+    recovery = timed(recover_state, directory)
+
+    print(f"pods={n_pods:7d} changed={n_changes}  full save={full * 1000:8.1f} ms  journal={journaled * 1000:7.2f} ms  speedup={full / journaled:7.1f}x  recover={recovery * 1000:8.1f} ms")
+    state.close()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, nargs="+", default=[10_000, 100_000])
+    p.add_argument("--changes", type=int, default=10)
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.pods:
+            run(n, args.changes, tmp)
+
+
+if __name__ == "__main__":
+    main()
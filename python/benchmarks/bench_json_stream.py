@@ -0,0 +1,87 @@
+"""Memory of saving/loading JSON as one document vs streamed records.
+
+Reports the traced peak above what the process held before the call; for
+loads, also what the loaded state itself keeps.
+
+Usage: PYTHONPATH=src python benchmarks/bench_json_stream.py [--pods N ...] [--suffix .json.gz]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from kclone.models import Node, PodSpec
+from kclone.persistence import _dict_to_state, load_state, save_state, snapshot_to_dict
+from kclone.state import ClusterState
+
+
+# the pre-streaming save and load, kept here for comparison
+def save_document(state: ClusterState, path: str) -> None:
+    payload = snapshot_to_dict(state.snapshot(wait=True), state._uid_counter, state._vip_counter)
+    Path(path).write_text(json.dumps(payload, indent=2))
+
+
+def load_document(path: str) -> ClusterState:
+    return _dict_to_state(json.loads(Path(path).read_text()))
+
+
+def traced(fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, (peak - base) / 2**20, (current - base) / 2**20
+
+
+def build(n_pods: int) -> ClusterState:
+    state = ClusterState()
+    for i in range(max(1, n_pods // 100)):
+        state.add_node(Node(name=f"n{i}", cpu_capacity=1000, mem_capacity=1 << 20))
+    spec = PodSpec(name="web", image="nginx", labels={"app": "web", "tier": "frontend"})
+    for i in range(n_pods):
+        state.add_pod(spec, name=f"web-{i}")
+    return state
+
+
+def run(n_pods: int, tmp: str, suffix: str) -> None:
+    doc_path, stream_path = os.path.join(tmp, "doc.json"), os.path.join(tmp, f"stream{suffix}")
+    for label, save, load, path in (
+        ("document", save_document, load_document, doc_path),
+        ("streamed", save_state, load_state, stream_path),
+    ):
+        # a fresh state each time: the document save publishes a snapshot
+        state = build(n_pods)
+        _, save_time, save_peak, _ = traced(save, state, path)
+        state.close()
+        del state
+        loaded, load_time, load_peak, kept = traced(load, path)
+        loaded.close()
+        del loaded
+        print(
+            f"pods={n_pods:7d} {label}: save {save_time:6.2f}s peak +{save_peak:7.1f} MiB  |  "
+            f"load {load_time:6.2f}s peak +{load_peak:7.1f} MiB (state keeps {kept:7.1f} MiB)  size={os.path.getsize(path) / 2**20:6.1f} MiB"
+        )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, nargs="+", default=[100_000])
+    p.add_argument("--suffix", default=".json", help="stream file suffix; .gz/.xz compress")
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.pods:
+            run(n, tmp, args.suffix)
+
+
+if __name__ == "__main__":
+    main()
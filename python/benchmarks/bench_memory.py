@@ -0,0 +1,115 @@
+"""Report bytes per pod for the legacy dict-backed models vs the compact ones.
+
+Usage: PYTHONPATH=src python benchmarks/bench_memory.py [--pods N]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from kclone.controllers import pod_template
+from kclone.models import Deployment, Pod, PodSpec
+from kclone.state import ClusterState
+
+
+# the pre-slots model definitions, kept here for comparison
+@dataclass
+class LegacyHealthCheck:
+    enabled: bool = False
+    initial_delay_sec: int = 0
+    period_sec: int = 10
+    timeout_sec: int = 1
+    failure_threshold: int = 3
+
+
+@dataclass
+class LegacyPodSpec:
+    name: str
+    image: str
+    cpu_request: int = 1
+    mem_request: int = 128
+    labels: Dict[str, str] = field(default_factory=dict)
+    health_check: LegacyHealthCheck = field(default_factory=LegacyHealthCheck)
+    restart_policy: str = "Always"
+
+
+@dataclass
+class LegacyPodStatus:
+    phase: str = "Pending"
+    node_name: Optional[str] = None
+    message: str = ""
+    healthy: bool = True
+    restart_count: int = 0
+    start_time: Optional[float] = None
+
+
+@dataclass
+class LegacyPod:
+    name: str
+    spec: LegacyPodSpec
+    status: LegacyPodStatus = field(default_factory=LegacyPodStatus)
+    uid: str = ""
+    pid: Optional[int] = None
+
+
+DEPLOY = Deployment(name="web", image="nginx:latest", replicas=0, selector={"app": "web"}, labels={"app": "web", "tier": "frontend"})
+
+
+def legacy_pods(n: int) -> list:
+    return [
+        LegacyPod(
+            name=f"web-{i}",
+            spec=LegacyPodSpec(name=f"web-{i}", image=DEPLOY.image, labels={**DEPLOY.labels}),
+            uid=f"pod-{i}",
+        )
+        for i in range(n)
+    ]
+
+
+def compact_pods(n: int) -> list:
+    spec = pod_template(DEPLOY)
+    return [Pod(name=f"web-{i}", spec=spec, uid=f"pod-{i}") for i in range(n)]
+
+
+def state_pods(n: int) -> ClusterState:
+    state = ClusterState()
+    spec = pod_template(DEPLOY, state)
+    for i in range(n):
+        state.add_pod(spec, name=f"web-{i}")
+    return state
+
+
+def snapshotted_state_pods(n: int) -> tuple:
+    state = state_pods(n)
+    return state, state.snapshot()
+
+
+def measure(build, n: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / n
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, default=100_000)
+    args = p.parse_args()
+
+    legacy = measure(legacy_pods, args.pods)
+    compact = measure(compact_pods, args.pods)
+    print(f"pods={args.pods}")
+    print(f"models only   legacy={legacy:8.0f} B/pod  compact={compact:8.0f} B/pod  saved={100 * (1 - compact / legacy):5.1f}%")
+    print(f"ClusterState  with indexes, queue and events={measure(state_pods, args.pods):8.0f} B/pod")
+    print(f"              plus a published snapshot={measure(snapshotted_state_pods, args.pods):8.0f} B/pod")
+
+
+if __name__ == "__main__":
+    main()
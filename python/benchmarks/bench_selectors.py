@@ -0,0 +1,55 @@
+"""Compare selector matching by full scan against the label inverted index.
+
+Usage: PYTHONPATH=src python benchmarks/bench_selectors.py [--pods N] [--services N]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from kclone.models import PodSpec, Service
+from kclone.state import ClusterState
+
+
+def build_state(n_pods: int, n_services: int) -> ClusterState:
+    state = ClusterState()
+    for i in range(n_pods):
+        labels = {"app": f"app-{i % n_services}", "tier": ("web", "db", "cache")[i % 3], "env": "prod" if i % 2 else "dev"}
+        state.add_pod(PodSpec(name=f"p{i}", image="nginx", labels=labels))
+    for i in range(n_services):
+        state.services[f"svc-{i}"] = Service(name=f"svc-{i}", selector={"app": f"app-{i}", "env": "prod"}, port=80, target_port=80, virtual_ip=state.allocate_virtual_ip())
+    return state
+
+
+def refresh_by_scan(state: ClusterState) -> None:
+    # the pre-index implementation: every selector against every pod
+    for service in state.services.values():
+        matched = [pod for pod in state.pods.values() if all(pod.spec.labels.get(k) == v for k, v in service.selector.items())]
+        service.endpoints = [pod.uid for pod in matched if pod.status.phase == "Running"]
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, default=100_000)
+    p.add_argument("--services", type=int, default=1_000)
+    args = p.parse_args()
+
+    state = build_state(args.pods, args.services)
+    scan = timed(refresh_by_scan, state)
+    indexed = timed(state.refresh_service_endpoints)
+    select_scan = timed(lambda: [p for p in state.pods.values() if p.spec.labels.get("app") == "app-1" and p.spec.labels.get("tier") == "db"])
+    select_indexed = timed(state.select_pods, {"app": "app-1", "tier": "db"})
+
+    print(f"pods={args.pods} services={args.services}")
+    print(f"refresh_service_endpoints  scan={scan * 1000:10.1f} ms  indexed={indexed * 1000:8.1f} ms  speedup={scan / indexed:8.1f}x")
+    print(f"select_pods                scan={select_scan * 1000:10.3f} ms  indexed={select_indexed * 1000:8.3f} ms  speedup={select_scan / select_indexed:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
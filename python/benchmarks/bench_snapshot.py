@@ -0,0 +1,80 @@
+"""JSON vs binary snapshot: save time, load time and load memory peak.
+
+The binary load is ``open_snapshot`` plus decoding one pod by uid; the
+objects are decoded lazily, so that is what startup pays.
+
+Usage: PYTHONPATH=src python benchmarks/bench_snapshot.py [--pods N ...] [--binary-only]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from kclone.models import Node, PodSpec
+from kclone.persistence import load_state, save_state
+from kclone.snapshot import open_snapshot
+from kclone.state import ClusterState
+
+
+def measure(fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def peak(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(n_pods: int, tmp: str, binary_only: bool) -> None:
+    state = ClusterState()
+    for i in range(max(1, n_pods // 100)):
+        state.add_node(Node(name=f"n{i}", cpu_capacity=1000, mem_capacity=1 << 20))
+    spec = PodSpec(name="web", image="nginx", labels={"app": "web", "tier": "frontend"})
+    for i in range(n_pods):
+        state.add_pod(spec, name=f"web-{i}")
+    json_path, snap_path = os.path.join(tmp, "state.json"), os.path.join(tmp, "state.snap")
+    _, snap_save = measure(lambda: save_state(state, snap_path))
+    if not binary_only:
+        _, json_save = measure(lambda: save_state(state, json_path))
+    state.close()
+
+    def load_json():
+        load_state(json_path).close()
+
+    def open_binary():
+        with open_snapshot(snap_path) as f:
+            f.pods[f"pod-{n_pods // 2}"]
+
+    _, snap_load = measure(open_binary)
+    snap_peak = peak(open_binary)
+    size = lambda p: os.path.getsize(p) / 2**20
+    line = f"binary: save={snap_save:6.2f}s open={snap_load * 1000:6.1f}ms peak={snap_peak / 2**20:5.2f} MiB size={size(snap_path):6.1f} MiB"
+    if not binary_only:
+        _, json_load = measure(load_json)
+        json_peak = peak(load_json)
+        line = f"json: save={json_save:6.2f}s load={json_load:6.2f}s peak={json_peak / 2**20:7.1f} MiB size={size(json_path):6.1f} MiB  |  " + line
+    print(f"pods={n_pods:8d}  {line}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, nargs="+", default=[100_000])
+    p.add_argument("--binary-only", action="store_true", help="skip JSON, which needs several GB at 1M pods")
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.pods:
+            run(n, tmp, args.binary_only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Latency of state mutations while a Snapshotter saves in the background.
+
+Usage: PYTHONPATH=src python benchmarks/bench_snapshotter.py [--pods N] [--seconds S] [--interval I] [--suffix .snap]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from kclone.models import Node, PodSpec
+from kclone.snapshot import Snapshotter
+from kclone.state import ClusterState
+
+
+def mutate(state: ClusterState, uids, seconds: float):
+    latencies = []
+    end = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < end:
+        uid = uids[i % len(uids)]
+        start = time.perf_counter()
+        state.set_pod_labels(uid, {"app": "web", "rev": str(i)})
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    latencies.sort()
+    return len(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.999)], latencies[-1]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--pods", type=int, default=100_000)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--interval", type=float, default=1.0)
+    p.add_argument("--suffix", default=".snap")
+    args = p.parse_args()
+
+    state = ClusterState()
+    state.add_node(Node(name="n", cpu_capacity=64, mem_capacity=65536))
+    spec = PodSpec(name="web", image="nginx", labels={"app": "web"})
+    uids = [state.add_pod(spec, name=f"web-{i}").uid for i in range(args.pods)]
+    state.snapshot(wait=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshotter = Snapshotter(state, os.path.join(tmp, "state" + args.suffix), args.interval)
+        for label, running in (("no snapshots", False), (f"snapshots every {args.interval}s", True)):
+            if running:
+                snapshotter.start()
+            ops, p50, p999, worst = mutate(state, uids, args.seconds)
+            print(f"{label:>24}: {ops / args.seconds:9.0f} ops/s  p50={p50 * 1e6:6.1f}us  p99.9={p999 * 1e3:6.2f}ms  max={worst * 1e3:6.2f}ms")
+        snapshotter.stop(final=False)
+    state.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Pods started per second when scaling a deployment, exec vs zygote spawning.
+
+A pod counts as started once its worker has bound (has a pid) and written its
+first output, i.e. it is past interpreter start-up and running the workload.
+
+Usage: PYTHONPATH=src python benchmarks/bench_spawn.py [--replicas N]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import psutil
+
+from kclone.controllers import create_deployment, reconcile_deployments
+from kclone.models import Node
+from kclone.state import ClusterState
+
+
+def _started(pid: int) -> bool:
+    try:
+        return psutil.Process(pid).io_counters().write_chars > 0
+    except psutil.NoSuchProcess:
+        return False
+
+
+def scale_up(mode: str, replicas: int) -> tuple:
+    state = ClusterState(spawn_mode=mode)
+    state.add_node(Node(name="n", cpu_capacity=replicas, mem_capacity=replicas * 128))
+    start = time.perf_counter()
+    create_deployment(state, "bench", "nginx", replicas, {"app": "bench"}, {"app": "bench"}, 1, 128)
+    reconcile_deployments(state)
+    bound = time.perf_counter() - start
+    waiting = [pod.pid for pod in state.list_pods() if pod.pid is not None]
+    while waiting:
+        waiting = [pid for pid in waiting if not _started(pid)]
+        time.sleep(0.01)
+    started = time.perf_counter() - start
+    state.remove_pods([pod.uid for pod in state.list_pods()])
+    state.close()
+    return bound, started
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--replicas", type=int, default=500)
+    args = p.parse_args()
+
+    print(f"replicas={args.replicas}")
+    for mode in ("exec", "zygote"):
+        bound, started = scale_up(mode, args.replicas)
+        print(f"{mode:7s} bound in {bound:6.2f} s  all started in {started:6.2f} s  {args.replicas / started:8.1f} pods/s")
+
+
+if __name__ == "__main__":
+    main()
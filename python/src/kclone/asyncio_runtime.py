@@ -0,0 +1,263 @@
+"""Pod worker management on a single asyncio event loop.
+
+``AsyncioRuntime`` runs one event loop on one thread. Spawning, waiting for
+exits, reading worker heartbeats from stdout, termination and liveness
+probes are coroutines on that loop, so supervising thousands of workers
+needs no thread per worker. Callbacks into the cluster state run on one
+separate thread, so the loop never blocks on the state lock.
+
+It offers the same interface ``ClusterState`` uses for ``ProcessSupervisor``
+and ``TerminationPipeline`` (``watch``/``unwatch``, ``submit``/``join``),
+plus ``spawn``.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from .models import HealthCheck
+
+ExitCallback = Callable[[str, "AsyncWorker", int], None]
+UnhealthyCallback = Callable[[str, "AsyncWorker"], None]
+
+
+class AsyncWorker:
+    """``Popen``-like handle for a worker owned by an ``AsyncioRuntime``.
+
+    Safe to use from any thread; signals go straight to the pid.
+    """
+
+    def __init__(self, uid: str, proc: asyncio.subprocess.Process, loop: asyncio.AbstractEventLoop) -> None:
+        self.uid = uid
+        self.pid = proc.pid
+        self.returncode: Optional[int] = None
+        self.last_heartbeat = time.monotonic()
+        self._proc = proc
+        self._exit = loop.create_future()
+        self._exited = threading.Event()
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(f"worker {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def _set_exited(self, code: int) -> None:
+        self.returncode = code
+        self._exited.set()
+        if not self._exit.done():
+            self._exit.set_result(code)
+
+
+def _install_pidfd_watcher(loop: asyncio.AbstractEventLoop) -> None:
+    # Before 3.12 the default child watcher starts a thread per child. Where
+    # pidfds work, swap in the pidfd watcher, which waits on the loop itself.
+    # The watcher is process-wide, so subprocesses are then tied to this loop.
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+def _raise_fd_limit() -> None:
+    # each worker holds a stdout pipe and a pidfd open in this process
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+class AsyncioRuntime:
+    """Spawns, supervises, probes and terminates pod workers on one loop.
+
+    ``on_exit(uid, worker, returncode)`` is called for watched workers and
+    ``on_unhealthy(uid, worker)`` when a worker misses ``failure_threshold``
+    consecutive liveness probes. A probe fails when no heartbeat line has
+    arrived within ``heartbeat_interval + timeout_sec``.
+    """
+
+    def __init__(
+        self,
+        on_exit: ExitCallback,
+        on_unhealthy: Optional[UnhealthyCallback] = None,
+        grace_period: float = 2.0,
+        heartbeat_interval: float = 5.0,
+        env: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._on_exit = on_exit
+        self._on_unhealthy = on_unhealthy
+        self.grace_period = grace_period
+        self.heartbeat_interval = heartbeat_interval
+        self._env = env
+        # the fields below are only touched on the loop thread
+        self._watched: Dict[str, AsyncWorker] = {}
+        self._workers: Set[AsyncWorker] = set()
+        self._terminating: Set[AsyncWorker] = set()
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kclone-aio-callbacks")
+        self._closed = False
+        _raise_fd_limit()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="kclone-aio", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def __len__(self) -> int:
+        return len(self._terminating)
+
+    def _run(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self.loop)
+        _install_pidfd_watcher(self.loop)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def _call(self, coro, timeout: Optional[float]):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def spawn(self, uid: str, image: str, health_check: Optional[HealthCheck] = None) -> AsyncWorker:
+        return self._call(self._spawn(uid, image, health_check), 10.0)
+
+    async def _spawn(self, uid: str, image: str, health_check: Optional[HealthCheck]) -> AsyncWorker:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "kclone.worker", "--uid", uid, "--image", image,
+            "--heartbeat-interval", str(self.heartbeat_interval),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            env=self._env,
+        )
+        worker = AsyncWorker(uid, proc, self.loop)
+        self._workers.add(worker)
+        self.loop.create_task(self._supervise(worker))
+        if health_check is not None and health_check.enabled:
+            self.loop.create_task(self._probe(worker, health_check))
+        return worker
+
+    async def _supervise(self, worker: AsyncWorker) -> None:
+        # every line the worker prints counts as a heartbeat
+        async for _ in worker._proc.stdout:
+            worker.last_heartbeat = time.monotonic()
+        code = await worker._proc.wait()
+        worker._set_exited(code)
+        self._workers.discard(worker)
+        self._terminating.discard(worker)
+        if self._watched.get(worker.uid) is worker:
+            del self._watched[worker.uid]
+            self._callbacks.submit(self._on_exit, worker.uid, worker, code)
+
+    async def _probe(self, worker: AsyncWorker, hc: HealthCheck) -> None:
+        await asyncio.sleep(hc.initial_delay_sec)
+        failures = 0
+        while worker.returncode is None:
+            stale = time.monotonic() - worker.last_heartbeat > self.heartbeat_interval + hc.timeout_sec
+            failures = failures + 1 if stale else 0
+            if failures >= hc.failure_threshold:
+                if self._on_unhealthy is not None and self._watched.get(worker.uid) is worker:
+                    self._callbacks.submit(self._on_unhealthy, worker.uid, worker)
+                return
+            await asyncio.sleep(hc.period_sec)
+
+    # ProcessSupervisor interface
+
+    def watch(self, uid: str, worker: AsyncWorker) -> None:
+        self.loop.call_soon_threadsafe(self._watch, uid, worker)
+
+    def _watch(self, uid: str, worker: AsyncWorker) -> None:
+        if worker.returncode is not None:
+            self._callbacks.submit(self._on_exit, uid, worker, worker.returncode)
+        else:
+            self._watched[uid] = worker
+
+    def unwatch(self, uid: str) -> None:
+        self.loop.call_soon_threadsafe(self._watched.pop, uid, None)
+
+    # TerminationPipeline interface
+
+    def submit(self, workers: Iterable[AsyncWorker]) -> None:
+        workers = list(workers)
+        if workers:
+            self.loop.call_soon_threadsafe(self._terminate, workers)
+
+    def _terminate(self, workers: List[AsyncWorker]) -> None:
+        workers = [w for w in workers if w.returncode is None]
+        for worker in workers:
+            worker.terminate()
+            self._terminating.add(worker)
+        if workers:
+            self.loop.create_task(self._escalate(workers))
+
+    async def _escalate(self, workers: List[AsyncWorker]) -> None:
+        _, stragglers = await asyncio.wait([w._exit for w in workers], timeout=self.grace_period)
+        for worker in workers:
+            if worker._exit in stragglers:
+                worker.kill()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted worker has exited."""
+        return self._call(self._join(timeout), None if timeout is None else timeout + 1.0)
+
+    async def _join(self, timeout: Optional[float]) -> bool:
+        futures = [w._exit for w in self._terminating]
+        if not futures:
+            return True
+        _, pending = await asyncio.wait(futures, timeout=timeout)
+        return not pending
+
+    def close(self) -> None:
+        """Finish pending terminations, then stop the loop. Workers still
+        running are killed: their pipes and pidfds belong to the loop."""
+        if self._closed:
+            return
+        self._closed = True
+        self.join(self.grace_period + 1.0)
+        self._call(self._shutdown(), 5.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+        self._callbacks.shutdown(wait=False)
+
+    async def _shutdown(self) -> None:
+        self._watched.clear()
+        for worker in list(self._workers):
+            worker.kill()
+        if self._workers:
+            await asyncio.wait([w._exit for w in self._workers], timeout=2.0)
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -9,6 +9,7 @@ from .controllers import create_deployment, reconcile_deployments
 from .lifecycle import create_pod, delete_pod
 from .models import Node
 from .persistence import load_state, save_state
+from . import db as _db
 from .db import init_db, control_loop, load_state_from_db, save_state_to_db
 from .resource import cluster_capacity, node_resource_table
 from .scheduler import schedule_pending_pods
@@ -17,6 +18,9 @@ from .state import ClusterState
 
 state = ClusterState()
 
+# commands that query the DB directly instead of loading the whole state
+_QUERY_COMMANDS = {"pods", "top"}
+
 
 def parse_labels(label_str: str | None) -> dict:
     if not label_str:
@@ -42,7 +46,7 @@ def cli(ctx, db_path: str | None, up: bool) -> None:
     ctx.obj["db_path"] = db_path
     ctx.obj["up"] = up
     global state
-    if db_path:
+    if db_path and ctx.invoked_subcommand not in _QUERY_COMMANDS:
         try:
             state = load_state_from_db(db_path)
         except Exception:
@@ -106,6 +110,21 @@ def node_add(ctx, name: str, cpu: int, mem: int, labels: str | None) -> None:
         save_state_to_db(state, db_path)
 
 
+@cli.command("node-drain")
+@click.argument("name")
+@click.pass_context
+def node_drain(ctx, name: str) -> None:
+    """Cordon a node and move its pods to other nodes."""
+    if name not in state.nodes:
+        raise click.BadParameter(f"Node {name} not found")
+    evicted = state.drain_node(name)
+    schedule_pending_pods(state)
+    click.echo(f"Drained node {name}, evicted {len(evicted)} pods")
+    db_path = ctx.obj.get("db_path")
+    if db_path:
+        save_state_to_db(state, db_path)
+
+
 @cli.command("nodes")
 def list_nodes() -> None:
     rows = node_resource_table(state)
@@ -121,9 +140,12 @@ def list_nodes() -> None:
 @click.option("--cpu", default=1, show_default=True, help="CPU request")
 @click.option("--mem", default=128, show_default=True, help="Memory request in MB")
 @click.option("--labels", default=None, help="Comma-separated key=value labels")
+@click.option("--node-selector", default=None, help="Node labels the pod requires (key=value,...)")
+@click.option("--tolerations", default=None, help="Comma-separated node taints the pod tolerates")
 @click.pass_context
-def pod_create(ctx, name: str, image: str, cpu: int, mem: int, labels: str | None) -> None:
-    pod = create_pod(state, name, image, cpu, mem, parse_labels(labels))
+def pod_create(ctx, name: str, image: str, cpu: int, mem: int, labels: str | None, node_selector: str | None, tolerations: str | None) -> None:
+    tols = [t.strip() for t in tolerations.split(",") if t.strip()] if tolerations else []
+    pod = create_pod(state, name, image, cpu, mem, parse_labels(labels), parse_labels(node_selector), tols)
     click.echo(f"Created pod {pod.uid} -> {pod.status.phase}")
     db_path = ctx.obj.get("db_path")
     if db_path:
@@ -131,12 +153,34 @@ def pod_create(ctx, name: str, image: str, cpu: int, mem: int, labels: str | Non
 
 
 @cli.command("pods")
-def list_pods() -> None:
-    if not state.pods:
+@click.option("--watch", "-w", is_flag=True, default=False, help="Stream pod changes after listing (needs --db)")
+@click.option("--node", default=None, help="Only pods bound to this node")
+@click.option("--phase", default=None, help="Only pods in this phase")
+@click.option("--selector", "-l", default=None, help="Only pods with these labels (key=value,...)")
+@click.pass_context
+def list_pods(ctx, watch: bool, node: str | None, phase: str | None, selector: str | None) -> None:
+    db_path = ctx.obj.get("db_path")
+    if watch and not db_path:
+        # without a DB the state lives only in this process; nothing else changes it
+        raise click.UsageError("--watch needs --db")
+    selector_labels = parse_labels(selector)
+    if db_path:
+        # filtered in SQLite through its indexes
+        pods = _db.query_pods(db_path, selector_labels, node, phase)
+    elif selector_labels:
+        pods = [p for p in state.select_pods(selector_labels) if (not node or p.status.node_name == node) and (not phase or p.status.phase == phase)]
+    elif node:
+        pods = [p for p in state.pods_on_node(node) if not phase or p.status.phase == phase]
+    elif phase:
+        pods = state.pods_in_phase(phase)
+    else:
+        pods = state.list_pods()
+    if not pods:
         click.echo("No pods present")
-        return
+        if not watch:
+            return
     rows = []
-    for pod in state.pods.values():
+    for pod in pods:
         rows.append(
             {
                 "uid": pod.uid,
@@ -149,7 +193,13 @@ def list_pods() -> None:
                 "labels": ",".join(f"{k}={v}" for k, v in pod.spec.labels.items()),
             }
         )
-    click.echo(tabulate(rows, headers="keys"))
+    if rows:
+        click.echo(tabulate(rows, headers="keys"))
+    if not watch:
+        return
+    for event in _db.watch_pods(db_path, pods, selector_labels, node, phase):
+        pod = event.obj
+        click.echo(f"{event.type:<9} {pod.uid} {pod.name} {pod.status.phase} {pod.status.node_name or ''}".rstrip())
 
 
 @cli.command("pod-delete")
@@ -171,12 +221,13 @@ def pod_delete(ctx, uid: str) -> None:
 @click.option("--labels", default=None, help="Pod template labels (key=value,...)")
 @click.option("--cpu", default=1, show_default=True, help="CPU request per pod")
 @click.option("--mem", default=128, show_default=True, help="Memory request per pod in MB")
+@click.option("--batch", is_flag=True, default=False, help="Place pods with the vectorised batch scheduler")
 @click.pass_context
-def deploy_create(ctx, name: str, image: str, replicas: int, selector: str | None, labels: str | None, cpu: int, mem: int) -> None:
+def deploy_create(ctx, name: str, image: str, replicas: int, selector: str | None, labels: str | None, cpu: int, mem: int, batch: bool) -> None:
     sel = parse_labels(selector) or {"app": name}
     lbls = parse_labels(labels) or {"app": name}
     create_deployment(state, name, image, replicas, sel, lbls, cpu, mem)
-    reconcile_deployments(state)
+    reconcile_deployments(state, batch=batch)
     click.echo(f"Created deployment {name} with {replicas} replicas")
     db_path = ctx.obj.get("db_path")
     if db_path:
@@ -186,13 +237,13 @@ def deploy_create(ctx, name: str, image: str, replicas: int, selector: str | Non
 @cli.command("deploy-scale")
 @click.argument("name")
 @click.option("--replicas", required=True, type=int)
+@click.option("--batch", is_flag=True, default=False, help="Place pods with the vectorised batch scheduler")
 @click.pass_context
-def deploy_scale(ctx, name: str, replicas: int) -> None:
-    deploy = state.deployments.get(name)
-    if not deploy:
+def deploy_scale(ctx, name: str, replicas: int, batch: bool) -> None:
+    if name not in state.deployments:
         raise click.BadParameter(f"Deployment {name} not found")
-    deploy.replicas = replicas
-    reconcile_deployments(state)
+    state.scale_deployment(name, replicas)
+    reconcile_deployments(state, batch=batch, names=[name])
     click.echo(f"Scaled {name} to {replicas} replicas")
     db_path = ctx.obj.get("db_path")
     if db_path:
@@ -201,11 +252,12 @@ def deploy_scale(ctx, name: str, replicas: int) -> None:
 
 @cli.command("services")
 def list_services() -> None:
-    if not state.services:
+    services = state.snapshot().services
+    if not services:
         click.echo("No services present")
         return
     rows = []
-    for svc in state.services.values():
+    for svc in services.values():
         rows.append(
             {
                 "name": svc.name,
@@ -218,6 +270,35 @@ def list_services() -> None:
     click.echo(tabulate(rows, headers="keys"))
 
 
+@cli.group("top")
+@click.pass_context
+def top(ctx) -> None:
+    """Show CPU and memory usage of pod workers, as sampled by control-loop."""
+    if not ctx.obj.get("db_path"):
+        # the workers belong to the control-loop process, which publishes their usage to the DB
+        raise click.UsageError("top needs --db")
+
+
+@top.command("pods")
+@click.pass_context
+def top_pods(ctx) -> None:
+    rows = _db.pod_metrics(ctx.obj["db_path"])
+    if not rows:
+        click.echo("No pod metrics; is a control-loop running?")
+        return
+    click.echo(tabulate(rows, headers="keys"))
+
+
+@top.command("nodes")
+@click.pass_context
+def top_nodes(ctx) -> None:
+    rows = _db.node_metrics(ctx.obj["db_path"])
+    if not rows:
+        click.echo("No nodes present")
+        return
+    click.echo(tabulate(rows, headers="keys"))
+
+
 @cli.command("service-create")
 @click.argument("name")
 @click.option("--selector", default=None, help="Selector labels (key=value,...)")
@@ -264,11 +345,24 @@ def state_load_cmd(path: str) -> None:
 @cli.command("control-loop")
 @click.argument("db_path")
 @click.option("--interval", default=1, show_default=True, help="Loop interval seconds")
-def run_control_loop(db_path: str, interval: int) -> None:
+@click.option("--snapshot", "snapshot_path", default=None, help="Also snapshot the state to this file in the background (.snap for binary)")
+@click.option("--snapshot-interval", default=5.0, show_default=True, help="Seconds between snapshots")
+@click.option("--journal", "journal_dir", default=None, help="Also journal every change to this directory")
+@click.option("--metrics-interval", default=5.0, show_default=True, help="Seconds between samples of pod usage for top")
+def run_control_loop(
+    db_path: str, interval: int, snapshot_path: str | None, snapshot_interval: float, journal_dir: str | None, metrics_interval: float
+) -> None:
     """Run a simple control loop that reconciles replica sets and schedules pods using a SQLite DB as Source of Truth."""
     init_db(db_path)
     click.echo(f"Starting control loop with DB {db_path} (ctrl-c to stop)")
-    control_loop(db_path, loop_interval=interval)
+    control_loop(
+        db_path,
+        loop_interval=interval,
+        snapshot_path=snapshot_path,
+        snapshot_interval=snapshot_interval,
+        journal_dir=journal_dir,
+        metrics_interval=metrics_interval,
+    )
 
 
 def main() -> None:
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, Iterable, Optional, Set
 
-from .models import Deployment, PodSpec
-from .scheduler import schedule_pending_pods
+from .models import ACTIVE_PHASES, Deployment, PodSpec, intern_labels
+from .scheduler import schedule_pending_pods, schedule_pending_pods_batch
 from .state import ClusterState
+from .watch import DELETED, TooOldResourceVersion
 
 
 def create_deployment(
@@ -30,37 +31,99 @@ def create_deployment(
     return deploy
 
 
-def reconcile_deployments(state: ClusterState) -> None:
+def pod_template(deploy: Deployment, state: Optional[ClusterState] = None) -> PodSpec:
+    """Return the PodSpec shared by every replica of ``deploy``.
+
+    Replicas differ only in pod name and status, so they share one spec (and
+    one labels dict) instead of each carrying a copy. The spec is cached in
+    ``state`` per deployment until the template changes or the deployment is
+    removed; without a state a new one is built.
+    """
+    key = (deploy.image, deploy.cpu_request, deploy.mem_request, tuple(deploy.labels.items()))
+    cached = state._pod_templates.get(deploy.name) if state is not None else None
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    spec = PodSpec(
+        name=deploy.name,
+        image=deploy.image,
+        cpu_request=deploy.cpu_request,
+        mem_request=deploy.mem_request,
+        labels=intern_labels(deploy.labels),
+    )
+    if state is not None:
+        state._pod_templates[deploy.name] = (key, spec)
+    return spec
+
+
+def reconcile_deployments(state: ClusterState, batch: bool = False, names: Optional[Iterable[str]] = None) -> None:
     """Ensure each deployment has desired replicas. Create or remove pods accordingly.
 
     This function is intentionally idempotent and safe to call repeatedly.
+    With ``batch`` the pending pods are placed by the NumPy batch scheduler,
+    which is much faster when scaling to thousands of replicas. ``names``
+    limits the pass to those deployments.
     """
+    schedule = schedule_pending_pods_batch if batch else schedule_pending_pods
+    only = set(names) if names is not None else None
     # iterate over a snapshot of deployments to avoid mutation issues
     for deploy_name, deploy in list(state.deployments.items()):
+        if only is not None and deploy_name not in only:
+            continue
         matching = state.select_pods(deploy.selector)
-        active = [p for p in matching if p.status.phase in ("Pending", "Running")]
+        active = [p for p in matching if p.status.phase in ACTIVE_PHASES]
         diff = deploy.replicas - len(active)
         if diff > 0:
+            spec = pod_template(deploy, state)
             for i in range(diff):
                 pod_name = f"{deploy.name}-{len(active) + i + 1}"
-                labels = {**deploy.labels}
-                spec = PodSpec(
-                    name=pod_name,
-                    image=deploy.image,
-                    cpu_request=deploy.cpu_request,
-                    mem_request=deploy.mem_request,
-                    labels=labels,
-                )
-                state.add_pod(spec)
+                state.add_pod(spec, name=pod_name)
         elif diff < 0:
             # remove oldest/excess pods
             excess = active[deploy.replicas:]
-            for pod in excess:
-                try:
-                    state.remove_pod(pod.uid)
-                except KeyError:
-                    continue
+            try:
+                state.remove_pods([pod.uid for pod in excess])
+            except KeyError:
+                # some were removed concurrently; remove the rest one by one
+                for pod in excess:
+                    try:
+                        state.remove_pod(pod.uid)
+                    except KeyError:
+                        continue
         # Try scheduling after adjustments
-        schedule_pending_pods(state)
-    # refresh services so endpoints are up-to-date
-    state.refresh_service_endpoints()
+        schedule(state)
+
+
+class DeploymentController:
+    """Reconciles only the deployments affected by recent watch events.
+
+    A deployment is revisited when it is added or scaled, or when one of its
+    pods is deleted or leaves the active phases. If the watch falls
+    behind, every deployment is reconciled and a fresh watch started.
+    """
+
+    def __init__(self, state: ClusterState, batch: bool = False) -> None:
+        self.state = state
+        self.batch = batch
+        self._watcher = state.watch()
+        reconcile_deployments(state, batch)
+
+    def sync(self, timeout: float = 0.0) -> Set[str]:
+        """Process pending events and return the names that were reconciled."""
+        try:
+            events = self._watcher.poll(timeout)
+        except TooOldResourceVersion:
+            self._watcher = self.state.watch()
+            reconcile_deployments(self.state, self.batch)
+            return set(self.state.deployments)
+        names: Set[str] = set()
+        for event in events:
+            if event.kind == "Deployment" and event.type != DELETED:
+                names.add(event.name)
+            elif event.kind == "Pod" and (event.type == DELETED or event.obj.status.phase not in ACTIVE_PHASES):
+                labels = event.obj.spec.labels
+                for name, deploy in list(self.state.deployments.items()):
+                    if all(labels.get(k) == v for k, v in deploy.selector.items()):
+                        names.add(name)
+        if names:
+            reconcile_deployments(self.state, self.batch, names)
+        return names
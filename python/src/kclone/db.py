@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List
 import json
 import sqlite3
-from pathlib import Path
-from typing import Dict, Any
+import threading
+import time
 
-from .models import Node, Pod, PodSpec, Service, Deployment, HealthCheck, PodStatus
+from .models import Node, Pod, PodSpec, Service, Deployment, PodStatus, intern_labels
 from .state import ClusterState
+from .watch import ADDED, DELETED, MODIFIED, WatchEvent
 
 
 SCHEMA = '''
@@ -47,102 +52,686 @@ CREATE TABLE IF NOT EXISTS replica_sets (
   replicas_count INTEGER,
   pod_template TEXT
 );
+
+-- rows written by other processes, for the control loop to pick up
+CREATE TABLE IF NOT EXISTS change_log (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  tbl TEXT NOT NULL,
+  key TEXT NOT NULL
+);
+
+-- muted=1 only inside the control loop's own write transactions
+CREATE TABLE IF NOT EXISTS change_log_ctl (
+  id INTEGER PRIMARY KEY CHECK (id = 0),
+  muted INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO change_log_ctl(id, muted) VALUES (0, 0);
+'''
+
+_KEYS = {'nodes': 'id', 'pods': 'uid', 'services': 'name', 'replica_sets': 'name'}
+_KINDS = {'nodes': 'Node', 'pods': 'Pod', 'services': 'Service', 'replica_sets': 'Deployment'}
+
+# change_log rows kept by saves; a control loop that fell further behind
+# finds a gap in the sequence and rereads every table instead
+CHANGE_LOG_LIMIT = 10000
+
+SCHEMA += ''.join(
+    f'''
+CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_log AFTER {op} ON {table}
+WHEN (SELECT muted FROM change_log_ctl) = 0
+BEGIN INSERT INTO change_log(tbl, key) VALUES ('{table}', {"OLD" if op == "DELETE" else "NEW"}.{key}); END;
 '''
+    for table, key in _KEYS.items()
+    for op in ('INSERT', 'UPDATE', 'DELETE')
+)
+
+# Applied in order on top of SCHEMA; PRAGMA user_version records how many a
+# database has had. Only ever append: released databases may be at any step.
+MIGRATIONS = (
+    # 1: indexes for filtered pod queries, and labels normalised into
+    # pod_labels, kept in step with pods.labels by triggers
+    (
+        'CREATE INDEX IF NOT EXISTS pods_node_id ON pods(node_id)',
+        'CREATE INDEX IF NOT EXISTS pods_current_status ON pods(current_status)',
+        'CREATE INDEX IF NOT EXISTS pods_namespace ON pods(namespace)',
+        '''CREATE TABLE IF NOT EXISTS pod_labels (
+  uid TEXT NOT NULL,
+  key TEXT NOT NULL,
+  value TEXT NOT NULL,
+  PRIMARY KEY (uid, key)
+) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS pod_labels_key_value ON pod_labels(key, value, uid)',
+        '''INSERT OR REPLACE INTO pod_labels(uid, key, value)
+SELECT pods.uid, j.key, j.value FROM pods, json_each(pods.labels) AS j
+WHERE pods.uid IS NOT NULL AND json_valid(pods.labels)''',
+        '''CREATE TRIGGER IF NOT EXISTS pods_labels_insert AFTER INSERT ON pods
+WHEN NEW.uid IS NOT NULL AND json_valid(NEW.labels)
+BEGIN INSERT OR REPLACE INTO pod_labels(uid, key, value) SELECT NEW.uid, key, value FROM json_each(NEW.labels); END''',
+        '''CREATE TRIGGER IF NOT EXISTS pods_labels_update AFTER UPDATE OF uid, labels ON pods
+WHEN OLD.uid IS NOT NEW.uid OR OLD.labels IS NOT NEW.labels
+BEGIN
+  DELETE FROM pod_labels WHERE uid = OLD.uid;
+  INSERT OR REPLACE INTO pod_labels(uid, key, value)
+  SELECT NEW.uid, key, value FROM json_each(NEW.labels) WHERE NEW.uid IS NOT NULL AND json_valid(NEW.labels);
+END''',
+        '''CREATE TRIGGER IF NOT EXISTS pods_labels_delete AFTER DELETE ON pods
+BEGIN DELETE FROM pod_labels WHERE uid = OLD.uid; END''',
+    ),
+    # 2: the latest worker usage sampled by the control loop, for ``top``
+    (
+        '''CREATE TABLE IF NOT EXISTS pod_metrics (
+  uid TEXT PRIMARY KEY,
+  name TEXT,
+  node_id TEXT,
+  cpu_percent REAL,
+  rss_bytes INTEGER,
+  sampled_at REAL
+)''',
+    ),
+)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply the pending ``MIGRATIONS``, each in its own transaction, and
+    return the resulting schema version."""
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # read under the write lock: another process may have migrated
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.execute('COMMIT')
+                return version
+            for statement in MIGRATIONS[version]:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+# applied to every connection; WAL lets readers run alongside the writer and
+# makes synchronous=NORMAL safe against corruption
+_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16384',  # KiB
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+class Database:
+    """Long-lived connections to one SQLite database.
+
+    There is one writer connection, used under a lock, and a small pool of
+    read-only connections, so readers neither wait for each other nor block
+    the writer. The database is switched to WAL and the schema created and
+    migrated once, when the first ``Database`` for a path is made; use ``get_database`` to
+    share one per process. Connections stay open, so sqlite3 keeps their
+    prepared statements cached across calls.
+    """
+
+    def __init__(self, path: str | Path, max_readers: int = 4) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_readers = max_readers
+        self._write_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._idle_readers: List[sqlite3.Connection] = []
+        self._all_readers: List[sqlite3.Connection] = []
+        self._reader_slots = threading.Semaphore(max_readers)
+        self._writer = self._connect()
+        self._writer.execute('PRAGMA journal_mode=WAL')
+        self._writer.executescript(SCHEMA)
+        self.schema_version = migrate(self._writer)
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        # isolation_level=None: transactions are begun explicitly below
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        if readonly:
+            conn.execute('PRAGMA query_only=1')
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, committed on success and rolled back on error."""
+        with self._write_lock:
+            conn = self._writer
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Run a read transaction, which sees one consistent database version."""
+        self._reader_slots.acquire()
+        try:
+            with self._pool_lock:
+                conn = self._idle_readers.pop() if self._idle_readers else None
+            if conn is None:
+                conn = self._connect(readonly=True)
+                with self._pool_lock:
+                    self._all_readers.append(conn)
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.execute('COMMIT')
+                with self._pool_lock:
+                    self._idle_readers.append(conn)
+        finally:
+            self._reader_slots.release()
+
+    def data_version(self) -> int:
+        """Counter that changes whenever another connection commits."""
+        with self._write_lock:
+            return self._writer.execute('PRAGMA data_version').fetchone()[0]
+
+    def close(self) -> None:
+        with self._write_lock, self._pool_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+            self._idle_readers.clear()
+            self._writer.close()
+
+
+_databases: Dict[Path, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str | Path) -> Database:
+    """Return this process's shared ``Database`` for ``path``."""
+    key = Path(path).resolve()
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(key)
+        return db
+
+
+def close_databases() -> None:
+    with _databases_lock:
+        for db in _databases.values():
+            db.close()
+        _databases.clear()
 
 
 def init_db(path: str | Path) -> None:
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(path)
-    try:
-        conn.executescript(SCHEMA)
-        conn.commit()
-    finally:
-        conn.close()
+    get_database(path)
+
+
+def _node_from_row(r: sqlite3.Row) -> Node:
+    labels = json.loads(r['labels']) if r['labels'] else {}
+    return Node(name=r['id'], cpu_capacity=r['total_cpu'], mem_capacity=r['total_ram'], labels=labels, ready=(r['status']=='Ready'))
+
+
+def _pod_from_row(r: sqlite3.Row) -> Pod:
+    labels = intern_labels(json.loads(r['labels'])) if r['labels'] else {}
+    spec = PodSpec(name=r['name'], image=r['image'], cpu_request=r['cpu_request'] or 1, mem_request=r['mem_request'] or 128, labels=labels)
+    status = PodStatus(phase=r['current_status'] or 'Pending', node_name=r['node_id'])
+    uid = r['uid'] or f"dbpod-{r['id']}"
+    return Pod(name=r['name'], spec=spec, status=status, uid=uid)
+
+
+def _service_from_row(r: sqlite3.Row) -> Service:
+    selector = json.loads(r['selector']) if r['selector'] else {}
+    return Service(name=r['name'], selector=selector, port=r['port'], target_port=r['target_port'], virtual_ip=r['cluster_ip'])
+
+
+def _deployment_from_row(r: sqlite3.Row) -> Deployment:
+    selector = json.loads(r['selector']) if r['selector'] else {}
+    tpl = json.loads(r['pod_template']) if r['pod_template'] else {}
+    return Deployment(name=r['name'], image=tpl.get('image', ''), replicas=r['replicas_count'], selector=selector, labels=tpl.get('labels', {}), cpu_request=tpl.get('cpu_request', 1), mem_request=tpl.get('mem_request', 128))
+
+
+def _counter_suffix(value: str | None, prefix: str) -> int:
+    if value and value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return 0
+
+
+def _advance_counters(state: ClusterState, pod_uids, vips) -> None:
+    # keep new pod uids and service IPs clear of the ones already stored
+    uid_counter = max((_counter_suffix(uid, 'pod-') for uid in pod_uids), default=0)
+    vip_counter = max((_counter_suffix(vip, '10.96.0.') for vip in vips), default=0) + 1
+    state.restore_counters(max(uid_counter, state._uid_counter), max(vip_counter, state._vip_counter))
 
 
 def load_state_from_db(path: str | Path) -> ClusterState:
-    init_db(path)
-    conn = sqlite3.connect(path)
-    conn.row_factory = sqlite3.Row
     state = ClusterState()
-    try:
+    with get_database(path).reader() as conn:
         cur = conn.cursor()
         for r in cur.execute('SELECT * FROM nodes'):
-            labels = json.loads(r['labels']) if r['labels'] else {}
-            node = Node(name=r['id'], cpu_capacity=r['total_cpu'], mem_capacity=r['total_ram'], labels=labels, ready=(r['status']=='Ready'))
-            state.add_node(node)
+            state.add_node(_node_from_row(r))
 
         for r in cur.execute('SELECT * FROM pods'):
-            labels = json.loads(r['labels']) if r['labels'] else {}
-            hc = HealthCheck()
-            spec = PodSpec(name=r['name'], image=r['image'], cpu_request=r['cpu_request'] or 1, mem_request=r['mem_request'] or 128, labels=labels, health_check=hc)
-            status = PodStatus(phase=r['current_status'] or 'Pending', node_name=r['node_id'])
-            uid = r['uid'] or f"dbpod-{r['id']}"
-            pod = Pod(name=r['name'], spec=spec, status=status, uid=uid)
-            # don't auto-start subprocesses here; ClusterState will handle scheduling
-            state.pods[uid] = pod
+            # don't auto-start subprocesses here; ClusterState will handle scheduling.
+            # nodes rows carry no allocation: it is rebuilt from the bound pods
+            state.restore_pod(_pod_from_row(r), charge=True)
 
         for r in cur.execute('SELECT * FROM services'):
-            selector = json.loads(r['selector']) if r['selector'] else {}
-            svc = Service(name=r['name'], selector=selector, port=r['port'], target_port=r['target_port'], virtual_ip=r['cluster_ip'])
-            state.services[svc.name] = svc
+            state.add_service(_service_from_row(r))
 
         for r in cur.execute('SELECT * FROM replica_sets'):
-            selector = json.loads(r['selector']) if r['selector'] else {}
-            tpl = json.loads(r['pod_template']) if r['pod_template'] else {}
-            deploy = Deployment(name=r['name'], image=tpl.get('image', ''), replicas=r['replicas_count'], selector=selector, labels=tpl.get('labels', {}), cpu_request=tpl.get('cpu_request', 1), mem_request=tpl.get('mem_request', 128))
-            state.deployments[deploy.name] = deploy
+            state.add_deployment(_deployment_from_row(r))
 
-    finally:
-        conn.close()
+    _advance_counters(state, state.pods, (svc.virtual_ip for svc in state.services.values()))
+    # everything just loaded is already in the database
+    state.take_changes()
+    state.changes_base = str(get_database(path).path)
     return state
 
 
-def save_state_to_db(state: ClusterState, path: str | Path) -> None:
-    init_db(path)
-    conn = sqlite3.connect(path)
-    try:
-        cur = conn.cursor()
-        # replace nodes
-        cur.execute('DELETE FROM nodes')
-        for n in state.list_nodes():
-            cur.execute('INSERT INTO nodes(id, ip_address, total_cpu, total_ram, status, labels) VALUES (?,?,?,?,?,?)', (n.name, None, n.cpu_capacity, n.mem_capacity, 'Ready' if n.ready else 'NotReady', json.dumps(n.labels)))
-
-        # replace pods
-        cur.execute('DELETE FROM pods')
-        for p in state.list_pods():
-            cur.execute('INSERT INTO pods(uid, name, namespace, node_id, image, desired_status, current_status, cpu_request, mem_request, labels) VALUES (?,?,?,?,?,?,?,?,?,?)', (p.uid, p.name, 'default', p.status.node_name, p.spec.image, 'Running' if p.status.phase=='Running' else 'Terminated', p.status.phase, p.spec.cpu_request, p.spec.mem_request, json.dumps(p.spec.labels)))
-
-        # replace services
-        cur.execute('DELETE FROM services')
-        for s in state.services.values():
-            cur.execute('INSERT INTO services(name, cluster_ip, selector, port, target_port) VALUES (?,?,?,?,?)', (s.name, s.virtual_ip, json.dumps(s.selector), s.port, s.target_port))
-
-        # replace replica_sets
-        cur.execute('DELETE FROM replica_sets')
-        for d in state.deployments.values():
-            tpl = {'image': d.image, 'labels': d.labels, 'cpu_request': d.cpu_request, 'mem_request': d.mem_request}
-            cur.execute('INSERT INTO replica_sets(name, selector, replicas_count, pod_template) VALUES (?,?,?,?)', (d.name, json.dumps(d.selector), d.replicas, json.dumps(tpl)))
-
-        conn.commit()
-    finally:
-        conn.close()
+def query_pods(
+    path: str | Path,
+    selector: Dict[str, str] | None = None,
+    node_name: str | None = None,
+    phase: str | None = None,
+) -> List[Pod]:
+    """Pods matching every given filter, selected by SQLite through its
+    indexes rather than by loading the table; labels via ``pod_labels``."""
+    clauses = []
+    params: List[str] = []
+    for key, value in (selector or {}).items():
+        clauses.append('uid IN (SELECT uid FROM pod_labels WHERE key = ? AND value = ?)')
+        params += (key, value)
+    if node_name is not None:
+        clauses.append('node_id = ?')
+        params.append(node_name)
+    if phase is not None:
+        clauses.append('current_status = ?')
+        params.append(phase)
+    where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    with get_database(path).reader() as conn:
+        return [_pod_from_row(r) for r in conn.execute(f'SELECT * FROM pods {where} ORDER BY id', params)]
+
+
+def pods_by_label(path: str | Path, selector: Dict[str, str]) -> List[Pod]:
+    return query_pods(path, selector=selector)
+
 
+def pods_on_node(path: str | Path, node_name: str) -> List[Pod]:
+    return query_pods(path, node_name=node_name)
 
-def control_loop(db_path: str | Path, loop_interval: int = 1) -> None:
-    """Start the control loop that loads state from DB, reconciles deployments,
-    schedules pods and persists back to DB on each iteration.
+
+def pending_pods(path: str | Path) -> List[Pod]:
+    return query_pods(path, phase='Pending')
+
+
+def watch_pods(
+    path: str | Path,
+    pods: Iterable[Pod],
+    selector: Dict[str, str] | None = None,
+    node_name: str | None = None,
+    phase: str | None = None,
+    interval: float = 0.5,
+) -> Iterator[WatchEvent]:
+    """Stream changes to the pods matching the filters, starting from the
+    listed ``pods``. Other processes commit to the DB, so this polls
+    ``PRAGMA data_version`` every ``interval`` seconds and re-runs
+    ``query_pods`` only when it moved; a pod leaving the filter is DELETED.
+    Commits made through this process's own connection are not seen.
     """
-    from time import sleep
+    db = get_database(path)
+    version = db.data_version()
+    known = {p.uid: p for p in pods}
     while True:
-        control_loop_iteration(db_path)
-        sleep(loop_interval)
+        current = {p.uid: p for p in query_pods(path, selector, node_name, phase)}
+        for uid, pod in current.items():
+            old = known.get(uid)
+            if old is None:
+                yield WatchEvent(ADDED, 'Pod', uid, pod, version)
+            elif old != pod:
+                yield WatchEvent(MODIFIED, 'Pod', uid, pod, version)
+        for uid, pod in known.items():
+            if uid not in current:
+                yield WatchEvent(DELETED, 'Pod', uid, pod, version)
+        known = current
+        while db.data_version() == version:
+            time.sleep(interval)
+        version = db.data_version()
+
+
+def save_pod_metrics(path: str | Path, rows: Iterable[tuple]) -> None:
+    """Replace the sampled usage with ``rows`` of ``(uid, name, node, cpu
+    percent, rss bytes)``, as ``MetricsCollector.latest`` returns them."""
+    now = time.time()
+    with get_database(path).writer() as conn:
+        conn.execute('DELETE FROM pod_metrics')
+        conn.executemany('INSERT INTO pod_metrics VALUES (?,?,?,?,?,?)', [(*row, now) for row in rows])
+
+
+def pod_metrics(path: str | Path) -> List[Dict[str, Any]]:
+    """The latest usage of every sampled pod, as ``top pods`` shows it."""
+    with get_database(path).reader() as conn:
+        rows = conn.execute('SELECT uid, name, node_id, cpu_percent, rss_bytes FROM pod_metrics ORDER BY node_id, name').fetchall()
+    return [
+        {'uid': r[0], 'name': r[1], 'node': r[2], 'cpu%': None if r[3] is None else round(r[3], 1), 'rss_mb': round(r[4] / 2**20, 1)}
+        for r in rows
+    ]
+
+
+def node_metrics(path: str | Path) -> List[Dict[str, Any]]:
+    """Sampled usage summed per node; nodes without sampled pods show zero."""
+    with get_database(path).reader() as conn:
+        rows = conn.execute(
+            'SELECT nodes.id, COUNT(m.uid), COALESCE(SUM(m.cpu_percent), 0), COALESCE(SUM(m.rss_bytes), 0) '
+            'FROM nodes LEFT JOIN pod_metrics AS m ON m.node_id = nodes.id GROUP BY nodes.id ORDER BY nodes.id'
+        ).fetchall()
+    return [{'name': r[0], 'pods': r[1], 'cpu%': round(r[2], 1), 'rss_mb': round(r[3] / 2**20, 1)} for r in rows]
+
+
+def _node_row(n: Node) -> tuple:
+    return (n.name, None, n.cpu_capacity, n.mem_capacity, 'Ready' if n.ready else 'NotReady', json.dumps(n.labels))
+
+
+def _pod_row(p: Pod) -> tuple:
+    return (p.uid, p.name, 'default', p.status.node_name, p.spec.image, 'Running' if p.status.phase=='Running' else 'Terminated', p.status.phase, p.spec.cpu_request, p.spec.mem_request, json.dumps(p.spec.labels))
+
+
+def _service_row(s: Service) -> tuple:
+    return (s.name, s.virtual_ip, json.dumps(s.selector), s.port, s.target_port)
+
+
+def _replica_set_row(d: Deployment) -> tuple:
+    tpl = {'image': d.image, 'labels': d.labels, 'cpu_request': d.cpu_request, 'mem_request': d.mem_request}
+    return (d.name, json.dumps(d.selector), d.replicas, json.dumps(tpl))
+
+
+@lru_cache(maxsize=None)
+def _upsert(table: str, key: str, columns: tuple) -> str:
+    rest = [c for c in columns if c != key]
+    updates = ', '.join(f'{c}=excluded.{c}' for c in rest)
+    # rows that are unchanged are left alone: no index or trigger work
+    changed = ' OR '.join(f'{c} IS NOT excluded.{c}' for c in rest)
+    return f'INSERT INTO {table}({", ".join(columns)}) VALUES ({",".join("?" * len(columns))}) ON CONFLICT({key}) DO UPDATE SET {updates} WHERE {changed}'
+
+
+# (state kind, snapshot field, table, key column, columns, row builder)
+_TABLES = (
+    ('Node', 'nodes', 'nodes', 'id', ('id', 'ip_address', 'total_cpu', 'total_ram', 'status', 'labels'), _node_row),
+    ('Pod', 'pods', 'pods', 'uid', ('uid', 'name', 'namespace', 'node_id', 'image', 'desired_status', 'current_status', 'cpu_request', 'mem_request', 'labels'), _pod_row),
+    ('Service', 'services', 'services', 'name', ('name', 'cluster_ip', 'selector', 'port', 'target_port'), _service_row),
+    ('Deployment', 'deployments', 'replica_sets', 'name', ('name', 'selector', 'replicas_count', 'pod_template'), _replica_set_row),
+)
+
+
+def save_state_to_db(state: ClusterState, path: str | Path, full: bool = False, record_changes: bool = True) -> None:
+    """Persist ``state`` to the database at ``path``.
+
+    Only the objects added, changed or deleted since the state was loaded
+    from or last saved to this database are written, as batched upserts and
+    deletes in a single transaction. That assumes the database still holds
+    the state as of then. ``full`` rewrites every table instead, as does a
+    save to any other database than the state's ``changes_base``. Unless
+    ``record_changes`` is false, the written rows are logged for a running
+    control loop, and the log is trimmed to its last ``CHANGE_LOG_LIMIT``
+    entries so it stays bounded when no loop consumes it.
+    """
+    db = get_database(path)
+    base = str(db.path)
+    # the unsaved keys are relative to one database; elsewhere they say nothing
+    full = full or state.changes_base != base
+    snap, changes = state.take_changes()
+    try:
+        with db.writer() as conn:
+            cur = conn.cursor()
+            if not record_changes:
+                cur.execute('UPDATE change_log_ctl SET muted = 1')
+            for kind, field, table, key, columns, row in _TABLES:
+                live = getattr(snap, field)
+                if full:
+                    # upsert everything (unchanged rows are skipped), then
+                    # delete whatever is no longer live
+                    cur.executemany(_upsert(table, key, columns), (row(obj) for obj in live.values()))
+                    cur.execute('CREATE TEMP TABLE IF NOT EXISTS live_keys (key TEXT PRIMARY KEY) WITHOUT ROWID')
+                    cur.execute('DELETE FROM live_keys')
+                    cur.executemany('INSERT INTO live_keys VALUES (?)', ((name,) for name in live))
+                    cur.execute(f'DELETE FROM {table} WHERE {key} NOT IN (SELECT key FROM live_keys)')
+                    continue
+                changed = changes[kind]
+                if not changed:
+                    continue
+                cur.executemany(f'DELETE FROM {table} WHERE {key} = ?', ((name,) for name, deleted in changed.items() if deleted))
+                cur.executemany(_upsert(table, key, columns), (row(live[name]) for name, deleted in changed.items() if not deleted and name in live))
+            if record_changes:
+                cur.execute('DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?', (CHANGE_LOG_LIMIT,))
+            else:
+                cur.execute('UPDATE change_log_ctl SET muted = 0')
+    except Exception:
+        state.restore_changes(changes)
+        raise
+    state.changes_base = base
+
+
+class ControlLoop:
+    """Keeps one ``ClusterState`` in sync with the database across iterations.
+
+    Rows written by other processes (e.g. CLI commands) are found through
+    ``PRAGMA data_version`` and the ``change_log`` table and only those rows
+    are applied. Deployments are reconciled only when watch events affect
+    them, pods the scheduling queue hands out (e.g. parked ones, once a node
+    is added or grows) are scheduled, and only the loop's own changes are
+    written back. An iteration in which nothing happened costs one pragma,
+    an empty queue pop and no reconcile or write. If saves trimmed log
+    entries the loop had not read yet, every table is reread instead.
+    """
+
+    def __init__(self, db_path: str | Path, batch: bool = False) -> None:
+        from .controllers import DeploymentController
+        from .scheduler import schedule_pending_pods, schedule_pending_pods_batch
+
+        self._schedule = schedule_pending_pods_batch if batch else schedule_pending_pods
+        self.db_path = db_path
+        self.db = get_database(db_path)
+        with self.db.writer() as conn:
+            # the full load below covers everything logged so far
+            conn.execute('DELETE FROM change_log')
+            last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        # sequence number of the last log entry applied
+        self._seq = last[0] if last else 0
+        self._data_version = self.db.data_version()
+        self.state = load_state_from_db(db_path)
+        self.controller = DeploymentController(self.state, batch)
+        self._save()
+
+    def step(self) -> bool:
+        """Run one iteration; returns False if there was nothing to do."""
+        version = self.db.data_version()
+        external = version != self._data_version
+        if external:
+            self._data_version = version
+            self._apply_external_changes()
+        reconciled = self.controller.sync()
+        # capacity changes requeue parked pods; nothing else schedules them
+        self._schedule(self.state)
+        if self.state.has_unsaved_changes():
+            self._save()
+            return True
+        return external or bool(reconciled)
+
+    def run(self, interval: float = 1.0) -> None:
+        from time import sleep
+
+        while True:
+            self.step()
+            sleep(interval)
+
+    def close(self) -> None:
+        self.state.close()
+
+    def _save(self) -> None:
+        save_state_to_db(self.state, self.db_path, record_changes=False)
+
+    def _apply_external_changes(self) -> None:
+        with self.db.writer() as conn:
+            log = conn.execute('SELECT seq, tbl, key FROM change_log ORDER BY seq').fetchall()
+            if not log:
+                return
+            if log[0]['seq'] != self._seq + 1:
+                # entries went before we read them: compare every row
+                rows = self._all_rows(conn)
+            else:
+                changed = list(dict.fromkeys((r['tbl'], r['key']) for r in log))
+                rows = [(tbl, key, conn.execute(f'SELECT * FROM {tbl} WHERE {_KEYS[tbl]} = ?', (key,)).fetchone()) for tbl, key in changed]
+            conn.execute('DELETE FROM change_log WHERE seq <= ?', (log[-1]['seq'],))
+            self._seq = log[-1]['seq']
+        # the applied rows are already stored; keep them out of our next
+        # save, but not their side effects (evicted pods, node allocations)
+        _, pending = self.state.take_changes()
+        for tbl, key, row in rows:
+            try:
+                _APPLY[tbl](self.state, key, row)
+            except (KeyError, ValueError):
+                continue
+        _, side_effects = self.state.take_changes()
+        for tbl, key, _ in rows:
+            side_effects[_KINDS[tbl]].pop(key, None)
+        # side effects are newer than the changes pending from before
+        self.state.restore_changes(side_effects)
+        self.state.restore_changes(pending)
+        _advance_counters(self.state, (key for tbl, key, _ in rows if tbl == 'pods'), (row['cluster_ip'] for tbl, _, row in rows if tbl == 'services' and row))
+
+    def _all_rows(self, conn: sqlite3.Connection) -> List[tuple]:
+        # every stored row, plus a deletion for each object no longer stored
+        snap = self.state.snapshot(wait=True)
+        rows = []
+        for _, field, table, key, _, _ in _TABLES:
+            stored = {r[key]: r for r in conn.execute(f'SELECT * FROM {table}')}
+            rows += [(table, name, row) for name, row in stored.items()]
+            rows += [(table, name, None) for name in getattr(snap, field) if name not in stored]
+        return rows
+
+
+def _apply_node(state: ClusterState, name: str, row) -> None:
+    current = state.get_node(name)
+    if row is None:
+        if current is not None:
+            state.remove_node(name)
+        return
+    node = _node_from_row(row)
+    if current is None:
+        state.add_node(node)
+    elif _node_row(node) != _node_row(current):
+        state.update_node(name, node.cpu_capacity, node.mem_capacity, node.labels, node.ready)
+
+
+def _apply_pod(state: ClusterState, uid: str, row) -> None:
+    current = state.get_pod(uid)
+    if row is None:
+        if current is not None:
+            state.remove_pod(uid)
+        return
+    pod = _pod_from_row(row)
+    if current is None:
+        state.replace_pod(pod)
+        return
+    stored, live = _pod_row(pod), _pod_row(current)
+    if stored == live:
+        return
+    if stored[:-1] == live[:-1]:
+        # only the labels: the worker keeps running
+        state.set_pod_labels(uid, pod.spec.labels)
+    else:
+        state.replace_pod(pod)
+
+
+def _apply_service(state: ClusterState, name: str, row) -> None:
+    current = state.services.get(name)
+    if row is None:
+        if current is not None:
+            state.remove_service(name)
+        return
+    service = _service_from_row(row)
+    if current is None:
+        state.add_service(service)
+    elif _service_row(service) != _service_row(current):
+        state.remove_service(name)
+        state.add_service(service)
+
+
+def _apply_deployment(state: ClusterState, name: str, row) -> None:
+    current = state.deployments.get(name)
+    if row is None:
+        if current is not None:
+            state.remove_deployment(name)
+        return
+    deployment = _deployment_from_row(row)
+    if current is None:
+        state.add_deployment(deployment)
+        return
+    stored, live = _replica_set_row(deployment), _replica_set_row(current)
+    if stored == live:
+        return
+    if stored[:2] + stored[3:] == live[:2] + live[3:]:
+        state.scale_deployment(name, deployment.replicas)
+    else:
+        # a new selector or template: the controller reconciles it afresh
+        state.remove_deployment(name)
+        state.add_deployment(deployment)
+
+
+_APPLY = {'nodes': _apply_node, 'pods': _apply_pod, 'services': _apply_service, 'replica_sets': _apply_deployment}
+
+
+def control_loop(
+    db_path: str | Path,
+    loop_interval: int = 1,
+    snapshot_path: str | Path | None = None,
+    snapshot_interval: float = 5.0,
+    journal_dir: str | Path | None = None,
+    metrics_interval: float | None = 5.0,
+) -> None:
+    """Run the control loop: keep the cluster state in memory, apply changes
+    other processes make to the DB, reconcile deployments and schedule pods,
+    and persist the results. With ``snapshot_path`` the state is also
+    snapshotted there in the background every ``snapshot_interval`` seconds;
+    with ``journal_dir`` every change is also appended to a journal there.
+    The pod workers' usage is sampled every ``metrics_interval`` seconds
+    into the ``pod_metrics`` table (``None`` turns this off).
+    """
+    from .journal import Journal
+    from .metrics import MetricsCollector
+    from .snapshot import Snapshotter
+
+    loop = ControlLoop(db_path)
+    snapshotter = journal = collector = None
+    try:
+        if journal_dir is not None:
+            journal = Journal(loop.state, journal_dir)
+        if snapshot_path is not None:
+            snapshotter = Snapshotter(loop.state, snapshot_path, snapshot_interval)
+            snapshotter.start()
+        if metrics_interval is not None:
+            collector = MetricsCollector(loop.state, metrics_interval, on_sample=lambda c: save_pod_metrics(db_path, c.latest()))
+            collector.start()
+        loop.run(loop_interval)
+    finally:
+        if collector is not None:
+            collector.stop()
+            # nothing samples them any more
+            save_pod_metrics(db_path, [])
+        if snapshotter is not None:
+            snapshotter.stop()
+        if journal is not None:
+            journal.close()
+        loop.close()
 
 
 def control_loop_iteration(db_path: str | Path) -> ClusterState:
     """Perform a single control-loop iteration: load state, reconcile deployments,
     schedule pods, persist state, and return the in-memory ClusterState.
-    This is useful for testing and one-shot runs.
+    This is useful for testing and one-shot runs. If any pod was started,
+    ``close`` the returned state to stop its supervision threads.
     """
     state = load_state_from_db(db_path)
     # reconcile deployments (controllers will create desired pods)
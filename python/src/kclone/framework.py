@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+import time
+
+from .index import least_requested_score
+from .models import Node, Pod
+
+
+class FilterPlugin:
+    """Rejects nodes a pod cannot run on."""
+
+    name = ""
+
+    def filter(self, pod: Pod, node: Node) -> bool:
+        raise NotImplementedError
+
+
+class ScorePlugin:
+    """Ranks feasible nodes; higher raw scores are better."""
+
+    name = ""
+
+    def score(self, pod: Pod, node: Node) -> float:
+        raise NotImplementedError
+
+
+PLUGINS: Dict[str, Type] = {}
+
+
+def register_plugin(cls: Type) -> Type:
+    """Class decorator that makes a plugin constructible by name."""
+    PLUGINS[cls.name] = cls
+    return cls
+
+
+@register_plugin
+class NodeReady(FilterPlugin):
+    name = "NodeReady"
+
+    def filter(self, pod: Pod, node: Node) -> bool:
+        return node.ready
+
+
+@register_plugin
+class NodeResourcesFit(FilterPlugin):
+    name = "NodeResourcesFit"
+
+    def filter(self, pod: Pod, node: Node) -> bool:
+        return node.fits(pod.spec.cpu_request, pod.spec.mem_request)
+
+
+@register_plugin
+class TaintToleration(FilterPlugin):
+    name = "TaintToleration"
+
+    def filter(self, pod: Pod, node: Node) -> bool:
+        return all(t in pod.spec.tolerations for t in node.taints)
+
+
+@register_plugin
+class NodeSelector(FilterPlugin):
+    name = "NodeSelector"
+
+    def filter(self, pod: Pod, node: Node) -> bool:
+        return all(node.labels.get(k) == v for k, v in pod.spec.node_selector.items())
+
+
+def _fractions_after(pod: Pod, node: Node) -> Tuple[float, float]:
+    cpu = (node.cpu_allocated + pod.spec.cpu_request) / node.cpu_capacity if node.cpu_capacity else 1.0
+    mem = (node.mem_allocated + pod.spec.mem_request) / node.mem_capacity if node.mem_capacity else 1.0
+    return min(cpu, 1.0), min(mem, 1.0)
+
+
+@register_plugin
+class LeastAllocated(ScorePlugin):
+    """Spread pods: prefer the node with the most free CPU, then memory."""
+
+    name = "LeastAllocated"
+
+    def score(self, pod: Pod, node: Node) -> float:
+        return least_requested_score(node)
+
+
+@register_plugin
+class MostAllocated(ScorePlugin):
+    """Bin-pack pods: prefer the node that is fullest once the pod is placed."""
+
+    name = "MostAllocated"
+
+    def score(self, pod: Pod, node: Node) -> float:
+        cpu, mem = _fractions_after(pod, node)
+        return (cpu + mem) * 50
+
+
+@register_plugin
+class BalancedAllocation(ScorePlugin):
+    """Prefer nodes whose CPU and memory usage stay close to each other."""
+
+    name = "BalancedAllocation"
+
+    def score(self, pod: Pod, node: Node) -> float:
+        cpu, mem = _fractions_after(pod, node)
+        return (1 - abs(cpu - mem)) * 100
+
+
+@dataclass
+class PluginTiming:
+    calls: int = 0
+    total_sec: float = 0.0
+
+
+class SchedulerFramework:
+    """Runs registered filter and weighted score plugins to choose a node.
+
+    Each plugin's cumulative wall time and call count is kept in ``timings``
+    so the plugin dominating a scheduling cycle can be identified. Raw scores
+    are rescaled to 0-100 across the feasible nodes before weights are
+    applied, which lets plugins with different units be combined.
+    """
+
+    def __init__(
+        self,
+        filters: Optional[Sequence[FilterPlugin]] = None,
+        scorers: Optional[Sequence[Tuple[ScorePlugin, float]]] = None,
+    ) -> None:
+        self.filters: List[FilterPlugin] = list(filters) if filters is not None else [NodeReady(), TaintToleration(), NodeSelector(), NodeResourcesFit()]
+        self.scorers: List[Tuple[ScorePlugin, float]] = list(scorers) if scorers is not None else [(LeastAllocated(), 1.0)]
+        self.timings: Dict[str, PluginTiming] = {}
+
+    @classmethod
+    def from_names(cls, filters: Sequence[str], scorers: Dict[str, float]) -> "SchedulerFramework":
+        return cls([PLUGINS[n]() for n in filters], [(PLUGINS[n](), w) for n, w in scorers.items()])
+
+    def register_filter(self, plugin: FilterPlugin) -> None:
+        self.filters.append(plugin)
+
+    def register_scorer(self, plugin: ScorePlugin, weight: float = 1.0) -> None:
+        self.scorers.append((plugin, weight))
+
+    def _timed(self, name: str, fn: Callable[[], object]) -> object:
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            t = self.timings.setdefault(name, PluginTiming())
+            t.calls += 1
+            t.total_sec += time.perf_counter() - start
+
+    def feasible_nodes(self, pod: Pod, nodes: Sequence[Node]) -> List[Node]:
+        feasible = list(nodes)
+        for plugin in self.filters:
+            if not feasible:
+                break
+            feasible = self._timed(plugin.name, lambda: [n for n in feasible if plugin.filter(pod, n)])
+        return feasible
+
+    def choose(self, pod: Pod, nodes: Sequence[Node]) -> Optional[Node]:
+        feasible = self.feasible_nodes(pod, nodes)
+        if not feasible:
+            return None
+        totals = [0.0] * len(feasible)
+        for plugin, weight in self.scorers:
+            raw = self._timed(plugin.name, lambda: [plugin.score(pod, n) for n in feasible])
+            lo, hi = min(raw), max(raw)
+            span = hi - lo
+            for i, s in enumerate(raw):
+                totals[i] += weight * (100.0 * (s - lo) / span if span else 100.0)
+        # first node wins ties, matching max() over the node order
+        best = max(range(len(feasible)), key=totals.__getitem__)
+        return feasible[best]
+
+    def timing_table(self) -> List[Dict[str, object]]:
+        rows = [{"plugin": name, "calls": t.calls, "total_ms": round(t.total_sec * 1000, 3)} for name, t in self.timings.items()]
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def reset_timings(self) -> None:
+        self.timings.clear()
+
+
+PROFILES: Dict[str, Callable[[], SchedulerFramework]] = {
+    "default": SchedulerFramework,
+    "binpack": lambda: SchedulerFramework(scorers=[(MostAllocated(), 1.0)]),
+    "balanced": lambda: SchedulerFramework(scorers=[(LeastAllocated(), 1.0), (BalancedAllocation(), 1.0)]),
+}
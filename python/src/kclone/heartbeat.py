@@ -0,0 +1,151 @@
+"""Worker liveness over one shared pipe, and scheduled HealthCheck probes.
+
+Every worker inherits the write end of a single pipe and writes
+``<uid>\\n`` to it each heartbeat interval. Writes that small are atomic,
+so lines from different workers never interleave. One monitor thread waits
+on the read end with a selector, records when each uid was last heard from,
+and in between runs the liveness probes that are due, kept in a heap by
+due time so each wakeup only touches the due probes.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+import os
+import selectors
+import subprocess
+import threading
+import time
+
+from .models import HealthCheck
+
+UnhealthyCallback = Callable[[str, subprocess.Popen], None]
+
+
+class _Probe:
+    __slots__ = ("proc", "health_check", "failures", "seq")
+
+    def __init__(self, proc: subprocess.Popen, health_check: HealthCheck, seq: int) -> None:
+        self.proc = proc
+        self.health_check = health_check
+        self.failures = 0
+        self.seq = seq
+
+
+class HeartbeatMonitor:
+    """Tracks worker heartbeats and probes pods with an enabled HealthCheck.
+
+    Pass ``write_fd`` to workers (e.g. via ``pass_fds``). A probe fails when
+    the pod has not been heard from within ``heartbeat_interval +
+    timeout_sec``; after ``failure_threshold`` consecutive failures
+    ``on_unhealthy(uid, proc)`` is called on the monitor thread and probing
+    of that process stops.
+    """
+
+    def __init__(self, on_unhealthy: UnhealthyCallback, heartbeat_interval: float = 5.0) -> None:
+        self._on_unhealthy = on_unhealthy
+        self.heartbeat_interval = heartbeat_interval
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        self._lock = threading.Lock()
+        self._last_seen: Dict[str, float] = {}
+        self._probes: Dict[str, _Probe] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._pending = b""
+        self._stopped = False
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.read_fd, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name="kclone-heartbeats", daemon=True)
+        self._thread.start()
+
+    def last_seen(self, uid: str) -> Optional[float]:
+        return self._last_seen.get(uid)
+
+    def add(self, uid: str, proc: subprocess.Popen, health_check: HealthCheck) -> None:
+        """Start tracking a newly started worker, probing it if enabled."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_seen[uid] = now
+            self._probes.pop(uid, None)
+            if not health_check.enabled:
+                return
+            self._seq += 1
+            self._probes[uid] = _Probe(proc, health_check, self._seq)
+            heapq.heappush(self._heap, (now + health_check.initial_delay_sec, self._seq, uid))
+        self._wake()
+
+    def remove(self, uid: str) -> None:
+        with self._lock:
+            self._probes.pop(uid, None)
+            self._last_seen.pop(uid, None)
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake()
+        self._thread.join(timeout=2)
+        read_fd, write_fd, self.read_fd, self.write_fd = self.read_fd, self.write_fd, -1, -1
+        os.close(read_fd)
+        os.close(write_fd)
+
+    def _wake(self) -> None:
+        # an empty line is not a heartbeat; it only interrupts the select
+        if self.write_fd < 0:
+            return
+        try:
+            os.write(self.write_fd, b"\n")
+        except OSError:
+            pass
+
+    def _drain(self, now: float) -> None:
+        try:
+            while True:
+                data = os.read(self.read_fd, 65536)
+                if not data:
+                    break
+                self._pending += data
+        except BlockingIOError:
+            pass
+        *lines, self._pending = self._pending.split(b"\n")
+        with self._lock:
+            for line in lines:
+                if line:
+                    uid = line.decode()
+                    if uid in self._last_seen:
+                        self._last_seen[uid] = now
+
+    def _due_probes(self, now: float) -> List[Tuple[str, subprocess.Popen]]:
+        unhealthy = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, uid = heapq.heappop(self._heap)
+                probe = self._probes.get(uid)
+                if probe is None or probe.seq != seq:
+                    continue
+                if probe.proc.poll() is not None:
+                    del self._probes[uid]
+                    continue
+                hc = probe.health_check
+                stale = now - self._last_seen.get(uid, 0.0) > self.heartbeat_interval + hc.timeout_sec
+                probe.failures = probe.failures + 1 if stale else 0
+                if probe.failures >= hc.failure_threshold:
+                    del self._probes[uid]
+                    unhealthy.append((uid, probe.proc))
+                else:
+                    heapq.heappush(self._heap, (due + max(hc.period_sec, 0.01), seq, uid))
+        return unhealthy
+
+    def _run(self) -> None:
+        while not self._stopped:
+            with self._lock:
+                timeout = max(0.0, self._heap[0][0] - time.monotonic()) if self._heap else None
+            if self._selector.select(timeout):
+                self._drain(time.monotonic())
+            for uid, proc in self._due_probes(time.monotonic()):
+                try:
+                    self._on_unhealthy(uid, proc)
+                except Exception:
+                    pass
+        self._selector.close()
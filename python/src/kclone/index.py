@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+
+from .models import Node
+
+
+def least_requested_score(node: Node) -> int:
+    """Score used by the default scheduler: higher means more free resources."""
+    return node.cpu_available * 1000 + node.mem_available
+
+
+class NodeCapacityIndex:
+    """Schedulable nodes bucketed by free CPU, for least-requested placement.
+
+    A node fits a pod when its free CPU and its free memory both cover the
+    requests, and the best fit has the highest ``least_requested_score``,
+    ties going to the node indexed first. Nodes are grouped by free CPU into
+    buckets whose distinct values are kept sorted; each bucket is a heap on
+    ``(-free memory, seq)``, ``seq`` being the order the node was first
+    indexed. Within a bucket the heap top has the best score and the most
+    memory, so it is the only candidate: ``best_fit`` compares one node per
+    bucket with enough free CPU and never walks nodes that cannot fit.
+
+    With ``B`` distinct free-CPU values (at most the largest node's CPU
+    capacity plus one, as CPU is counted in whole cores) and ``N`` nodes,
+    ``best_fit`` is O(B) and ``update`` O(log N), plus O(B) when a free-CPU
+    value appears or disappears. Superseded heap entries are skipped when
+    they surface and a bucket is rebuilt once they outnumber its nodes.
+    Only ready, untainted nodes are indexed. The owner must call ``update``
+    whenever a node's allocation, readiness or taints change.
+    """
+
+    def __init__(self) -> None:
+        self._cpus: List[int] = []
+        self._buckets: Dict[int, List[Tuple[int, int, int, str]]] = {}
+        # free cpu -> number of live entries in its bucket
+        self._sizes: Dict[int, int] = {}
+        # name -> (free cpu, push id) of its live heap entry
+        self._live: Dict[str, Tuple[int, int]] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._pushes = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def update(self, node: Node) -> None:
+        self.discard(node.name)
+        seq = self._seq.get(node.name)
+        if seq is None:
+            seq = self._seq[node.name] = self._next_seq
+            self._next_seq += 1
+        if not node.ready or node.taints:
+            return
+        cpu = node.cpu_available
+        bucket = self._buckets.get(cpu)
+        if bucket is None:
+            bucket = self._buckets[cpu] = []
+            self._sizes[cpu] = 0
+            insort(self._cpus, cpu)
+        self._pushes += 1
+        heapq.heappush(bucket, (-node.mem_available, seq, self._pushes, node.name))
+        self._sizes[cpu] += 1
+        self._live[node.name] = (cpu, self._pushes)
+
+    def discard(self, name: str) -> None:
+        live = self._live.pop(name, None)
+        if live is None:
+            return
+        cpu = live[0]
+        self._sizes[cpu] -= 1
+        if not self._sizes[cpu]:
+            del self._buckets[cpu], self._sizes[cpu]
+            del self._cpus[bisect_left(self._cpus, cpu)]
+        elif len(self._buckets[cpu]) > 2 * self._sizes[cpu] + 8:
+            bucket = self._buckets[cpu] = [e for e in self._buckets[cpu] if self._live.get(e[3]) == (cpu, e[2])]
+            heapq.heapify(bucket)
+
+    def remove(self, name: str) -> None:
+        """Forget a deleted node; if it is added again it ties after the rest."""
+        self.discard(name)
+        self._seq.pop(name, None)
+
+    def _top(self, cpu: int) -> Tuple[int, int, int, str]:
+        bucket = self._buckets[cpu]
+        while self._live.get(bucket[0][3]) != (cpu, bucket[0][2]):
+            heapq.heappop(bucket)
+        return bucket[0]
+
+    def best_fit(self, nodes: Dict[str, Node], cpu: int, mem: int) -> Optional[Node]:
+        """Return the highest-scoring indexed node that fits ``cpu``/``mem``."""
+        best: Optional[Tuple[int, int]] = None
+        best_name = None
+        for free_cpu in self._cpus[bisect_left(self._cpus, cpu):]:
+            neg_mem, seq, _, name = self._top(free_cpu)
+            if -neg_mem < mem:
+                continue
+            key = (free_cpu * 1000 - neg_mem, -seq)
+            if best is None or key > best:
+                best, best_name = key, name
+        return None if best_name is None else nodes[best_name]
+
+
+class LabelIndex:
+    """Inverted index from ``(label key, value)`` to the uids carrying it.
+
+    Selector matching intersects posting lists starting from the smallest
+    one, so cost depends on the narrowest label rather than the pod count.
+    Results come back in the order uids were first indexed. Label dicts are
+    held by reference and must be replaced, not mutated, to change labels.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._labels: Dict[str, Dict[str, str]] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def add(self, uid: str, labels: Dict[str, str]) -> None:
+        self.discard(uid)
+        if uid not in self._seq:
+            self._seq[uid] = self._next_seq
+            self._next_seq += 1
+        self._labels[uid] = labels
+        for item in labels.items():
+            self._postings.setdefault(item, set()).add(uid)
+
+    def discard(self, uid: str) -> None:
+        labels = self._labels.pop(uid, None)
+        if labels is None:
+            return
+        for item in labels.items():
+            posting = self._postings.get(item)
+            if posting is not None:
+                posting.discard(uid)
+                if not posting:
+                    del self._postings[item]
+
+    def remove(self, uid: str) -> None:
+        self.discard(uid)
+        self._seq.pop(uid, None)
+
+    def select(self, selector: Dict[str, str]) -> List[str]:
+        if not selector:
+            return list(self._seq)
+        postings = []
+        for item in selector.items():
+            posting = self._postings.get(item)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        matched = postings[0]
+        for other in postings[1:]:
+            matched = matched & other
+            if not matched:
+                return []
+        return sorted(matched, key=self._seq.__getitem__)
+
+
+class SelectorIndex:
+    """Finds the selectors (e.g. services) that match a given label set.
+
+    Each selector is filed under one of its ``(key, value)`` pairs, so only
+    selectors sharing at least that pair with the labels are checked in full.
+    Empty selectors match everything and are always candidates.
+    """
+
+    def __init__(self) -> None:
+        self._by_item: Dict[Tuple[str, str], Set[str]] = {}
+        self._match_all: Set[str] = set()
+        self._selectors: Dict[str, Dict[str, str]] = {}
+
+    def add(self, name: str, selector: Dict[str, str]) -> None:
+        self.remove(name)
+        self._selectors[name] = selector
+        if not selector:
+            self._match_all.add(name)
+            return
+        item = next(iter(selector.items()))
+        self._by_item.setdefault(item, set()).add(name)
+
+    def remove(self, name: str) -> None:
+        selector = self._selectors.pop(name, None)
+        if selector is None:
+            return
+        self._match_all.discard(name)
+        if selector:
+            item = next(iter(selector.items()))
+            names = self._by_item.get(item)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._by_item[item]
+
+    def matching(self, labels: Dict[str, str]) -> Set[str]:
+        found = set(self._match_all)
+        for item in labels.items():
+            for name in self._by_item.get(item, ()):
+                if all(labels.get(k) == v for k, v in self._selectors[name].items()):
+                    found.add(name)
+        return found
+
+
+class PodPlacementIndex:
+    """Pod uids grouped by phase and by bound node.
+
+    Each group is an insertion-ordered dict used as a set, so membership
+    changes are O(1) and listing a group costs O(size of the group).
+    """
+
+    def __init__(self) -> None:
+        self._by_phase: Dict[str, Dict[str, None]] = {}
+        self._by_node: Dict[str, Dict[str, None]] = {}
+        self._placement: Dict[str, Tuple[str, Optional[str]]] = {}
+
+    def update(self, uid: str, phase: str, node_name: Optional[str]) -> None:
+        old = self._placement.get(uid)
+        if old == (phase, node_name):
+            return
+        if old is not None:
+            self._discard(uid, *old)
+        self._placement[uid] = (phase, node_name)
+        self._by_phase.setdefault(phase, {})[uid] = None
+        if node_name:
+            self._by_node.setdefault(node_name, {})[uid] = None
+
+    def remove(self, uid: str) -> None:
+        old = self._placement.pop(uid, None)
+        if old is not None:
+            self._discard(uid, *old)
+
+    def _discard(self, uid: str, phase: str, node_name: Optional[str]) -> None:
+        for groups, key in ((self._by_phase, phase), (self._by_node, node_name)):
+            group = groups.get(key)
+            if group is not None:
+                group.pop(uid, None)
+                if not group:
+                    del groups[key]
+
+    def with_phase(self, phase: str) -> List[str]:
+        return list(self._by_phase.get(phase, ()))
+
+    def on_node(self, node_name: str) -> List[str]:
+        return list(self._by_node.get(node_name, ()))
+
+    def phase_counts(self) -> Dict[str, int]:
+        return {phase: len(uids) for phase, uids in self._by_phase.items()}
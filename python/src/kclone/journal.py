@@ -0,0 +1,283 @@
+"""Append-only journal of cluster changes, compacted by background snapshots.
+
+A ``Journal`` follows a ``ClusterState`` through a watch and appends one
+JSON line per changed object to the current log segment::
+
+    {"v": <resource version>, "k": "Pod", "n": "pod-7", "o": {...}}
+
+with ``"o"`` null for a deletion. Everything that arrived while the previous
+write was in flight goes out in one write and one fsync (group commit), so
+persisting a change costs O(change) rather than O(cluster).
+
+After ``snapshot_every`` records the journal takes an MVCC snapshot of the
+state, switches to a new segment and writes the snapshot on a background
+thread; once it is on disk the older segments are deleted. ``recover_state``
+loads the snapshot and replays the records after it, so restart time is
+bounded by the snapshot size plus at most ``snapshot_every`` records.
+
+Resource versions restart with every process, so each ``Journal`` begins a
+new epoch by writing a snapshot of the state it was given, and recovery only
+replays segments of the snapshot's epoch.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import threading
+
+from .persistence import (
+    _dict_to_state,
+    atomic_write,
+    deployment_to_dict,
+    node_to_dict,
+    pod_to_dict,
+    service_to_dict,
+    snapshot_to_dict,
+)
+from .state import ClusterSnapshot, ClusterState
+from .watch import TooOldResourceVersion
+
+SNAPSHOT = "snapshot.json"
+
+_FIELDS = {"Node": "nodes", "Pod": "pods", "Service": "services", "Deployment": "deployments"}
+_ENCODERS = {"Node": node_to_dict, "Pod": pod_to_dict, "Service": service_to_dict, "Deployment": deployment_to_dict}
+
+
+def _segment_name(epoch: int, segment: int) -> str:
+    return f"{epoch:08d}-{segment:08d}.log"
+
+
+def _segments(directory: Path) -> List[Tuple[int, int, Path]]:
+    found = []
+    for path in directory.glob("*.log"):
+        parts = path.stem.split("-")
+        if len(parts) == 2 and all(p.isdigit() for p in parts):
+            found.append((int(parts[0]), int(parts[1]), path))
+    return sorted(found)
+
+
+def _read_records(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        for line in f:
+            # a crash mid-append leaves at most one torn line, at the end
+            if not line.endswith(b"\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def read_snapshot(directory: str | Path) -> Dict[str, Any]:
+    path = Path(directory) / SNAPSHOT
+    if not path.exists():
+        return {"epoch": 0, "resource_version": 0, "state": {}}
+    return json.loads(path.read_bytes())
+
+
+def _suffix(value: Optional[str], prefix: str) -> int:
+    if value and value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return 0
+
+
+def recover_state(directory: str | Path) -> ClusterState:
+    """Rebuild the cluster from the latest snapshot plus the log after it."""
+    directory = Path(directory)
+    snap = read_snapshot(directory)
+    data = dict(snap["state"])
+    tables = {
+        field: {obj["uid" if kind == "Pod" else "name"]: obj for obj in data.get(field, [])}
+        for kind, field in _FIELDS.items()
+    }
+    for epoch, _, path in _segments(directory):
+        if epoch != snap["epoch"]:
+            continue
+        for record in _read_records(path):
+            if record["v"] <= snap["resource_version"]:
+                continue  # already in the snapshot
+            table = tables[_FIELDS[record["k"]]]
+            if record["o"] is None:
+                table.pop(record["n"], None)
+            else:
+                table[record["n"]] = record["o"]
+    for field, table in tables.items():
+        data[field] = list(table.values())
+    # uids and service IPs handed out after the snapshot
+    data["uid_counter"] = max([data.get("uid_counter", 0)] + [_suffix(uid, "pod-") for uid in tables["pods"]])
+    data["vip_counter"] = max(
+        [data.get("vip_counter", 1)] + [_suffix(s.get("virtual_ip"), "10.96.0.") + 1 for s in tables["services"].values()]
+    )
+    return _dict_to_state(data)
+
+
+class Journal:
+    """Persists every change to ``state`` under ``directory``.
+
+    Records are appended by a background thread; ``sync`` waits until
+    everything changed so far is on disk. ``fsync=False`` trades durability
+    across power loss for speed (the OS still gets every write).
+    """
+
+    def __init__(self, state: ClusterState, directory: str | Path, fsync: bool = True, snapshot_every: int = 10000) -> None:
+        self.state = state
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self._cond = threading.Condition()
+        # held while capturing a snapshot for records and writing them, and
+        # while capturing a snapshot and switching segments, so every record
+        # written after a rotation's snapshot goes to the new segment
+        self._io_lock = threading.Lock()
+        # segment -> highest resource version written to it, this epoch
+        self._segment_versions: Dict[int, int] = {}
+        self._durable = 0
+        self._error: Optional[BaseException] = None
+        self._stopped = False
+        self._epoch = read_snapshot(self.directory)["epoch"] + 1
+        self._segment = 0
+        self._records = 0
+        self._snapshotting = False
+        # watch first: anything after the snapshot below is then journaled
+        self._watcher = state.watch()
+        self._write_snapshot(state.snapshot(wait=True), self._segment)
+        self._file = open(self.directory / _segment_name(self._epoch, self._segment), "ab")
+        self._thread = threading.Thread(target=self._run, name="kclone-journal", daemon=True)
+        self._thread.start()
+
+    @property
+    def durable_version(self) -> int:
+        """Highest resource version whose changes are all on disk."""
+        return self._durable
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every change made so far has been persisted."""
+        target = self.state.resource_version
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._durable >= target or self._error is not None, timeout)
+            if self._error is not None:
+                raise self._error
+            return done
+
+    def snapshot(self) -> None:
+        """Snapshot now and drop the log it covers; waits until written."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._snapshotting)
+            self._snapshotting = True
+        try:
+            self._write_snapshot(*self._rotate())
+        finally:
+            with self._cond:
+                self._snapshotting = False
+                self._cond.notify_all()
+
+    def close(self) -> None:
+        """Write out the remaining changes and stop."""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._thread.join()
+        with self._cond:
+            self._cond.wait_for(lambda: not self._snapshotting)
+        self._watcher.stop()
+        self._file.close()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    events = self._watcher.poll(timeout=0.1)
+                except TooOldResourceVersion:
+                    # events were dropped; a fresh snapshot covers them
+                    self._watcher = self.state.watch()
+                    self.snapshot()
+                    continue
+                if events:
+                    self._append(events)
+                elif self._stopped:
+                    return
+        except BaseException as exc:
+            with self._cond:
+                self._error = exc
+                self._cond.notify_all()
+
+    def _append(self, events) -> None:
+        # group commit: one line per object changed in the batch, holding
+        # its state as of one consistent snapshot, in a single write
+        keys = dict.fromkeys((event.kind, event.name) for event in events)
+        with self._io_lock:
+            snap = self.state.snapshot(wait=True)
+            lines = []
+            for kind, name in keys:
+                obj = getattr(snap, _FIELDS[kind]).get(name)
+                record = {"v": snap.resource_version, "k": kind, "n": name, "o": None if obj is None else _ENCODERS[kind](obj)}
+                lines.append(json.dumps(record, separators=(",", ":")))
+            lines.append("")
+            self._file.write("\n".join(lines).encode())
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._segment_versions[self._segment] = snap.resource_version
+        with self._cond:
+            self._records += len(keys)
+            self._durable = max(self._durable, events[-1].resource_version)
+            self._cond.notify_all()
+            due = self._records >= self.snapshot_every and not self._snapshotting
+            if due:
+                self._snapshotting = True
+        if due:
+            threading.Thread(target=self._background_snapshot, args=self._rotate(), name="kclone-snapshot", daemon=True).start()
+
+    def _rotate(self) -> Tuple[ClusterSnapshot, int]:
+        with self._io_lock:
+            # later records go to a new segment; the current ones are
+            # covered by ``snap`` and are deleted once it is written
+            snap = self.state.snapshot(wait=True)
+            self._file.close()
+            self._segment += 1
+            self._file = open(self.directory / _segment_name(self._epoch, self._segment), "ab")
+            segment = self._segment
+        with self._cond:
+            self._records = 0
+        return snap, segment
+
+    def _background_snapshot(self, snap: ClusterSnapshot, segment: int) -> None:
+        try:
+            self._write_snapshot(snap, segment)
+        except BaseException as exc:
+            with self._cond:
+                self._error = exc
+        finally:
+            with self._cond:
+                self._snapshotting = False
+                self._cond.notify_all()
+
+    def _write_snapshot(self, snap: ClusterSnapshot, segment: int) -> None:
+        state = snapshot_to_dict(snap, getattr(self.state, "_uid_counter", 0), getattr(self.state, "_vip_counter", 1))
+        payload = {"epoch": self._epoch, "resource_version": snap.resource_version, "state": state}
+        with atomic_write(self.directory / SNAPSHOT) as f:
+            f.write(json.dumps(payload, separators=(",", ":")).encode())
+        with self._io_lock:
+            # older epochs are never replayed again; this epoch's segments
+            # only go once every record in them is covered by ``snap``
+            kept = {seg for seg, version in self._segment_versions.items() if seg >= segment or version > snap.resource_version}
+            self._segment_versions = {seg: self._segment_versions[seg] for seg in kept}
+        for epoch, seg, path in _segments(self.directory):
+            if epoch < self._epoch or (epoch == self._epoch and seg < segment and seg not in kept):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        with self._cond:
+            self._durable = max(self._durable, snap.resource_version)
+            self._cond.notify_all()
+
+
+def open_journal(directory: str | Path, **kwargs: Any) -> Tuple[ClusterState, Journal]:
+    """Recover the cluster stored under ``directory`` and keep journaling it."""
+    state = recover_state(directory)
+    return state, Journal(state, directory, **kwargs)
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 
 from .models import PodSpec
 from .scheduler import schedule_pending_pods
@@ -15,30 +14,38 @@ def create_pod(
     cpu_request: int,
     mem_request: int,
     labels: Dict[str, str],
+    node_selector: Optional[Dict[str, str]] = None,
+    tolerations: Optional[List[str]] = None,
 ) -> None:
-    spec = PodSpec(name=name, image=image, cpu_request=cpu_request, mem_request=mem_request, labels=labels)
+    spec = PodSpec(
+        name=name,
+        image=image,
+        cpu_request=cpu_request,
+        mem_request=mem_request,
+        labels=labels,
+        node_selector=node_selector or {},
+        tolerations=tolerations or [],
+    )
     pod = state.add_pod(spec)
     # trigger scheduling attempt
     schedule_pending_pods(state)
-    state.refresh_service_endpoints()
     return pod
 
 
 def delete_pod(state: ClusterState, uid: str) -> None:
     state.remove_pod(uid)
-    state.refresh_service_endpoints()
 
 
 def health_check_pod(state: ClusterState, uid: str) -> bool:
-    """Perform a basic health check simulation for a pod."""
+    """Return whether a pod is running and passing its liveness probe.
+
+    Probes run in the background for pods whose spec enables a health check;
+    other running pods are always considered healthy.
+    """
     pod = state.get_pod(uid)
     if not pod:
         raise KeyError(f"Pod {uid} not found")
-    if pod.status.phase == "Running":
-        pod.status.healthy = True
-        pod.status.start_time = datetime.now().timestamp()
-        return True
-    return False
+    return pod.status.phase == "Running" and pod.status.healthy
 
 
 def restart_pod(state: ClusterState, uid: str) -> None:
@@ -55,7 +62,6 @@ def restart_pod(state: ClusterState, uid: str) -> None:
 
     # delete and create new
     delete_pod(state, uid)
-    new_pod = state.add_pod(spec)
+    new_pod = state.add_pod(spec, name=pod.name)
     new_pod.status.restart_count = restart_count + 1
     schedule_pending_pods(state)
-    state.refresh_service_endpoints()
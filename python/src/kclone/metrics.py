@@ -0,0 +1,201 @@
+"""Pod and node resource usage sampled from the worker processes.
+
+The collector reads the current pods from a published snapshot, so it never
+takes the state lock, and samples every worker pid in one pass: straight from
+``/proc/<pid>/stat`` on Linux, through ``psutil`` elsewhere. History is kept
+per pod in fixed-size ``array``-backed ring buffers.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
+
+import psutil
+
+from .state import ClusterState
+
+_PROC = "/proc"
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class RingBuffer:
+    """The last ``capacity`` values appended, in a preallocated ``array``."""
+
+    __slots__ = ("_data", "_next", "_size")
+
+    def __init__(self, capacity: int, typecode: str = "d") -> None:
+        self._data = array(typecode, [0]) * capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float) -> None:
+        self._data[self._next] = value
+        self._next = (self._next + 1) % len(self._data)
+        if self._size < len(self._data):
+            self._size += 1
+
+    def latest(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._data[self._next - 1]
+
+    def values(self) -> List[float]:
+        """Values oldest first."""
+        start = (self._next - self._size) % len(self._data)
+        return [self._data[(start + i) % len(self._data)] for i in range(self._size)]
+
+
+class PodMetrics:
+    """Sample history for one pod: CPU percent of one core and RSS bytes."""
+
+    __slots__ = ("pid", "cpu", "rss", "_last_cpu_time", "_last_sample")
+
+    def __init__(self, pid: int, history: int) -> None:
+        self.pid = pid
+        self.cpu = RingBuffer(history)
+        self.rss = RingBuffer(history, "q")
+        self._last_cpu_time: Optional[float] = None
+        self._last_sample = 0.0
+
+    def record(self, cpu_time: float, rss: int, now: float) -> None:
+        if self._last_cpu_time is not None and now > self._last_sample:
+            self.cpu.append(100.0 * (cpu_time - self._last_cpu_time) / (now - self._last_sample))
+        self.rss.append(rss)
+        self._last_cpu_time = cpu_time
+        self._last_sample = now
+
+
+def _read_proc(pids: Iterable[int]) -> Dict[int, Tuple[float, int]]:
+    usage: Dict[int, Tuple[float, int]] = {}
+    for pid in pids:
+        try:
+            with open(f"{_PROC}/{pid}/stat", "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        # fields after "(comm)": state is field 3, utime/stime 14/15, rss 24
+        fields = data[data.rindex(b")") + 2:].split()
+        usage[pid] = ((int(fields[11]) + int(fields[12])) / _CLK_TCK, int(fields[21]) * _PAGE_SIZE)
+    return usage
+
+
+def _read_psutil(pids: Iterable[int]) -> Dict[int, Tuple[float, int]]:
+    wanted = set(pids)
+    usage: Dict[int, Tuple[float, int]] = {}
+    for proc in psutil.process_iter(["pid", "cpu_times", "memory_info"]):
+        info = proc.info
+        if info["pid"] in wanted and info["cpu_times"] is not None and info["memory_info"] is not None:
+            times = info["cpu_times"]
+            usage[info["pid"]] = (times.user + times.system, info["memory_info"].rss)
+    return usage
+
+
+def read_usage(pids: Iterable[int]) -> Dict[int, Tuple[float, int]]:
+    """Return ``{pid: (cpu seconds, rss bytes)}`` for the pids still alive."""
+    if os.path.isdir(_PROC):
+        return _read_proc(pids)
+    return _read_psutil(pids)
+
+
+class MetricsCollector:
+    """Samples every running pod's worker every ``interval`` seconds.
+
+    Call ``sample`` directly or ``start`` a background thread, which calls
+    ``on_sample`` with the collector after every pass. CPU figures need two
+    samples of the same process, so a pod's first sample only records RSS.
+    """
+
+    def __init__(
+        self,
+        state: ClusterState,
+        interval: float = 5.0,
+        history: int = 60,
+        on_sample: Optional[Callable[["MetricsCollector"], None]] = None,
+    ) -> None:
+        self.state = state
+        self.interval = interval
+        self.history = history
+        self.on_sample = on_sample
+        self._pods: Dict[str, PodMetrics] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        running = {pod.uid: pod.pid for pod in self.state.snapshot().pods.values() if pod.pid is not None}
+        usage = read_usage(running.values())
+        now = time.monotonic()
+        for uid in [uid for uid in self._pods if uid not in running]:
+            del self._pods[uid]
+        for uid, pid in running.items():
+            sample = usage.get(pid)
+            if sample is None:
+                continue
+            metrics = self._pods.get(uid)
+            if metrics is None or metrics.pid != pid:
+                metrics = self._pods[uid] = PodMetrics(pid, self.history)
+            metrics.record(sample[0], sample[1], now)
+
+    def pod(self, uid: str) -> Optional[PodMetrics]:
+        return self._pods.get(uid)
+
+    def latest(self) -> List[Tuple[str, str, Optional[str], Optional[float], int]]:
+        """``(uid, name, node, cpu percent, rss bytes)`` of every sampled pod."""
+        snap = self.state.snapshot()
+        rows = []
+        for uid, metrics in self._pods.items():
+            pod = snap.pods.get(uid)
+            if pod is not None:
+                rows.append((uid, pod.name, pod.status.node_name, metrics.cpu.latest(), int(metrics.rss.latest())))
+        return rows
+
+    def pod_table(self) -> List[Dict[str, object]]:
+        return [
+            {"uid": uid, "name": name, "node": node, "cpu%": None if cpu is None else round(cpu, 1), "rss_mb": round(rss / 2**20, 1)}
+            for uid, name, node, cpu, rss in self.latest()
+        ]
+
+    def node_table(self) -> List[Dict[str, object]]:
+        snap = self.state.snapshot()
+        totals: Dict[str, List[float]] = {name: [0.0, 0, 0] for name in snap.nodes}
+        for uid, metrics in self._pods.items():
+            pod = snap.pods.get(uid)
+            if pod is None or pod.status.node_name not in totals:
+                continue
+            total = totals[pod.status.node_name]
+            total[0] += metrics.cpu.latest() or 0.0
+            total[1] += metrics.rss.latest()
+            total[2] += 1
+        return [
+            {"name": name, "pods": int(pods), "cpu%": round(cpu, 1), "rss_mb": round(rss / 2**20, 1)}
+            for name, (cpu, rss, pods) in totals.items()
+        ]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kclone-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample()
+                if self.on_sample is not None:
+                    self.on_sample(self)
+            except Exception:
+                pass
+            self._stop.wait(self.interval)
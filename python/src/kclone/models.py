@@ -1,10 +1,44 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
 import time
 
 
+def slotted(cls):
+    """Rebuild a dataclass with ``__slots__`` so instances carry no ``__dict__``.
+
+    Equivalent to ``dataclass(slots=True)``, which needs Python 3.10.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ("__dict__", "__weakref__")}
+    namespace["__slots__"] = names
+    new_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
+
+
+_LABEL_CACHE_LIMIT = 65536
+_label_cache: Dict[Tuple[Tuple[str, str], ...], Dict[str, str]] = {}
+
+
+def intern_labels(labels: Dict[str, str]) -> Dict[str, str]:
+    """Return a shared dict equal to ``labels``.
+
+    Pods stamped from the same template then share one labels dict. Label
+    dicts are treated as immutable throughout the state (changes replace the
+    dict), which is what makes sharing safe.
+    """
+    key = tuple(labels.items())
+    shared = _label_cache.get(key)
+    if shared is None:
+        shared = dict(labels)
+        if len(_label_cache) < _LABEL_CACHE_LIMIT:
+            _label_cache[key] = shared
+    return shared
+
+
+@slotted
 @dataclass
 class Node:
     name: str
@@ -15,6 +49,7 @@ class Node:
     mem_allocated: int = 0
     ready: bool = True
     taints: List[str] = field(default_factory=list)
+    resource_version: int = 0
 
     @property
     def cpu_available(self) -> int:
@@ -28,6 +63,11 @@ class Node:
         return cpu <= self.cpu_available and mem <= self.mem_available
 
 
+# phases of pods that count towards a deployment's replicas
+ACTIVE_PHASES = ("Pending", "Running", "CrashLoopBackOff")
+
+
+@slotted
 @dataclass
 class PodStatus:
     phase: str = "Pending"
@@ -38,7 +78,8 @@ class PodStatus:
     start_time: Optional[float] = None
 
 
-@dataclass
+@slotted
+@dataclass(frozen=True)
 class HealthCheck:
     enabled: bool = False
     initial_delay_sec: int = 0
@@ -47,6 +88,15 @@ class HealthCheck:
     failure_threshold: int = 3
 
 
+# shared by every spec that does not configure a health check
+DEFAULT_HEALTH_CHECK = HealthCheck()
+
+
+def shared_health_check(hc: HealthCheck) -> HealthCheck:
+    return DEFAULT_HEALTH_CHECK if hc == DEFAULT_HEALTH_CHECK else hc
+
+
+@slotted
 @dataclass
 class PodSpec:
     name: str
@@ -54,10 +104,13 @@ class PodSpec:
     cpu_request: int = 1
     mem_request: int = 128
     labels: Dict[str, str] = field(default_factory=dict)
-    health_check: HealthCheck = field(default_factory=HealthCheck)
+    health_check: HealthCheck = field(default_factory=lambda: DEFAULT_HEALTH_CHECK)
     restart_policy: str = "Always"  # Always, OnFailure, Never
+    node_selector: Dict[str, str] = field(default_factory=dict)
+    tolerations: List[str] = field(default_factory=list)
 
 
+@slotted
 @dataclass
 class Pod:
     name: str
@@ -65,6 +118,7 @@ class Pod:
     status: PodStatus = field(default_factory=PodStatus)
     uid: str = ""
     pid: Optional[int] = None
+    resource_version: int = 0
 
     def mark_running(self) -> None:
         self.status.phase = "Running"
@@ -77,7 +131,12 @@ class Pod:
     def mark_pending(self) -> None:
         self.status.phase = "Pending"
 
+    def mark_crash_loop(self, msg: str) -> None:
+        self.status.phase = "CrashLoopBackOff"
+        self.status.message = msg
+
 
+@slotted
 @dataclass
 class Service:
     name: str
@@ -87,8 +146,10 @@ class Service:
     virtual_ip: str
     endpoints: List[str] = field(default_factory=list)  # list of pod uids
     rr_index: int = 0
+    resource_version: int = 0
 
 
+@slotted
 @dataclass
 class Deployment:
     name: str
@@ -98,4 +159,5 @@ class Deployment:
     labels: Dict[str, str] = field(default_factory=dict)
     cpu_request: int = 1
     mem_request: int = 128
+    resource_version: int = 0
  
\ No newline at end of file
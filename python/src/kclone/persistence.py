@@ -1,180 +1,405 @@
 from __future__ import annotations
 
-import json
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Mapping
+import gzip
+import json
+import lzma
+import os
+import threading
+import zlib
 
-from .models import Deployment, HealthCheck, Node, Pod, PodSpec, PodStatus, Service
-from .state import ClusterState
+from .models import Deployment, HealthCheck, Node, Pod, PodSpec, PodStatus, Service, intern_labels, shared_health_check
+from .state import ClusterSnapshot, ClusterState
 from . import db as _db
 
 
-def _state_to_dict(state: ClusterState) -> Dict[str, Any]:
+def node_to_dict(n: Node) -> Dict[str, Any]:
+    return {
+        "name": n.name,
+        "cpu_capacity": n.cpu_capacity,
+        "mem_capacity": n.mem_capacity,
+        "labels": n.labels,
+        "cpu_allocated": n.cpu_allocated,
+        "mem_allocated": n.mem_allocated,
+        "ready": n.ready,
+        "taints": n.taints,
+    }
+
+
+def pod_to_dict(p: Pod) -> Dict[str, Any]:
+    return {
+        "uid": p.uid,
+        "name": p.name,
+        "spec": {
+            "name": p.spec.name,
+            "image": p.spec.image,
+            "cpu_request": p.spec.cpu_request,
+            "mem_request": p.spec.mem_request,
+            "labels": p.spec.labels,
+            "restart_policy": p.spec.restart_policy,
+            "node_selector": p.spec.node_selector,
+            "tolerations": p.spec.tolerations,
+            "health_check": {
+                "enabled": p.spec.health_check.enabled,
+                "initial_delay_sec": p.spec.health_check.initial_delay_sec,
+                "period_sec": p.spec.health_check.period_sec,
+                "timeout_sec": p.spec.health_check.timeout_sec,
+                "failure_threshold": p.spec.health_check.failure_threshold,
+            },
+        },
+        "status": {
+            "phase": p.status.phase,
+            "node_name": p.status.node_name,
+            "message": p.status.message,
+            "healthy": p.status.healthy,
+            "restart_count": p.status.restart_count,
+            "start_time": p.status.start_time,
+        },
+    }
+
+
+def service_to_dict(s: Service) -> Dict[str, Any]:
+    return {
+        "name": s.name,
+        "selector": s.selector,
+        "port": s.port,
+        "target_port": s.target_port,
+        "virtual_ip": s.virtual_ip,
+        "endpoints": s.endpoints,
+        "rr_index": s.rr_index,
+    }
+
+
+def deployment_to_dict(d: Deployment) -> Dict[str, Any]:
+    return {
+        "name": d.name,
+        "image": d.image,
+        "replicas": d.replicas,
+        "selector": d.selector,
+        "labels": d.labels,
+        "cpu_request": d.cpu_request,
+        "mem_request": d.mem_request,
+    }
+
+
+def node_from_dict(n: Dict[str, Any]) -> Node:
+    node = Node(
+        name=n["name"],
+        cpu_capacity=n["cpu_capacity"],
+        mem_capacity=n["mem_capacity"],
+        labels=n.get("labels", {}),
+        ready=n.get("ready", True),
+        taints=n.get("taints", []),
+    )
+    node.cpu_allocated = n.get("cpu_allocated", 0)
+    node.mem_allocated = n.get("mem_allocated", 0)
+    return node
+
+
+def pod_from_dict(p: Dict[str, Any]) -> Pod:
+    spec_data = p["spec"]
+    status_data = p["status"]
+
+    hc_data = spec_data.get("health_check", {})
+    health_check = shared_health_check(HealthCheck(
+        enabled=hc_data.get("enabled", False),
+        initial_delay_sec=hc_data.get("initial_delay_sec", 0),
+        period_sec=hc_data.get("period_sec", 10),
+        timeout_sec=hc_data.get("timeout_sec", 1),
+        failure_threshold=hc_data.get("failure_threshold", 3),
+    ))
+
+    spec = PodSpec(
+        name=spec_data["name"],
+        image=spec_data["image"],
+        cpu_request=spec_data.get("cpu_request", 1),
+        mem_request=spec_data.get("mem_request", 128),
+        labels=intern_labels(spec_data.get("labels", {})),
+        health_check=health_check,
+        restart_policy=spec_data.get("restart_policy", "Always"),
+        node_selector=spec_data.get("node_selector", {}),
+        tolerations=spec_data.get("tolerations", []),
+    )
+    status = PodStatus(
+        phase=status_data.get("phase", "Pending"),
+        node_name=status_data.get("node_name"),
+        message=status_data.get("message", ""),
+        healthy=status_data.get("healthy", True),
+        restart_count=status_data.get("restart_count", 0),
+        start_time=status_data.get("start_time"),
+    )
+    return Pod(name=p["name"], spec=spec, status=status, uid=p["uid"])
+
+
+def service_from_dict(s: Dict[str, Any]) -> Service:
+    svc = Service(
+        name=s["name"],
+        selector=s["selector"],
+        port=s["port"],
+        target_port=s["target_port"],
+        virtual_ip=s["virtual_ip"],
+        endpoints=s.get("endpoints", []),
+    )
+    svc.rr_index = s.get("rr_index", 0)
+    return svc
+
+
+def deployment_from_dict(d: Dict[str, Any]) -> Deployment:
+    return Deployment(
+        name=d["name"],
+        image=d["image"],
+        replicas=d["replicas"],
+        selector=d["selector"],
+        labels=d.get("labels", {}),
+        cpu_request=d.get("cpu_request", 1),
+        mem_request=d.get("mem_request", 128),
+    )
+
+
+def snapshot_to_dict(snap: ClusterSnapshot, uid_counter: int = 0, vip_counter: int = 1) -> Dict[str, Any]:
     return {
-        "uid_counter": getattr(state, "_uid_counter", 0),
-        "vip_counter": getattr(state, "_vip_counter", 1),
-        "nodes": [
-            {
-                "name": n.name,
-                "cpu_capacity": n.cpu_capacity,
-                "mem_capacity": n.mem_capacity,
-                "labels": n.labels,
-                "cpu_allocated": n.cpu_allocated,
-                "mem_allocated": n.mem_allocated,
-                "ready": n.ready,
-                "taints": n.taints,
-            }
-            for n in state.list_nodes()
-        ],
-        "pods": [
-            {
-                "uid": p.uid,
-                "name": p.name,
-                "spec": {
-                    "name": p.spec.name,
-                    "image": p.spec.image,
-                    "cpu_request": p.spec.cpu_request,
-                    "mem_request": p.spec.mem_request,
-                    "labels": p.spec.labels,
-                    "restart_policy": p.spec.restart_policy,
-                    "health_check": {
-                        "enabled": p.spec.health_check.enabled,
-                        "initial_delay_sec": p.spec.health_check.initial_delay_sec,
-                        "period_sec": p.spec.health_check.period_sec,
-                        "timeout_sec": p.spec.health_check.timeout_sec,
-                        "failure_threshold": p.spec.health_check.failure_threshold,
-                    },
-                },
-                "status": {
-                    "phase": p.status.phase,
-                    "node_name": p.status.node_name,
-                    "message": p.status.message,
-                    "healthy": p.status.healthy,
-                    "restart_count": p.status.restart_count,
-                    "start_time": p.status.start_time,
-                },
-            }
-            for p in state.list_pods()
-        ],
-        "services": [
-            {
-                "name": s.name,
-                "selector": s.selector,
-                "port": s.port,
-                "target_port": s.target_port,
-                "virtual_ip": s.virtual_ip,
-                "endpoints": s.endpoints,
-                "rr_index": s.rr_index,
-            }
-            for s in state.services.values()
-        ],
-        "deployments": [
-            {
-                "name": d.name,
-                "image": d.image,
-                "replicas": d.replicas,
-                "selector": d.selector,
-                "labels": d.labels,
-                "cpu_request": d.cpu_request,
-                "mem_request": d.mem_request,
-            }
-            for d in state.deployments.values()
-        ],
+        "uid_counter": uid_counter,
+        "vip_counter": vip_counter,
+        "nodes": [node_to_dict(n) for n in snap.nodes.values()],
+        "pods": [pod_to_dict(p) for p in snap.pods.values()],
+        "services": [service_to_dict(s) for s in snap.services.values()],
+        "deployments": [deployment_to_dict(d) for d in snap.deployments.values()],
     }
 
 
 def _dict_to_state(data: Dict[str, Any]) -> ClusterState:
     state = ClusterState()
     for n in data.get("nodes", []):
-        node = Node(
-            name=n["name"],
-            cpu_capacity=n["cpu_capacity"],
-            mem_capacity=n["mem_capacity"],
-            labels=n.get("labels", {}),
-            ready=n.get("ready", True),
-            taints=n.get("taints", []),
-        )
-        node.cpu_allocated = n.get("cpu_allocated", 0)
-        node.mem_allocated = n.get("mem_allocated", 0)
-        state.add_node(node)
+        state.add_node(node_from_dict(n))
 
     for p in data.get("pods", []):
-        spec_data = p["spec"]
-        status_data = p["status"]
-        
-        hc_data = spec_data.get("health_check", {})
-        health_check = HealthCheck(
-            enabled=hc_data.get("enabled", False),
-            initial_delay_sec=hc_data.get("initial_delay_sec", 0),
-            period_sec=hc_data.get("period_sec", 10),
-            timeout_sec=hc_data.get("timeout_sec", 1),
-            failure_threshold=hc_data.get("failure_threshold", 3),
-        )
-        
-        spec = PodSpec(
-            name=spec_data["name"],
-            image=spec_data["image"],
-            cpu_request=spec_data.get("cpu_request", 1),
-            mem_request=spec_data.get("mem_request", 128),
-            labels=spec_data.get("labels", {}),
-            health_check=health_check,
-            restart_policy=spec_data.get("restart_policy", "Always"),
-        )
-        status = PodStatus(
-            phase=status_data.get("phase", "Pending"),
-            node_name=status_data.get("node_name"),
-            message=status_data.get("message", ""),
-            healthy=status_data.get("healthy", True),
-            restart_count=status_data.get("restart_count", 0),
-            start_time=status_data.get("start_time"),
-        )
-        pod = Pod(name=p["name"], spec=spec, status=status, uid=p["uid"])
-        state.pods[pod.uid] = pod
+        state.restore_pod(pod_from_dict(p))
 
     for s in data.get("services", []):
-        svc = Service(
-            name=s["name"],
-            selector=s["selector"],
-            port=s["port"],
-            target_port=s["target_port"],
-            virtual_ip=s["virtual_ip"],
-            endpoints=s.get("endpoints", []),
-        )
-        svc.rr_index = s.get("rr_index", 0)
-        state.services[svc.name] = svc
+        state.add_service(service_from_dict(s))
 
     for d in data.get("deployments", []):
-        deploy = Deployment(
-            name=d["name"],
-            image=d["image"],
-            replicas=d["replicas"],
-            selector=d["selector"],
-            labels=d.get("labels", {}),
-            cpu_request=d.get("cpu_request", 1),
-            mem_request=d.get("mem_request", 128),
-        )
-        state.deployments[deploy.name] = deploy
+        state.add_deployment(deployment_from_dict(d))
 
     uid_counter = data.get("uid_counter", 0)
     vip_counter = data.get("vip_counter", 1)
     state.restore_counters(uid_counter, vip_counter)
-    state.refresh_service_endpoints()
+    return state
+
+
+# Streaming JSON: one record per line, a header first, then nodes, pods,
+# services and deployments (services after pods, so endpoints resolve),
+# then a CRC32 of all the preceding lines. Format 1 had no checksum.
+STREAM_FORMAT = 2
+
+_RECORD_KINDS = (
+    ("Node", "nodes", node_to_dict),
+    ("Pod", "pods", pod_to_dict),
+    ("Service", "services", service_to_dict),
+    ("Deployment", "deployments", deployment_to_dict),
+)
+
+
+# how dump_records starts the last line; never the start of any other record
+_CHECKSUM_PREFIX = b'{"kind":"Checksum"'
+
+
+class ChecksumError(ValueError):
+    """Saved state does not match its checksum: it is torn or corrupt."""
+
+
+def fsync_dir(directory: str | Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path: str | Path) -> Iterator[BinaryIO]:
+    """Write ``path`` through a temp file that is fsynced and then renamed
+    over it, so a crash leaves either the old or the new contents."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_dir(path.parent)
+
+
+@contextmanager
+def compressing(path: str | Path, f: BinaryIO) -> Iterator[BinaryIO]:
+    """Compress writes to ``f`` as the suffix of ``path`` asks (.gz, .xz, .lzma)."""
+    p = str(path)
+    if p.endswith(".gz"):
+        wrapper = gzip.GzipFile(filename="", fileobj=f, mode="wb")
+    elif p.endswith((".xz", ".lzma")):
+        wrapper = lzma.LZMAFile(f, "wb")
+    else:
+        yield f
+        return
+    with wrapper:
+        yield wrapper
+
+
+def open_stream(path: str | Path, mode: str = "rb") -> BinaryIO:
+    """Open ``path`` for binary I/O, compressed by its suffix (.gz, .xz, .lzma)."""
+    p = str(path)
+    if p.endswith(".gz"):
+        return gzip.open(path, mode)
+    if p.endswith((".xz", ".lzma")):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def dump_records(f: BinaryIO, tables: Iterable[Mapping[str, Any]], uid_counter: int = 0, vip_counter: int = 1) -> None:
+    """Write the cluster to ``f`` one object per line.
+
+    ``tables`` are the nodes, pods, services and deployments mappings of a
+    ``ClusterSnapshot``, so writers carry on while they are encoded.
+    Objects are encoded one at a time, so the whole document is never built.
+    """
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    crc = 0
+
+    def write(record: Dict[str, Any]) -> None:
+        nonlocal crc
+        line = dumps(record).encode() + b"\n"
+        crc = zlib.crc32(line, crc)
+        f.write(line)
+
+    write({"kind": "Header", "format": STREAM_FORMAT, "uid_counter": uid_counter, "vip_counter": vip_counter})
+    for (kind, _, encode), table in zip(_RECORD_KINDS, tables):
+        for obj in table.values():
+            record = {"kind": kind}
+            record.update(encode(obj))
+            write(record)
+    f.write(dumps({"kind": "Checksum", "crc32": crc}).encode() + b"\n")
+
+
+def load_records(f: BinaryIO) -> ClusterState:
+    """Build a ``ClusterState`` from ``dump_records`` output, line by line.
+
+    Raises ``ChecksumError`` if the stream is truncated or corrupt. A record
+    that fails to load only raises its own error if the checksum still
+    matches; otherwise the rest of the stream is just checksummed.
+    """
+    state = ClusterState()
+    counters = (0, 1)
+    version = None
+    crc = 0
+    checked = False
+    error: Exception | None = None
+    for line in f:
+        if not line.strip():
+            continue
+        if checked:
+            raise ChecksumError("data after the checksum record")
+        if line.startswith(_CHECKSUM_PREFIX):
+            try:
+                expected = json.loads(line)["crc32"]
+            except (ValueError, KeyError, TypeError):
+                expected = None
+            if expected != crc:
+                raise ChecksumError("state stream does not match its checksum") from error
+            checked = True
+            continue
+        crc = zlib.crc32(line, crc)
+        if error is not None:
+            continue
+        try:
+            record = json.loads(line)
+            kind = record.pop("kind")
+            if kind == "Header":
+                version = record.get("format")
+                if version not in (1, STREAM_FORMAT):
+                    raise ValueError(f"unsupported state stream format {version!r}")
+                counters = (record.get("uid_counter", 0), record.get("vip_counter", 1))
+            elif kind == "Node":
+                state.add_node(node_from_dict(record))
+            elif kind == "Pod":
+                state.restore_pod(pod_from_dict(record))
+            elif kind == "Service":
+                state.add_service(service_from_dict(record))
+            elif kind == "Deployment":
+                state.add_deployment(deployment_from_dict(record))
+            else:
+                raise ValueError(f"unknown record kind {kind!r}")
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            error = exc
+    if version != 1 and not checked:
+        raise ChecksumError("state stream has no checksum record; it may be truncated") from error
+    if error is not None:
+        raise error
+    state.restore_counters(*counters)
     return state
 
 
 def save_state(state: ClusterState, path: str | Path) -> None:
-    # Use DB store when path ends with .db; otherwise export JSON
+    # Use DB store when path ends with .db, a binary snapshot for .snap, a
+    # journal for directories; otherwise stream JSON records. Files are
+    # replaced atomically.
     p = str(path)
     if p.endswith('.db'):
         _db.save_state_to_db(state, path)
         return
-    payload = _state_to_dict(state)
-    Path(path).write_text(json.dumps(payload, indent=2))
+    if p.endswith('.snap'):
+        from .snapshot import save_snapshot
+
+        save_snapshot(state, path)
+        return
+    if Path(path).is_dir():
+        from .journal import Journal
+
+        Journal(state, path).close()
+        return
+    with state._lock:
+        # only the objects changed since the last snapshot are copied; the
+        # counters are read at the same version
+        snap = state.snapshot(wait=True)
+        uid_counter, vip_counter = state._uid_counter, state._vip_counter
+    with atomic_write(path) as raw, compressing(path, raw) as f:
+        tables = (snap.nodes, snap.pods, snap.services, snap.deployments)
+        dump_records(f, tables, uid_counter, vip_counter)
 
 
 def load_state(path: str | Path) -> ClusterState:
     p = str(path)
     if p.endswith('.db'):
         return _db.load_state_from_db(path)
-    data = json.loads(Path(path).read_text())
-    return _dict_to_state(data)
+    if p.endswith('.snap'):
+        from .snapshot import load_snapshot
+
+        return load_snapshot(path)
+    if Path(path).is_dir():
+        from .journal import recover_state
+
+        return recover_state(path)
+    with open_stream(path) as f:
+        first = f.readline()
+        try:
+            streamed = json.loads(first).get("kind") == "Header"
+        except ValueError:
+            streamed = False
+        f.seek(0)
+        if streamed:
+            return load_records(f)
+        # a single JSON document, as written before streaming
+        return _dict_to_state(json.load(f))
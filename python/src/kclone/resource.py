@@ -7,7 +7,7 @@ from .state import ClusterState
 
 def node_resource_table(state: ClusterState) -> List[Dict[str, int]]:
     rows = []
-    for node in state.nodes.values():
+    for node in state.list_nodes():
         rows.append(
             {
                 "name": node.name,
@@ -21,10 +21,11 @@ def node_resource_table(state: ClusterState) -> List[Dict[str, int]]:
 
 
 def cluster_capacity(state: ClusterState) -> Dict[str, int]:
-    total_cpu = sum(n.cpu_capacity for n in state.nodes.values())
-    total_mem = sum(n.mem_capacity for n in state.nodes.values())
-    used_cpu = sum(n.cpu_allocated for n in state.nodes.values())
-    used_mem = sum(n.mem_allocated for n in state.nodes.values())
+    nodes = state.list_nodes()
+    total_cpu = sum(n.cpu_capacity for n in nodes)
+    total_mem = sum(n.mem_capacity for n in nodes)
+    used_cpu = sum(n.cpu_allocated for n in nodes)
+    used_mem = sum(n.mem_allocated for n in nodes)
     return {
         "cpu_used": used_cpu,
         "cpu_total": total_cpu,
@@ -0,0 +1,108 @@
+"""Backoff and timers for restarting crashed pods in place."""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+import random
+import threading
+import time
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    cap: float,
+    jitter: float = 0.2,
+    rand: Callable[[], float] = random.random,
+) -> float:
+    """Delay before restart ``attempt`` (1-based): ``base`` doubled per
+    attempt up to ``cap``, spread by +/- ``jitter`` so pods that crashed
+    together do not restart together."""
+    delay = min(cap, base * 2 ** max(0, attempt - 1))
+    return min(cap, delay * (1 - jitter + 2 * jitter * rand()))
+
+
+class RestartTimer:
+    """Calls ``callback(key)`` once each key's delay has elapsed.
+
+    Deadlines live in one heap served by a single thread, started on first
+    use. Scheduling a key that is already pending replaces its deadline;
+    superseded and cancelled heap entries are skipped when they surface.
+    The callback runs on the timer thread.
+    """
+
+    def __init__(self, callback: Callable[[str], None], clock: Callable[[], float] = time.monotonic) -> None:
+        self._callback = callback
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, str]] = []
+        # key -> seq of its live heap entry
+        self._pending: Dict[str, int] = {}
+        self._seq = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending
+
+    def schedule(self, key: str, delay: float) -> None:
+        with self._cond:
+            if self._stopped:
+                return
+            self._seq += 1
+            self._pending[key] = self._seq
+            heapq.heappush(self._heap, (self._clock() + delay, self._seq, key))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kclone-restarts", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, key: str) -> None:
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _due(self) -> List[str]:
+        # callers hold self._cond; waits until something is due or stopped
+        while not self._stopped:
+            while self._heap and self._pending.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._cond.wait()
+                continue
+            wait = self._heap[0][0] - self._clock()
+            if wait > 0:
+                self._cond.wait(wait)
+                continue
+            due = []
+            now = self._clock()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                if self._pending.get(key) == seq:
+                    del self._pending[key]
+                    due.append(key)
+            if due:
+                return due
+        return []
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due = self._due()
+                if self._stopped:
+                    return
+            for key in due:
+                try:
+                    self._callback(key)
+                except Exception:
+                    pass
@@ -1,47 +1,136 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional dependency
+    np = None
+
+from .framework import SchedulerFramework
 from .models import Node, Pod
 from .state import ClusterState
 
+# shared default profile; its timings accumulate across scheduling cycles
+default_framework = SchedulerFramework()
+
 
-def choose_node(nodes: List[Node], pod: Pod) -> Optional[Node]:
-    """Select the best node for a pod using a least-requested scoring strategy.
+def choose_node(nodes: List[Node], pod: Pod, framework: Optional[SchedulerFramework] = None) -> Optional[Node]:
+    """Select the best node for a pod by running the scheduler framework.
 
-    Returns the node with the highest available resources that fits the pod.
+    The default profile filters on readiness, taints/tolerations, node
+    selector and resources, then picks the least-requested node.
     """
-    eligible: List[Node] = []
-    for n in nodes:
-        if not n.ready:
-            continue
-        if n.taints:
-            continue
-        if n.fits(pod.spec.cpu_request, pod.spec.mem_request):
-            eligible.append(n)
+    return (framework or default_framework).choose(pod, nodes)
 
-    if not eligible:
-        return None
 
-    # Score nodes by available CPU and memory (higher is better)
-    def score(n: Node) -> int:
-        return n.cpu_available * 1000 + n.mem_available
+def _has_constraints(pod: Pod) -> bool:
+    return bool(pod.spec.tolerations or pod.spec.node_selector)
 
-    best = max(eligible, key=score)
-    return best
 
+def _schedule_one(state: ClusterState, pod: Pod, framework: Optional[SchedulerFramework]) -> None:
+    if framework is None and not _has_constraints(pod):
+        node = state.best_fit_node(pod.spec.cpu_request, pod.spec.mem_request)
+    else:
+        node = choose_node(state.list_nodes(), pod, framework)
+    if node:
+        try:
+            state.bind_pod(pod.uid, node.name)
+        except Exception as e:
+            # mark failed but leave for controller to retry
+            state.mark_pod_failed(pod.uid, str(e))
+    else:
+        # park until capacity changes so later passes skip it
+        state.mark_pod_unschedulable(pod.uid)
 
-def schedule_pending_pods(state: ClusterState) -> None:
-    """Attempt to schedule all pending pods in the cluster state."""
-    pending = [p for p in state.list_pods() if p.status.phase == "Pending"]
-    for pod in pending:
-        node = choose_node(state.list_nodes(), pod)
-        if node:
-            try:
-                state.bind_pod(pod.uid, node.name)
-            except Exception as e:
-                # mark failed but leave for controller to retry
-                state.mark_pod_failed(pod.uid, str(e))
-        else:
-            # leave as Pending so controller/scheduler can retry later
+
+def schedule_pending_pods(state: ClusterState, framework: Optional[SchedulerFramework] = None) -> None:
+    """Attempt to schedule the pods the state's scheduling queue hands out.
+
+    Pods that already failed to fit stay parked in the queue until cluster
+    capacity changes, so repeated calls do not retry them against every node.
+    Without an explicit ``framework``, pods that carry no tolerations or node
+    selector are placed through the state's node capacity index, which yields
+    the same node as the default profile without scanning every node.
+    """
+    for pod in state.pop_pending_pods():
+        _schedule_one(state, pod, framework)
+
+
+def plan_batch(nodes: List[Node], pods: List[Pod]) -> List[Tuple[Pod, Node]]:
+    """Place ``pods`` in order against ``nodes`` using NumPy node arrays.
+
+    Capacity and allocation are copied into arrays once, and the nodes a pod
+    may use (ready, taints tolerated, node selector matched) into one mask
+    per distinct set of tolerations and selector; each pod is then a
+    vectorised fit mask plus an argmax over the least-requested score, and
+    the chosen node's allocation is updated in the arrays only. ``Node``
+    objects are not touched, so the result is a plan the caller commits with
+    ``bind_pod``. Ties resolve to the earliest node, which matches the
+    default profile of ``choose_node``.
+    """
+    if np is None:
+        raise RuntimeError("batch scheduling requires numpy")
+    if not nodes or not pods:
+        return []
+    cpu_cap = np.fromiter((n.cpu_capacity for n in nodes), dtype=np.int64, count=len(nodes))
+    mem_cap = np.fromiter((n.mem_capacity for n in nodes), dtype=np.int64, count=len(nodes))
+    cpu_alloc = np.fromiter((n.cpu_allocated for n in nodes), dtype=np.int64, count=len(nodes))
+    mem_alloc = np.fromiter((n.mem_allocated for n in nodes), dtype=np.int64, count=len(nodes))
+
+    cpu_free = np.maximum(cpu_cap - cpu_alloc, 0)
+    mem_free = np.maximum(mem_cap - mem_alloc, 0)
+    score = cpu_free * 1000 + mem_free
+
+    allowed: Dict[tuple, np.ndarray] = {}
+    plan: List[Tuple[Pod, Node]] = []
+    for pod in pods:
+        spec = pod.spec
+        key = (tuple(spec.tolerations), tuple(spec.node_selector.items()))
+        mask = allowed.get(key)
+        if mask is None:
+            mask = allowed[key] = np.fromiter(
+                (
+                    n.ready
+                    and all(t in spec.tolerations for t in n.taints)
+                    and all(n.labels.get(k) == v for k, v in spec.node_selector.items())
+                    for n in nodes
+                ),
+                dtype=bool,
+                count=len(nodes),
+            )
+        cpu, mem = spec.cpu_request, spec.mem_request
+        masked = np.where(mask & (cpu_free >= cpu) & (mem_free >= mem), score, -1)
+        i = int(masked.argmax())
+        if masked[i] < 0:
             continue
+        cpu_free[i] = max(0, cpu_free[i] - cpu)
+        mem_free[i] = max(0, mem_free[i] - mem)
+        score[i] = cpu_free[i] * 1000 + mem_free[i]
+        plan.append((pod, nodes[i]))
+    return plan
+
+
+def schedule_pending_pods_batch(state: ClusterState) -> None:
+    """Schedule all pending pods as one batch.
+
+    Produces the same placements as ``schedule_pending_pods`` but plans the
+    whole batch with vectorised NumPy operations and only falls back to
+    per-pod ``bind_pod`` calls to commit. Without numpy installed this is the
+    same as ``schedule_pending_pods``.
+    """
+    if np is None:
+        schedule_pending_pods(state)
+        return
+    with state._lock:
+        pending = state.pop_pending_pods()
+        plan = plan_batch(state.list_nodes(), pending)
+    for pod, node in plan:
+        try:
+            state.bind_pod(pod.uid, node.name)
+        except Exception as e:
+            state.mark_pod_failed(pod.uid, str(e))
+    planned = {pod.uid for pod, _ in plan}
+    for pod in pending:
+        if pod.uid not in planned:
+            state.mark_pod_unschedulable(pod.uid)
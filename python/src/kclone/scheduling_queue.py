@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List
+import heapq
+import time
+
+
+class SchedulingQueue:
+    """Pending pod uids split into active, backoff and unschedulable sub-queues.
+
+    New pods enter ``active``. A pod that finds no node is parked in
+    ``unschedulable`` and stays there until a capacity event
+    (``move_all_to_active``) or until it has waited ``unschedulable_timeout``
+    seconds. Pods moved by an event go straight back to ``active`` on their
+    first retry and then back off exponentially between attempts. Popped pods
+    come out in the order they were first added, so placement order matches a
+    full scan of the pod map. Not thread-safe; the owner holds its lock.
+    """
+
+    def __init__(
+        self,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 10.0,
+        unschedulable_timeout: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.unschedulable_timeout = unschedulable_timeout
+        self._clock = clock
+        self._active: Dict[str, None] = {}
+        self._backoff: List[tuple] = []
+        self._backoff_until: Dict[str, float] = {}
+        # uid -> time it was parked; insertion order is time order
+        self._unschedulable: Dict[str, float] = {}
+        self._attempts: Dict[str, int] = {}
+        self._last_attempt: Dict[str, float] = {}
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._move_cycle = 0
+        self._popped_cycle = 0
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._backoff_until) + len(self._unschedulable)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._seq
+
+    def counts(self) -> Dict[str, int]:
+        return {"active": len(self._active), "backoff": len(self._backoff_until), "unschedulable": len(self._unschedulable)}
+
+    def add(self, uid: str) -> None:
+        if uid not in self._seq:
+            self._seq[uid] = self._next_seq
+            self._next_seq += 1
+        self._backoff_until.pop(uid, None)
+        self._unschedulable.pop(uid, None)
+        self._active[uid] = None
+
+    def remove(self, uid: str) -> None:
+        self._seq.pop(uid, None)
+        self._active.pop(uid, None)
+        self._backoff_until.pop(uid, None)
+        self._unschedulable.pop(uid, None)
+        self._attempts.pop(uid, None)
+        self._last_attempt.pop(uid, None)
+
+    def backoff_duration(self, uid: str) -> float:
+        attempts = self._attempts.get(uid, 0)
+        if attempts <= 1:
+            return 0.0
+        return min(self.initial_backoff * 2 ** (attempts - 2), self.max_backoff)
+
+    def pop_all(self) -> List[str]:
+        """Return every uid ready for a scheduling attempt, oldest first."""
+        now = self._clock()
+        while self._backoff and self._backoff[0][0] <= now:
+            _, _, uid = heapq.heappop(self._backoff)
+            if self._backoff_until.get(uid) is not None and self._backoff_until[uid] <= now:
+                del self._backoff_until[uid]
+                self._active[uid] = None
+        for uid, since in list(self._unschedulable.items()):
+            if now - since < self.unschedulable_timeout:
+                break
+            del self._unschedulable[uid]
+            self._active[uid] = None
+        uids = sorted(self._active, key=self._seq.__getitem__)
+        self._active.clear()
+        self._popped_cycle = self._move_cycle
+        return uids
+
+    def mark_unschedulable(self, uid: str) -> None:
+        """Record a failed attempt for a popped pod and park it."""
+        if uid not in self._seq:
+            return
+        now = self._clock()
+        self._attempts[uid] = self._attempts.get(uid, 0) + 1
+        self._last_attempt[uid] = now
+        if self._move_cycle != self._popped_cycle:
+            # capacity changed while this pod was being scheduled
+            self._requeue(uid, now)
+        else:
+            self._unschedulable[uid] = now
+
+    def move_all_to_active(self) -> None:
+        """Capacity changed: give every parked pod another chance."""
+        self._move_cycle += 1
+        if not self._unschedulable:
+            return
+        now = self._clock()
+        parked = list(self._unschedulable)
+        self._unschedulable.clear()
+        for uid in parked:
+            self._requeue(uid, now)
+
+    def _requeue(self, uid: str, now: float) -> None:
+        until = self._last_attempt.get(uid, now) + self.backoff_duration(uid)
+        if until <= now:
+            self._active[uid] = None
+            return
+        self._backoff_until[uid] = until
+        heapq.heappush(self._backoff, (until, self._seq[uid], uid))
@@ -8,18 +8,21 @@ def create_service(state: ClusterState, name: str, selector: dict, port: int, ta
     vip = state.allocate_virtual_ip()
     svc = Service(name=name, selector=selector, port=port, target_port=target_port, virtual_ip=vip)
     state.add_service(svc)
-    state.refresh_service_endpoints()
     return svc
 
 
 def route_request(state: ClusterState, service_name: str) -> str:
-    # Refresh endpoints before routing
-    state.refresh_service_endpoints()
+    """Pick the next ready pod for a service in round-robin order.
+
+    The state republishes the endpoint list rather than mutating it, so
+    routing reads it without the lock unless pods changed since the last read.
+    """
     svc = state.services.get(service_name)
     if not svc:
         raise KeyError(f"Service {service_name} not found")
-    if not svc.endpoints:
+    endpoints = state.service_endpoints(service_name)
+    if not endpoints:
         raise RuntimeError(f"Service {service_name} has no ready pods")
-    pod_uid = svc.endpoints[svc.rr_index % len(svc.endpoints)]
-    svc.rr_index = (svc.rr_index + 1) % len(svc.endpoints)
+    pod_uid = endpoints[svc.rr_index % len(endpoints)]
+    svc.rr_index = (svc.rr_index + 1) % len(endpoints)
     return pod_uid
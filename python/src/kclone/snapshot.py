@@ -0,0 +1,496 @@
+"""Compact binary cluster snapshots, read lazily through ``mmap``.
+
+Layout (little-endian, sections 8-byte aligned)::
+
+    header        magic, format version, CRC32 of everything after the
+                  header, resource version, counters, section counts and
+                  offsets
+    string index  u32 offset of each string, plus the end offset
+    string data   UTF-8 bytes of every distinct string
+    nodes         fixed-width node records
+    pods          fixed-width pod records
+    node index    u32 record numbers, sorted by node name
+    pod index     u32 record numbers, sorted by pod uid
+    objects       services and deployments as JSON (there are few)
+
+Records refer to strings by index; dicts and lists (labels, selectors,
+taints, ...) are stored as JSON strings, so a label set shared by many pods
+is stored once. ``open_snapshot`` maps the file and returns a
+``ClusterSnapshot`` whose node and pod mappings decode a record only when
+it is accessed: opening costs the same for ten pods or a million.
+``load_snapshot`` builds a full ``ClusterState`` when one is needed.
+
+``Snapshotter`` keeps such a file (or a streamed JSON one) up to date from
+a background thread.
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import ItemsView, Mapping, ValuesView
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+import json
+import math
+import mmap
+import struct
+import sys
+import threading
+import zlib
+
+from .models import DEFAULT_HEALTH_CHECK, HealthCheck, Node, Pod, PodSpec, PodStatus, intern_labels, shared_health_check
+from .persistence import (
+    ChecksumError,
+    atomic_write,
+    compressing,
+    deployment_from_dict,
+    deployment_to_dict,
+    dump_records,
+    service_from_dict,
+    service_to_dict,
+)
+from .state import ClusterSnapshot, ClusterState
+
+MAGIC = b"KCLSNAP\0"
+VERSION = 2
+NONE = 0xFFFFFFFF
+
+# magic, version, checksum, resource version, uid counter, vip counter,
+# string/node/pod counts, then the offsets of the seven sections and the
+# length of the last
+_HEADER = struct.Struct("<8sIIqqqIII8Q")
+# name, labels, taints; cpu/mem capacity, cpu/mem allocated; ready
+_NODE = struct.Struct("<3I4qB")
+# uid, name, spec name, image; cpu, mem; labels, restart policy, node
+# selector, tolerations, health check, phase, node name, message, restart
+# count; start time (NaN for none); healthy
+_POD = struct.Struct("<4I2q9IdB")
+
+
+class SnapshotFormatError(ValueError):
+    """The file is not a snapshot this version can read."""
+
+
+class _Checksummed:
+    """Forwards writes to ``f``, keeping a CRC32 of them."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self.crc = 0
+
+    def write(self, data: bytes) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        return self._f.write(data)
+
+    def writelines(self, lines: Iterable[bytes]) -> None:
+        for data in lines:
+            self.write(data)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+
+def _align(f: BinaryIO) -> int:
+    pos = f.tell()
+    if pos % 8:
+        f.write(b"\0" * (8 - pos % 8))
+        pos = f.tell()
+    return pos
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.data: List[bytes] = []
+        # id(dict or list) -> string id; the objects stay alive in the
+        # snapshot being written, so ids are not reused meanwhile
+        self._json: Dict[int, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.data)
+            self.data.append(value.encode())
+        return sid
+
+    def add_json(self, value: Any) -> int:
+        sid = self._json.get(id(value))
+        if sid is None:
+            sid = self._json[id(value)] = self.add(json.dumps(value, separators=(",", ":")))
+        return sid
+
+
+def _health_check_sid(strings: _StringTable, hc: HealthCheck) -> int:
+    if hc == DEFAULT_HEALTH_CHECK:
+        return NONE
+    return strings.add(json.dumps({
+        "enabled": hc.enabled,
+        "initial_delay_sec": hc.initial_delay_sec,
+        "period_sec": hc.period_sec,
+        "timeout_sec": hc.timeout_sec,
+        "failure_threshold": hc.failure_threshold,
+    }))
+
+
+def _u32_array(values: List[int]) -> bytes:
+    data = array("I", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def dump_snapshot(snap: ClusterSnapshot, f: BinaryIO, uid_counter: int = 0, vip_counter: int = 1) -> None:
+    """Write ``snap`` to the binary file ``f``, which must be seekable."""
+    strings = _StringTable()
+    nodes = list(snap.nodes.values())
+    pods = list(snap.pods.values())
+    node_records = b"".join(
+        _NODE.pack(
+            strings.add(n.name), strings.add_json(n.labels), strings.add_json(n.taints),
+            n.cpu_capacity, n.mem_capacity, n.cpu_allocated, n.mem_allocated, n.ready,
+        )
+        for n in nodes
+    )
+    hc_ids: Dict[HealthCheck, int] = {}
+    pod_records = bytearray(_POD.size * len(pods))
+    for i, p in enumerate(pods):
+        spec, status = p.spec, p.status
+        hc = hc_ids.get(spec.health_check)
+        if hc is None:
+            hc = hc_ids[spec.health_check] = _health_check_sid(strings, spec.health_check)
+        _POD.pack_into(
+            pod_records, i * _POD.size,
+            strings.add(p.uid), strings.add(p.name), strings.add(spec.name), strings.add(spec.image),
+            spec.cpu_request, spec.mem_request,
+            strings.add_json(spec.labels), strings.add(spec.restart_policy),
+            strings.add_json(spec.node_selector), strings.add_json(spec.tolerations), hc,
+            strings.add(status.phase), strings.add(status.node_name), strings.add(status.message),
+            status.restart_count, math.nan if status.start_time is None else status.start_time, status.healthy,
+        )
+    objects = json.dumps({
+        "services": [service_to_dict(s) for s in snap.services.values()],
+        "deployments": [deployment_to_dict(d) for d in snap.deployments.values()],
+    }, separators=(",", ":")).encode()
+
+    offsets = []
+    start = f.tell()
+    f.write(b"\0" * _HEADER.size)
+    out = f
+    f = _Checksummed(out)
+    offsets.append(_align(f))
+    pos = 0
+    index = [0] * (len(strings.data) + 1)
+    for i, data in enumerate(strings.data):
+        index[i] = pos
+        pos += len(data)
+    index[-1] = pos
+    f.write(_u32_array(index))
+    offsets.append(_align(f))
+    f.writelines(strings.data)
+    offsets.append(_align(f))
+    f.write(node_records)
+    offsets.append(_align(f))
+    f.write(pod_records)
+    for keys in ([n.name for n in nodes], [p.uid for p in pods]):
+        offsets.append(_align(f))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        f.write(_u32_array(order))
+    offsets.append(_align(f))
+    f.write(objects)
+    out.seek(start)
+    out.write(_HEADER.pack(
+        MAGIC, VERSION, f.crc, snap.resource_version, uid_counter, vip_counter,
+        len(strings.data), len(nodes), len(pods), *offsets, len(objects),
+    ))
+
+
+def write_snapshot(snap: ClusterSnapshot, path: str | Path, uid_counter: int = 0, vip_counter: int = 1) -> None:
+    """Atomically replace ``path`` with ``snap``: binary for ``.snap``
+    paths, otherwise streamed JSON, compressed as the suffix asks."""
+    with atomic_write(path) as f:
+        if str(path).endswith(".snap"):
+            dump_snapshot(snap, f, uid_counter, vip_counter)
+        else:
+            with compressing(path, f) as out:
+                dump_records(out, snap[1:], uid_counter, vip_counter)
+
+
+def save_snapshot(state: ClusterState, path: str | Path) -> None:
+    snap = state.snapshot(wait=True)
+    write_snapshot(snap, path, getattr(state, "_uid_counter", 0), getattr(state, "_vip_counter", 1))
+
+
+class _Table(Mapping):
+    """Read-only mapping over fixed-width records, decoded on access."""
+
+    def __init__(self, file: "SnapshotFile", offset: int, count: int, record: struct.Struct, index: Any, decode: Callable[[tuple], Any]) -> None:
+        self._file = file
+        self._offset = offset
+        self._count = count
+        self._record = record
+        self._index = index
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _unpack(self, i: int) -> tuple:
+        return self._record.unpack_from(self._file._mm, self._offset + i * self._record.size)
+
+    def _key(self, i: int) -> str:
+        # every record starts with the string id of its key
+        return self._file.string(struct.unpack_from("<I", self._file._mm, self._offset + i * self._record.size)[0])
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._key(i) for i in range(self._count))
+
+    def _find(self, key: str) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self._index[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(self._index[lo]) == key:
+            return self._index[lo]
+        raise KeyError(key)
+
+    def __getitem__(self, key: str) -> Any:
+        if not isinstance(key, str):
+            raise KeyError(key)
+        return self._decode(self._unpack(self._find(key)))
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self._find(key)  # type: ignore[arg-type]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def values(self) -> ValuesView:
+        return _Values(self)
+
+    def items(self) -> ItemsView:
+        return _Items(self)
+
+
+class _Values(ValuesView):
+    # in record order, without a key lookup per record
+    def __iter__(self):
+        table = self._mapping
+        return (table._decode(table._unpack(i)) for i in range(len(table)))
+
+
+class _Items(ItemsView):
+    def __iter__(self):
+        table = self._mapping
+        for i in range(len(table)):
+            obj = table._decode(table._unpack(i))
+            yield (obj.uid if isinstance(obj, Pod) else obj.name), obj
+
+
+class SnapshotFile:
+    """A snapshot file mapped into memory; see ``open_snapshot``."""
+
+    def __init__(self, path: str | Path, verify: bool = True) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open(verify)
+        except Exception:
+            self._mm.close()
+            raise
+
+    def _open(self, verify: bool) -> None:
+        if len(self._mm) < _HEADER.size:
+            raise SnapshotFormatError(f"{self.path} is too short for a snapshot")
+        (magic, version, crc, self.resource_version, self.uid_counter, self.vip_counter,
+         n_strings, n_nodes, n_pods, *offsets, objects_len) = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise SnapshotFormatError(f"{self.path} is not a kclone snapshot")
+        if version != VERSION:
+            raise SnapshotFormatError(f"{self.path} has snapshot format {version}, expected {VERSION}")
+        if verify:
+            # one sequential pass over the mapping, without copying it
+            with memoryview(self._mm) as view, view[_HEADER.size:] as body:
+                if zlib.crc32(body) != crc:
+                    raise ChecksumError(f"{self.path} does not match its checksum")
+        str_index, str_data, nodes, pods, node_index, pod_index, objects = offsets
+        self._views: List[memoryview] = []
+        self._str_index = self._u32(str_index, n_strings + 1)
+        self._str_data = str_data
+        self._strings: Dict[int, Optional[str]] = {}
+        self._json: Dict[int, Any] = {}
+        self._health_checks: Dict[int, HealthCheck] = {}
+        payload = json.loads(self._mm[objects:objects + objects_len])
+        self.services = {s["name"]: service_from_dict(s) for s in payload["services"]}
+        self.deployments = {d["name"]: deployment_from_dict(d) for d in payload["deployments"]}
+        self.nodes = _Table(self, nodes, n_nodes, _NODE, self._u32(node_index, n_nodes), self._node)
+        self.pods = _Table(self, pods, n_pods, _POD, self._u32(pod_index, n_pods), self._pod)
+
+    def _u32(self, offset: int, count: int):
+        view = memoryview(self._mm)[offset:offset + 4 * count]
+        if sys.byteorder == "little":
+            view = view.cast("I")
+            self._views.append(view)
+            return view
+        values = struct.unpack_from(f"<{count}I", self._mm, offset)
+        view.release()
+        return values
+
+    def string(self, sid: int) -> Optional[str]:
+        if sid == NONE:
+            return None
+        start = self._str_data + self._str_index[sid]
+        return self._mm[start:self._str_data + self._str_index[sid + 1]].decode()
+
+    def _shared_string(self, sid: int) -> Optional[str]:
+        # images, phases, node names and the like repeat across records;
+        # uids and pod names do not and are not cached
+        value = self._strings.get(sid)
+        if value is None:
+            value = self._strings[sid] = self.string(sid)
+        return value
+
+    def _json_value(self, sid: int) -> Any:
+        # label sets and the like repeat too; decode each once and share it,
+        # as ``intern_labels`` would
+        value = self._json.get(sid)
+        if value is None:
+            value = json.loads(self.string(sid))
+            if isinstance(value, dict):
+                value = intern_labels(value)
+            self._json[sid] = value
+        return value
+
+    def _node(self, r: tuple) -> Node:
+        name, labels, taints, cpu_capacity, mem_capacity, cpu_allocated, mem_allocated, ready = r
+        node = Node(
+            name=self.string(name), cpu_capacity=cpu_capacity, mem_capacity=mem_capacity,
+            labels=self._json_value(labels), ready=bool(ready), taints=list(self._json_value(taints)),
+        )
+        node.cpu_allocated = cpu_allocated
+        node.mem_allocated = mem_allocated
+        return node
+
+    def _health_check(self, sid: int) -> HealthCheck:
+        hc = self._health_checks.get(sid)
+        if hc is None:
+            hc = DEFAULT_HEALTH_CHECK if sid == NONE else shared_health_check(HealthCheck(**self._json_value(sid)))
+            self._health_checks[sid] = hc
+        return hc
+
+    def _pod(self, r: tuple) -> Pod:
+        (uid, name, spec_name, image, cpu, mem, labels, restart_policy, node_selector, tolerations,
+         hc, phase, node_name, message, restart_count, start_time, healthy) = r
+        shared = self._shared_string
+        spec = PodSpec(
+            name=shared(spec_name), image=shared(image), cpu_request=cpu, mem_request=mem,
+            labels=self._json_value(labels), health_check=self._health_check(hc),
+            restart_policy=shared(restart_policy), node_selector=self._json_value(node_selector),
+            tolerations=self._json_value(tolerations),
+        )
+        status = PodStatus(
+            phase=shared(phase), node_name=shared(node_name), message=shared(message),
+            healthy=bool(healthy), restart_count=restart_count,
+            start_time=None if math.isnan(start_time) else start_time,
+        )
+        return Pod(name=self.string(name), spec=spec, status=status, uid=self.string(uid))
+
+    def snapshot(self) -> ClusterSnapshot:
+        return ClusterSnapshot(self.resource_version, self.nodes, self.pods, self.services, self.deployments)
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        self._mm.close()
+
+    def __enter__(self) -> "SnapshotFile":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def open_snapshot(path: str | Path, verify: bool = True) -> SnapshotFile:
+    """Map a snapshot; ``.snapshot()`` gives a lazily decoded view of it.
+
+    The checksum is verified first unless ``verify`` is false.
+    """
+    return SnapshotFile(path, verify)
+
+
+def load_snapshot(path: str | Path) -> ClusterState:
+    """Build a ``ClusterState`` from every object in a snapshot."""
+    with open_snapshot(path) as snap:
+        state = ClusterState()
+        for node in snap.nodes.values():
+            state.add_node(node)
+        for pod in snap.pods.values():
+            state.restore_pod(pod)
+        for service in snap.services.values():
+            state.add_service(service)
+        for deployment in snap.deployments.values():
+            state.add_deployment(deployment)
+        state.restore_counters(snap.uid_counter, snap.vip_counter)
+    return state
+
+
+class Snapshotter:
+    """Saves ``state`` to ``path`` every ``interval`` seconds.
+
+    A save takes the state's MVCC snapshot, which holds the lock only to
+    copy the objects changed since the previous one, and then encodes,
+    fsyncs and renames the file on the snapshot thread. Scheduling and
+    routing never wait for the I/O. Saves are skipped while nothing has
+    changed. Call ``save`` directly or ``start`` the background thread;
+    ``stop`` writes a final snapshot.
+    """
+
+    def __init__(self, state: ClusterState, path: str | Path, interval: float = 5.0) -> None:
+        self.state = state
+        self.path = Path(path)
+        self.interval = interval
+        self.saved_version: Optional[int] = None
+        self.last_error: Optional[Exception] = None
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def save(self) -> bool:
+        """Write a snapshot now; returns False if nothing changed."""
+        with self._save_lock:
+            snap = self.state.snapshot(wait=True)
+            if snap.resource_version == self.saved_version:
+                return False
+            write_snapshot(snap, self.path, getattr(self.state, "_uid_counter", 0), getattr(self.state, "_vip_counter", 1))
+            self.saved_version = snap.resource_version
+            return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kclone-snapshotter", daemon=True)
+        self._thread.start()
+
+    def stop(self, final: bool = True) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if final:
+            self.save()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+                self.last_error = None
+            except Exception as exc:
+                # keep the previous file and try again next interval
+                self.last_error = exc
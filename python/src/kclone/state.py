@@ -1,25 +1,230 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
 from threading import RLock
+import copy
+import dataclasses
+import operator
 import subprocess
 import threading
 import time
 import sys
 import os
 import signal
-import psutil
 
-from .models import Deployment, Node, Pod, PodSpec, Service
+from .asyncio_runtime import AsyncioRuntime
+from .heartbeat import HeartbeatMonitor
+from .index import LabelIndex, NodeCapacityIndex, PodPlacementIndex, SelectorIndex
+from .models import Deployment, HealthCheck, Node, Pod, PodSpec, Service, intern_labels
+from .restart import RestartTimer, backoff_delay
+from .scheduling_queue import SchedulingQueue
+from .supervisor import ProcessSupervisor
+from .termination import TerminationPipeline
+from .watch import ADDED, DELETED, MODIFIED, EventLog, Watcher, WatchEvent
+from .zygote import Zygote
+
+
+_KINDS = ("Node", "Pod", "Service", "Deployment")
+
+
+def _worker_env() -> Dict[str, str]:
+    """Environment for worker processes, with this package importable even
+    when it is run from a source checkout rather than installed."""
+    env = dict(os.environ)
+    src_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (src_root, env.get("PYTHONPATH")) if p)
+    return env
+
+
+# layer values: a deleted key, and one deleted and then set again
+_GONE = object()
+_MISSING = object()
+
+
+class _Readded:
+    __slots__ = ("obj",)
+
+    def __init__(self, obj: object) -> None:
+        self.obj = obj
+
+
+def _replay(table: Dict[str, object], layers: Iterable[Dict[str, object]]) -> Dict[str, object]:
+    # apply the layers to a plain dict, as the live table saw the changes
+    for layer in layers:
+        for key, value in layer.items():
+            if value is _GONE:
+                table.pop(key, None)
+            elif type(value) is _Readded:
+                table.pop(key, None)
+                table[key] = value.obj
+            else:
+                table[key] = value
+    return table
+
+
+def _merge(lower: Dict[str, object], upper: Dict[str, object]) -> Dict[str, object]:
+    merged = dict(lower)
+    for key, value in upper.items():
+        below = merged.get(key, _MISSING)
+        if type(value) is _Readded or (below is _GONE and value is not _GONE):
+            # deleted and set again: the key moves behind everything below
+            merged.pop(key, None)
+            merged[key] = value if type(value) is _Readded else _Readded(value)
+        elif type(below) is _Readded and value is not _GONE:
+            merged[key] = _Readded(value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class _SnapshotTable(Mapping):
+    """Read-only map of one kind in a ``ClusterSnapshot``.
+
+    Copying the whole table on every publish would make each write cost
+    O(objects), so a table is a plain base dict under a stack of layers
+    holding only the keys changed by later publishes. A new layer is merged
+    into the one below while it is at least half that one's size, as in a
+    binary counter, which keeps the stack O(log n) deep and makes publishing
+    O(changed keys) amortised, times the log n merges; lookups check each
+    layer. Iterating flattens the stack into a new base first. The order is
+    that of a dict given the same updates.
+    """
+
+    __slots__ = ("_layers", "_len")
+
+    def __init__(self, base: Dict[str, object], layers: Tuple[Dict[str, object], ...] = (), length: Optional[int] = None) -> None:
+        self._layers = (base,) + layers
+        self._len = len(base) if length is None else length
+
+    def __getitem__(self, key: str) -> object:
+        for layer in reversed(self._layers):
+            value = layer.get(key, _MISSING)
+            if value is _MISSING:
+                continue
+            if value is _GONE:
+                break
+            return value.obj if type(value) is _Readded else value
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        return iter(self._flat())
+
+    def keys(self):
+        return self._flat().keys()
+
+    def values(self):
+        return self._flat().values()
+
+    def items(self):
+        return self._flat().items()
+
+    def _flat(self) -> Dict[str, object]:
+        layers = self._layers
+        if len(layers) == 1:
+            return layers[0]
+        # readers may race to do this; they all build the same dict
+        flat = _replay(dict(layers[0]), layers[1:])
+        self._layers = (flat,)
+        return flat
+
+    def updated(self, changes: Dict[str, object]) -> "_SnapshotTable":
+        """A new table with ``changes`` (``_GONE`` for deletions) applied."""
+        length = self._len
+        for key, value in changes.items():
+            present = key in self
+            if value is _GONE:
+                length -= present
+            elif not present:
+                length += 1
+        layers = list(self._layers)
+        top = changes
+        while len(layers) > 1 and 2 * len(top) >= len(layers[-1]):
+            top = _merge(layers.pop(), top)
+        if len(layers) == 1 and 2 * len(top) >= len(layers[0]):
+            return _SnapshotTable(_replay(dict(layers[0]), (top,)), (), length)
+        return _SnapshotTable(layers[0], tuple(layers[1:]) + (top,), length)
+
+
+class ClusterSnapshot(NamedTuple):
+    """Immutable view of the cluster at one resource version.
+
+    The mappings are read-only and the objects in them are private copies
+    taken when the snapshot was published, so they never change under a
+    reader; a pod's spec is immutable and shared with the live pod rather
+    than copied. Do not mutate them; use ``ClusterState`` methods instead.
+    """
+
+    resource_version: int
+    nodes: Mapping[str, Node]
+    pods: Mapping[str, Pod]
+    services: Mapping[str, Service]
+    deployments: Mapping[str, Deployment]
+
+
+def _slot_copier(cls: type):
+    # copy.copy goes through __reduce_ex__ and is several times slower than
+    # reading all slots at once; publishing copies every dirty object under
+    # the lock, so this bounds how long writers stall behind a snapshot
+    names = getattr(cls, "__slots__", None)
+    if not names or isinstance(names, str):
+        return copy.copy
+    # generated like the dataclass __init__: one tuple read, one store per slot
+    targets = ", ".join(f"clone.{name}" for name in names)
+    source = f"def copier(obj):\n    clone = new(cls)\n    {targets} = get(obj)\n    return clone\n"
+    namespace = {"new": object.__new__, "cls": cls, "get": operator.attrgetter(*names)}
+    exec(source, namespace)
+    return namespace["copier"]
+
+
+_COPIERS: Dict[type, object] = {}
+
+
+def _shallow_copy(obj: object) -> object:
+    copier = _COPIERS.get(type(obj))
+    if copier is None:
+        copier = _COPIERS[type(obj)] = _slot_copier(type(obj))
+    return copier(obj)
+
+
+def _frozen_copy(obj: object) -> object:
+    clone = _shallow_copy(obj)
+    if isinstance(obj, Pod):
+        # specs are replaced, never mutated (see set_pod_labels), so the
+        # snapshot shares the live one, as pods of one deployment share theirs
+        clone.status = _shallow_copy(obj.status)
+    return clone
 
 
 class ClusterState:
     """Thread-safe in-memory cluster state for K-Clone (Python).
 
     Provides basic operations for nodes, pods, services and deployments.
+    Every mutation stamps the object with a new resource version and
+    publishes a watch event; see ``watch``. Read-mostly callers should use
+    ``snapshot``, which never waits for a writer but may return the version
+    before a write in progress; ``list_nodes``/``list_pods`` wait for it and
+    see every change made so far.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        spawn_mode: Optional[str] = None,
+        restart_backoff: float = 10.0,
+        max_restart_backoff: float = 300.0,
+        termination_grace_period: float = 2.0,
+        runtime: Optional[str] = None,
+        heartbeat_interval: float = 5.0,
+    ) -> None:
         self._lock = RLock()
         self.nodes: Dict[str, Node] = {}
         self.pods: Dict[str, Pod] = {}
@@ -29,11 +234,180 @@ class ClusterState:
         self._vip_counter: int = 1
         # map pod uid -> subprocess.Popen for running pod processes
         self._processes: Dict[str, subprocess.Popen] = {}
+        # schedulable nodes ordered by least-requested score
+        self._node_index = NodeCapacityIndex()
+        # pods waiting for a node; parked pods return on capacity changes
+        self._sched_queue = SchedulingQueue()
+        # (label key, value) -> pod uids, for selector matching
+        self._label_index = LabelIndex()
+        # phase -> uids and node -> uids, kept current from pod events
+        self._placement_index = PodPlacementIndex()
+        # service selectors, plus per-service ready endpoints kept up to date
+        # as pods change; Service.endpoints is republished, never mutated, so
+        # routing can read it without the lock. Republishing copies the whole
+        # list, so it waits until the list is read (service_endpoints or a
+        # snapshot) and covers every change since, with one Service event
+        self._service_selectors = SelectorIndex()
+        self._endpoint_members: Dict[str, Dict[str, None]] = {}
+        self._pod_services: Dict[str, Set[str]] = {}
+        self._stale_endpoints: Dict[str, None] = {}
+        # deployment name -> (template key, spec) its replicas share; see
+        # controllers.pod_template
+        self._pod_templates: Dict[str, Tuple[tuple, PodSpec]] = {}
+        # resource versions and the watch event ring buffer
+        self._resource_version = 0
+        self._events = EventLog()
+        # last published read-only snapshot and the keys changed since then,
+        # True for the ones deleted (and perhaps added again) in between
+        empty = _SnapshotTable({})
+        self._snapshot = ClusterSnapshot(0, empty, empty, empty, empty)
+        self._snapshot_dirty: Dict[str, Dict[str, bool]] = {kind: {} for kind in _KINDS}
+        # keys changed since the last take_changes(), for incremental saves;
+        # the value is True when the object was deleted
+        self._unsaved: Dict[str, Dict[str, bool]] = {kind: {} for kind in _KINDS}
+        # the store those keys are relative to (e.g. a database path), set by
+        # whoever last loaded or fully saved the state; None means none yet
+        self.changes_base: Optional[str] = None
+
+        # "exec" starts each worker as a fresh interpreter; "zygote" forks it
+        # from a pre-warmed process that has already imported the worker
+        self.spawn_mode = spawn_mode or os.environ.get("KCLONE_SPAWN_MODE", "exec")
+        if self.spawn_mode not in ("exec", "zygote"):
+            raise ValueError(f"unknown spawn mode {self.spawn_mode!r}")
+        self._zygote: Optional[Zygote] = None
+        self._zygote_lock = threading.Lock()
+        # crashed pods wait in CrashLoopBackOff, keeping their uid and node,
+        # until their exponential backoff expires; a pod that ran for
+        # restart_reset_after seconds starts over at restart_backoff
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.restart_reset_after = 600.0
+        self._crash_streak: Dict[str, int] = {}
+        self._restarts = RestartTimer(self._restart_pod)
+        # "thread" supervises workers with a pidfd thread and stops them with
+        # a termination thread; "asyncio" does both, plus heartbeat reading
+        # and liveness probes, on one event loop
+        self.runtime = runtime or os.environ.get("KCLONE_RUNTIME", "thread")
+        if self.runtime not in ("thread", "asyncio"):
+            raise ValueError(f"unknown runtime {self.runtime!r}")
+        if self.runtime == "asyncio" and self.spawn_mode != "exec":
+            raise ValueError("the asyncio runtime starts its own workers; use spawn mode 'exec'")
+        self.heartbeat_interval = heartbeat_interval
+        self.termination_grace_period = termination_grace_period
+        # the runtime's threads, pipes and selectors are only started for the
+        # first worker (see _start_runtime), so states that never run a pod,
+        # e.g. ones loaded for a CLI command, hold no resources to close
+        self._runtime_lock = threading.Lock()
+        self._closed = False
+        self._aio: Optional[AsyncioRuntime] = None
+        self._supervisor = None
+        self._terminator = None
+        self._heartbeats: Optional[HeartbeatMonitor] = None
+
+    @property
+    def resource_version(self) -> int:
+        return self._resource_version
+
+    def _emit(self, event_type: str, kind: str, name: str, obj: object) -> None:
+        # callers hold self._lock
+        self._resource_version += 1
+        obj.resource_version = self._resource_version
+        dirty = self._snapshot_dirty[kind]
+        if event_type == DELETED:
+            dirty[name] = True
+        elif event_type == ADDED and dirty.get(name):
+            # deleted and added again: like the live dict, the next snapshot
+            # moves it behind everything added so far
+            del dirty[name]
+            dirty[name] = True
+        else:
+            dirty.setdefault(name, False)
+        self._unsaved[kind][name] = event_type == DELETED
+        if kind == "Pod":
+            if event_type == DELETED:
+                self._placement_index.remove(name)
+            else:
+                self._placement_index.update(name, obj.status.phase, obj.status.node_name)
+        self._events.append(WatchEvent(event_type, kind, name, obj, self._resource_version))
+
+    def snapshot(self, wait: bool = False) -> ClusterSnapshot:
+        """Return a consistent read-only view of the cluster without blocking.
+
+        Writers only record which objects changed; the first reader after a
+        write publishes a new version by layering copies of just the changed
+        objects over the previous snapshot's maps. If a writer holds the lock at
+        that moment, the reader gets the last published version instead of
+        waiting, so reads never stall behind slow mutations. With ``wait``
+        the reader waits instead and sees every change made so far.
+        """
+        snap = self._snapshot
+        if snap.resource_version == self._resource_version:
+            return snap
+        if not self._lock.acquire(blocking=wait):
+            return snap
+        try:
+            return self._publish_snapshot()
+        finally:
+            self._lock.release()
+
+    def _publish_snapshot(self) -> ClusterSnapshot:
+        self._flush_endpoints()
+        prev = self._snapshot
+        if prev.resource_version == self._resource_version:
+            return prev
+        tables = []
+        for kind, live, old in zip(_KINDS, (self.nodes, self.pods, self.services, self.deployments), prev[1:]):
+            dirty = self._snapshot_dirty[kind]
+            if not dirty:
+                tables.append(old)
+                continue
+            changes = {}
+            for name, deleted in dirty.items():
+                obj = live.get(name)
+                if obj is None:
+                    changes[name] = _GONE
+                else:
+                    changes[name] = _Readded(_frozen_copy(obj)) if deleted else _frozen_copy(obj)
+            dirty.clear()
+            tables.append(old.updated(changes))
+        self._snapshot = ClusterSnapshot(self._resource_version, *tables)
+        return self._snapshot
+
+    def take_changes(self) -> Tuple[ClusterSnapshot, Dict[str, Dict[str, bool]]]:
+        """Return a snapshot plus the keys changed since the previous call.
 
-        # start background monitor thread
-        self._monitor_stop = False
-        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self._monitor_thread.start()
+        The changes map each kind to the names (uids for pods) changed since
+        then, with True for the ones deleted; the snapshot holds their
+        current state. Hand them back with ``restore_changes`` if they could
+        not be persisted. They only describe the difference to the store named
+        by ``changes_base``; any other store needs a full save.
+        """
+        with self._lock:
+            self._flush_endpoints()
+            changes, self._unsaved = self._unsaved, {kind: {} for kind in _KINDS}
+            return self._publish_snapshot(), changes
+
+    def has_unsaved_changes(self) -> bool:
+        return any(self._unsaved.values())
+
+    def restore_changes(self, changes: Dict[str, Dict[str, bool]]) -> None:
+        with self._lock:
+            for kind, names in changes.items():
+                unsaved = self._unsaved[kind]
+                for name, deleted in names.items():
+                    # anything changed again since take_changes is newer
+                    unsaved.setdefault(name, deleted)
+
+    def watch(self, kind: Optional[str] = None, since_version: Optional[int] = None) -> Watcher:
+        """Start watching events of ``kind`` (all kinds if None).
+
+        Events newer than ``since_version`` are delivered; by default only
+        events after the current version. A watcher that falls too far behind
+        raises ``TooOldResourceVersion`` and should relist.
+        """
+        with self._lock:
+            version = self._resource_version if since_version is None else since_version
+            return Watcher(self._events, kind, version)
 
     def _next_uid(self) -> str:
         with self._lock:
@@ -45,43 +419,226 @@ class ClusterState:
             if node.name in self.nodes:
                 raise ValueError(f"Node {node.name} already exists")
             self.nodes[node.name] = node
+            self._node_index.update(node)
+            self._sched_queue.move_all_to_active()
+            self._emit(ADDED, "Node", node.name, node)
+
+    def remove_node(self, name: str) -> None:
+        """Delete a node, first evicting its pods back to Pending."""
+        with self._lock:
+            if name not in self.nodes:
+                raise KeyError(f"Node {name} not found")
+            self.drain_node(name)
+            node = self.nodes.pop(name)
+            self._node_index.remove(name)
+            self._emit(DELETED, "Node", name, node)
 
     def get_node(self, name: str) -> Optional[Node]:
         with self._lock:
             return self.nodes.get(name)
 
-    def add_pod(self, spec: PodSpec) -> Pod:
+    def best_fit_node(self, cpu: int, mem: int) -> Optional[Node]:
+        """Return the node the least-requested strategy would pick, or None."""
+        with self._lock:
+            return self._node_index.best_fit(self.nodes, cpu, mem)
+
+    def _release_node_resources(self, pod: Pod) -> None:
+        node = self.nodes.get(pod.status.node_name) if pod.status.node_name else None
+        if node:
+            node.cpu_allocated = max(0, node.cpu_allocated - pod.spec.cpu_request)
+            node.mem_allocated = max(0, node.mem_allocated - pod.spec.mem_request)
+            self._node_index.update(node)
+            self._sched_queue.move_all_to_active()
+            self._emit(MODIFIED, "Node", node.name, node)
+
+    def add_pod(self, spec: PodSpec, name: Optional[str] = None) -> Pod:
+        """Create a pending pod. ``spec`` may be shared with other pods
+        (e.g. a deployment template), in which case ``name`` names this pod.
+        """
         with self._lock:
             uid = self._next_uid()
-            pod = Pod(name=spec.name, spec=spec, uid=uid)
+            pod = Pod(name=name or spec.name, spec=spec, uid=uid)
             self.pods[uid] = pod
+            self._label_index.add(uid, spec.labels)
+            self._sched_queue.add(uid)
+            self._emit(ADDED, "Pod", uid, pod)
             return pod
 
+    def restore_pod(self, pod: Pod, charge: bool = False) -> None:
+        """Insert a pod loaded from a snapshot or database as-is.
+
+        No process is started; pending pods are queued for scheduling. With
+        ``charge`` a pod holding a node (Running or CrashLoopBackOff) is also
+        added to that node's allocation, for stores that don't record it.
+        """
+        with self._lock:
+            self.pods[pod.uid] = pod
+            self._label_index.add(pod.uid, pod.spec.labels)
+            if pod.status.phase == "Pending":
+                self._sched_queue.add(pod.uid)
+            self._sync_pod_endpoints(pod)
+            self._emit(ADDED, "Pod", pod.uid, pod)
+            node = self.nodes.get(pod.status.node_name) if charge and pod.status.node_name else None
+            if node is not None and pod.status.phase in ("Running", "CrashLoopBackOff"):
+                node.cpu_allocated += pod.spec.cpu_request
+                node.mem_allocated += pod.spec.mem_request
+                self._node_index.update(node)
+                self._emit(MODIFIED, "Node", node.name, node)
+
+    def replace_pod(self, pod: Pod) -> None:
+        """Swap in another version of a pod, e.g. one edited in a database.
+
+        Any current version is removed as by ``remove_pod``, stopping its
+        worker, then ``pod`` is restored and charged as by ``restore_pod``.
+        No process is started.
+        """
+        with self._lock:
+            if pod.uid in self.pods:
+                self.remove_pod(pod.uid)
+            self.restore_pod(pod, charge=True)
+
+    def pop_pending_pods(self) -> List[Pod]:
+        """Take every pod that is due a scheduling attempt off the queue."""
+        with self._lock:
+            pending = []
+            for uid in self._sched_queue.pop_all():
+                pod = self.pods.get(uid)
+                if pod is not None and pod.status.phase == "Pending":
+                    pending.append(pod)
+                else:
+                    # gone or no longer waiting: nothing will park or bind it
+                    self._sched_queue.remove(uid)
+            return pending
+
+    def mark_pod_unschedulable(self, uid: str) -> None:
+        """Park a popped pod until cluster capacity changes."""
+        with self._lock:
+            self._sched_queue.mark_unschedulable(uid)
+
     def get_pod(self, uid: str) -> Optional[Pod]:
         with self._lock:
             return self.pods.get(uid)
 
     def remove_pod(self, uid: str) -> None:
+        self.remove_pods([uid])
+
+    def remove_pods(self, uids: List[str]) -> None:
+        """Delete pods and free their node resources immediately.
+
+        Their workers are handed to the termination pipeline as one batch,
+        so this returns without waiting for any process to exit.
+        """
+        procs = []
+        with self._lock:
+            missing = [uid for uid in uids if uid not in self.pods]
+            if missing:
+                raise KeyError(f"Pod {missing[0]} not found")
+            for uid in uids:
+                pod = self.pods.pop(uid)
+                self._sched_queue.remove(uid)
+                self._restarts.cancel(uid)
+                self._crash_streak.pop(uid, None)
+                self._label_index.remove(uid)
+                self._sync_pod_endpoints(pod, removed=True)
+                self._release_node_resources(pod)
+                self._emit(DELETED, "Pod", uid, pod)
+                proc = self._detach_process(uid)
+                if proc is not None:
+                    procs.append(proc)
+        if procs:
+            self._terminator.submit(procs)
+
+    def _detach_process(self, uid: str) -> Optional[subprocess.Popen]:
+        # the caller stops the process, normally via self._terminator
+        proc = self._processes.pop(uid, None)
+        if proc is not None:
+            self._supervisor.unwatch(uid)
+            if self._heartbeats is not None:
+                self._heartbeats.remove(uid)
+        return proc
+
+    def pods_in_phase(self, phase: str) -> List[Pod]:
         with self._lock:
-            pod = self.pods.pop(uid, None)
+            return [self.pods[uid] for uid in self._placement_index.with_phase(phase)]
+
+    def pods_on_node(self, node_name: str) -> List[Pod]:
+        with self._lock:
+            return [self.pods[uid] for uid in self._placement_index.on_node(node_name)]
+
+    def set_node_ready(self, name: str, ready: bool) -> None:
+        with self._lock:
+            node = self.nodes.get(name)
+            if not node:
+                raise KeyError(f"Node {name} not found")
+            node.ready = ready
+            self._node_index.update(node)
+            if ready:
+                self._sched_queue.move_all_to_active()
+            self._emit(MODIFIED, "Node", name, node)
+
+    def update_node(
+        self,
+        name: str,
+        cpu_capacity: Optional[int] = None,
+        mem_capacity: Optional[int] = None,
+        labels: Optional[Dict[str, str]] = None,
+        ready: Optional[bool] = None,
+    ) -> Node:
+        """Change a node's capacity, labels or readiness in place."""
+        with self._lock:
+            node = self.nodes.get(name)
+            if not node:
+                raise KeyError(f"Node {name} not found")
+            if cpu_capacity is not None:
+                node.cpu_capacity = cpu_capacity
+            if mem_capacity is not None:
+                node.mem_capacity = mem_capacity
+            if labels is not None:
+                node.labels = dict(labels)
+            if ready is not None:
+                node.ready = ready
+            self._node_index.update(node)
+            if node.ready:
+                self._sched_queue.move_all_to_active()
+            self._emit(MODIFIED, "Node", name, node)
+            return node
+
+    def drain_node(self, name: str) -> List[str]:
+        """Cordon a node and evict its pods back to Pending for rescheduling.
+
+        Only the pods bound to the node are visited. Returns the evicted uids.
+        """
+        with self._lock:
+            self.set_node_ready(name, False)
+            evicted = self._placement_index.on_node(name)
+            procs = []
+            for uid in evicted:
+                pod = self.pods[uid]
+                proc = self._detach_process(uid)
+                if proc is not None:
+                    procs.append(proc)
+                pod.pid = None
+                self._release_node_resources(pod)
+                pod.status.node_name = None
+                pod.mark_pending()
+                pod.status.message = f"evicted from {name}"
+                self._sync_pod_endpoints(pod)
+                self._sched_queue.add(uid)
+                self._emit(MODIFIED, "Pod", uid, pod)
+        if procs:
+            self._terminator.submit(procs)
+        return evicted
+
+    def set_pod_labels(self, uid: str, labels: Dict[str, str]) -> None:
+        with self._lock:
+            pod = self.pods.get(uid)
             if not pod:
                 raise KeyError(f"Pod {uid} not found")
-            if pod.status.node_name:
-                node = self.nodes.get(pod.status.node_name)
-                if node:
-                    node.cpu_allocated = max(0, node.cpu_allocated - pod.spec.cpu_request)
-                    node.mem_allocated = max(0, node.mem_allocated - pod.spec.mem_request)
-            # ensure any running subprocess is stopped
-            proc = self._processes.pop(uid, None)
-            if proc:
-                try:
-                    proc.terminate()
-                    try:
-                        proc.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                except Exception:
-                    pass
+            # specs may be shared between pods, so copy rather than mutate
+            pod.spec = dataclasses.replace(pod.spec, labels=intern_labels(labels))
+            self._label_index.add(uid, pod.spec.labels)
+            self._sync_pod_endpoints(pod)
+            self._emit(MODIFIED, "Pod", uid, pod)
 
     def bind_pod(self, uid: str, node_name: str) -> None:
         with self._lock:
@@ -95,13 +652,38 @@ class ClusterState:
                 raise ValueError(f"Node {node_name} lacks resources for pod {uid}")
             node.cpu_allocated += pod.spec.cpu_request
             node.mem_allocated += pod.spec.mem_request
+            self._node_index.update(node)
+            self._emit(MODIFIED, "Node", node_name, node)
             pod.status.node_name = node_name
             pod.mark_running()
-            # start a subprocess that simulates the pod workload
-            proc = self._start_pod_process(uid, pod.spec.image)
-            if proc:
+            self._sched_queue.remove(uid)
+            self._sync_pod_endpoints(pod)
+            self._emit(MODIFIED, "Pod", uid, pod)
+        self._attach_worker(pod, node_name)
+
+    def _attach_worker(self, pod: Pod, node_name: str) -> None:
+        # starting the worker is the slow part of a bind, so it happens
+        # outside the lock and the process is attached afterwards
+        uid = pod.uid
+        proc = self._start_pod_process(uid, pod.spec.image, pod.spec.health_check)
+        if proc is None:
+            return
+        with self._lock:
+            if self.pods.get(uid) is pod and pod.status.phase == "Running" and pod.status.node_name == node_name and uid not in self._processes:
                 self._processes[uid] = proc
                 pod.pid = proc.pid
+                pod.status.healthy = True
+                self._supervisor.watch(uid, proc)
+                if self._heartbeats is not None:
+                    self._heartbeats.add(uid, proc, pod.spec.health_check)
+                self._emit(MODIFIED, "Pod", uid, pod)
+                return
+        # the pod was deleted or moved while its worker was starting
+        proc.kill()
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            pass
 
     def mark_pod_failed(self, uid: str, message: str) -> None:
         with self._lock:
@@ -109,12 +691,76 @@ class ClusterState:
             if not pod:
                 raise KeyError(f"Pod {uid} not found")
             pod.mark_failed(message)
+            self._sched_queue.remove(uid)
+            self._sync_pod_endpoints(pod)
+            self._emit(MODIFIED, "Pod", uid, pod)
 
     def add_service(self, service: Service) -> None:
         with self._lock:
             if service.name in self.services:
                 raise ValueError(f"Service {service.name} already exists")
             self.services[service.name] = service
+            self._rebuild_endpoints(service)
+            self._emit(ADDED, "Service", service.name, service)
+
+    def remove_service(self, name: str) -> None:
+        with self._lock:
+            service = self.services.pop(name, None)
+            if not service:
+                raise KeyError(f"Service {name} not found")
+            self._service_selectors.remove(name)
+            self._stale_endpoints.pop(name, None)
+            for uid in self._endpoint_members.pop(name, {}):
+                self._pod_services.get(uid, set()).discard(name)
+            self._emit(DELETED, "Service", name, service)
+
+    def _rebuild_endpoints(self, service: Service) -> None:
+        self._service_selectors.add(service.name, service.selector)
+        members: Dict[str, None] = {}
+        for uid in self._label_index.select(service.selector):
+            if self.pods[uid].status.phase == "Running":
+                members[uid] = None
+                self._pod_services.setdefault(uid, set()).add(service.name)
+        self._endpoint_members[service.name] = members
+        self._stale_endpoints.pop(service.name, None)
+        service.endpoints = list(members)
+
+    def _sync_pod_endpoints(self, pod: Pod, removed: bool = False) -> None:
+        """Move ``pod`` in or out of the endpoints of every service it affects."""
+        current = self._pod_services.pop(pod.uid, set())
+        wanted: Set[str] = set()
+        if not removed and pod.status.phase == "Running":
+            wanted = self._service_selectors.matching(pod.spec.labels)
+        for name in current - wanted:
+            self._endpoint_members[name].pop(pod.uid, None)
+            self._stale_endpoints[name] = None
+        for name in wanted - current:
+            self._endpoint_members[name][pod.uid] = None
+            self._stale_endpoints[name] = None
+        if wanted:
+            self._pod_services[pod.uid] = wanted
+
+    def _flush_endpoints(self) -> None:
+        # callers hold self._lock
+        for name in self._stale_endpoints:
+            service = self.services[name]
+            service.endpoints = list(self._endpoint_members[name])
+            self._emit(MODIFIED, "Service", name, service)
+        self._stale_endpoints.clear()
+
+    def service_endpoints(self, name: str) -> List[str]:
+        """Return the uids of the ready pods behind service ``name``.
+
+        The list is republished rather than mutated, so it stays stable for
+        the caller; the lock is only taken if pods changed since the last read.
+        """
+        if name in self._stale_endpoints:
+            with self._lock:
+                self._flush_endpoints()
+        service = self.services.get(name)
+        if service is None:
+            raise KeyError(f"Service {name} not found")
+        return service.endpoints
 
     def allocate_virtual_ip(self) -> str:
         with self._lock:
@@ -122,83 +768,179 @@ class ClusterState:
             self._vip_counter += 1
             return vip
 
-    def _start_pod_process(self, uid: str, image: str) -> Optional[subprocess.Popen]:
+    def _start_pod_process(self, uid: str, image: str, health_check: Optional[HealthCheck] = None) -> Optional[subprocess.Popen]:
         """Spawn a worker subprocess to simulate the pod workload.
 
         The subprocess runs the package module `kclone.worker` so it is available
-        in the same environment and can be monitored by PID and exit code.
+        in the same environment and can be monitored by PID and exit code. In
+        zygote mode the worker is forked from the zygote instead and the handle
+        returned is a ``ZygoteWorker``, which behaves like ``Popen``. Under the
+        asyncio runtime it is an ``AsyncWorker`` probed with ``health_check``.
         """
         try:
-            cmd = [sys.executable, "-m", "kclone.worker", "--uid", uid, "--image", image]
+            self._start_runtime()
+            if self._aio is not None:
+                return self._aio.spawn(uid, image, health_check)
+            if self.spawn_mode == "zygote":
+                return self._get_zygote().spawn(uid, image)
+            hb_fd = self._heartbeats.write_fd
+            cmd = [sys.executable, "-m", "kclone.worker", "--uid", uid, "--image", image,
+                   "--heartbeat-interval", str(self.heartbeat_interval), "--heartbeat-fd", str(hb_fd)]
             # detach stdout/stderr so it doesn't block; process will live as long as needed
-            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True, env=_worker_env(), pass_fds=(hb_fd,))
             return proc
         except Exception:
             return None
 
-    def _monitor_loop(self) -> None:
-        """Background loop that monitors subprocesses and restarts pods according
-        to their restart policy when they exit unexpectedly.
+    def _start_runtime(self) -> None:
+        with self._runtime_lock:
+            if self._supervisor is not None:
+                return
+            if self._closed:
+                raise RuntimeError("cluster state is closed")
+            if self.runtime == "asyncio":
+                self._aio = AsyncioRuntime(
+                    self._handle_pod_exit,
+                    self._handle_unhealthy,
+                    self.termination_grace_period,
+                    self.heartbeat_interval,
+                    env=_worker_env(),
+                )
+                self._terminator = self._aio
+                self._supervisor = self._aio
+                return
+            # stops removed pods' workers in the background: SIGTERM, then
+            # SIGKILL once the grace period runs out
+            self._terminator = TerminationPipeline(self.termination_grace_period)
+            # workers heartbeat over one shared pipe; enabled health checks
+            # are probed against it
+            self._heartbeats = HeartbeatMonitor(self._handle_unhealthy, self.heartbeat_interval)
+            # reaps worker processes as they exit and applies restart policy
+            self._supervisor = ProcessSupervisor(self._handle_pod_exit)
+
+    def _get_zygote(self) -> Zygote:
+        with self._zygote_lock:
+            if self._zygote is None:
+                self._zygote = Zygote(_worker_env(), self.heartbeat_interval, self._heartbeats.write_fd)
+            return self._zygote
+
+    def _handle_pod_exit(self, uid: str, proc: subprocess.Popen, ret: int) -> None:
+        """Called by the supervisor when a pod's worker process exits.
+
+        Pods the restart policy keeps alive go to CrashLoopBackOff in place:
+        same uid, node resources still reserved, restarted by the restart
+        timer after an exponential backoff. Others are marked failed and
+        release their node.
         """
-        while not self._monitor_stop:
-            time.sleep(1)
-            # snapshot keys to avoid locking for long
-            uids = list(self._processes.keys())
-            for uid in uids:
-                with self._lock:
-                    proc = self._processes.get(uid)
-                    pod = self.pods.get(uid)
-                    if not pod or not proc:
-                        continue
-                    ret = proc.poll()
-                    if ret is None:
-                        # still running; optionally gather resource usage
-                        try:
-                            p = psutil.Process(proc.pid)
-                            # we could store metrics on pod.status if desired
-                            _cpu = p.cpu_percent(interval=0.0)
-                            _mem = p.memory_info().rss
-                        except Exception:
-                            pass
-                        continue
-                    # process exited
-                    # remove mapping and mark pod failed
-                    self._processes.pop(uid, None)
-                    pod.pid = None
-                    pod.mark_failed(f"process exited with code {ret}")
-                    # free node resources
-                    if pod.status.node_name:
-                        node = self.nodes.get(pod.status.node_name)
-                        if node:
-                            node.cpu_allocated = max(0, node.cpu_allocated - pod.spec.cpu_request)
-                            node.mem_allocated = max(0, node.mem_allocated - pod.spec.mem_request)
-                        pod.status.node_name = None
-                    # decide on restart
-                    policy = (pod.spec.restart_policy or "Always")
-                    should_restart = False
-                    if policy == "Always":
-                        should_restart = True
-                    elif policy == "OnFailure" and ret != 0:
-                        should_restart = True
-                    if should_restart:
-                        # create a replacement pod and try to schedule it
-                        spec = pod.spec
-                        # increment restart count
-                        pod.status.restart_count = pod.status.restart_count + 1
-                        new_pod = self.add_pod(spec)
-                        try:
-                            # import scheduler locally to avoid circular import
-                            from .scheduler import schedule_pending_pods
-
-                            schedule_pending_pods(self)
-                        except Exception:
-                            pass
+        with self._lock:
+            pod = self.pods.get(uid)
+            if not pod or self._processes.get(uid) is not proc:
+                # the pod was removed or its process replaced meanwhile
+                return
+            self._processes.pop(uid, None)
+            if self._heartbeats is not None:
+                self._heartbeats.remove(uid)
+            pod.pid = None
+            policy = (pod.spec.restart_policy or "Always")
+            should_restart = policy == "Always" or (policy == "OnFailure" and ret != 0)
+            if not should_restart or not pod.status.node_name:
+                pod.mark_failed(f"process exited with code {ret}")
+                self._sync_pod_endpoints(pod)
+                self._release_node_resources(pod)
+                pod.status.node_name = None
+                self._emit(MODIFIED, "Pod", uid, pod)
+                return
+            ran_for = time.time() - (pod.status.start_time or 0.0)
+            streak = 1 if ran_for >= self.restart_reset_after else self._crash_streak.get(uid, 0) + 1
+            self._crash_streak[uid] = streak
+            delay = backoff_delay(streak, self.restart_backoff, self.max_restart_backoff)
+            pod.status.restart_count += 1
+            pod.mark_crash_loop(f"process exited with code {ret}; restarting in {delay:.1f}s")
+            self._sync_pod_endpoints(pod)
+            self._emit(MODIFIED, "Pod", uid, pod)
+            self._restarts.schedule(uid, delay)
+
+    def _handle_unhealthy(self, uid: str, proc: subprocess.Popen) -> None:
+        """Called when a worker fails its liveness probe: flag the pod and
+        kill the worker, whose exit then goes through the restart policy."""
+        with self._lock:
+            pod = self.pods.get(uid)
+            if not pod or self._processes.get(uid) is not proc:
+                return
+            pod.status.healthy = False
+            pod.status.message = "liveness probe failed"
+            self._emit(MODIFIED, "Pod", uid, pod)
+        proc.kill()
+
+    def _restart_pod(self, uid: str) -> None:
+        """Restart timer callback: start a backed-off pod again on its node,
+        or send it back to the scheduler if that node is gone or not ready."""
+        with self._lock:
+            pod = self.pods.get(uid)
+            if pod is None or pod.status.phase != "CrashLoopBackOff":
+                return
+            node = self.nodes.get(pod.status.node_name)
+            if node is None or not node.ready:
+                self._release_node_resources(pod)
+                pod.status.node_name = None
+                pod.mark_pending()
+                self._sched_queue.add(uid)
+                self._emit(MODIFIED, "Pod", uid, pod)
+            else:
+                pod.mark_running()
+                self._sync_pod_endpoints(pod)
+                self._emit(MODIFIED, "Pod", uid, pod)
+        if node is None or not node.ready:
+            # import scheduler locally to avoid circular import
+            from .scheduler import schedule_pending_pods
+
+            schedule_pending_pods(self)
+        else:
+            self._attach_worker(pod, node.name)
+
+    def close(self) -> None:
+        """Stop background threads once pending terminations finish.
+
+        Running worker processes are left alone, except under the asyncio
+        runtime, which kills them since their pipes belong to its loop.
+        """
+        self._restarts.close()
+        with self._runtime_lock:
+            self._closed = True
+        if self._supervisor is not None:
+            self._supervisor.close()
+            self._terminator.close()
+        if self._heartbeats is not None:
+            self._heartbeats.close()
+        with self._zygote_lock:
+            zygote, self._zygote = self._zygote, None
+        if zygote is not None:
+            zygote.close()
 
     def add_deployment(self, deployment: Deployment) -> None:
         with self._lock:
             if deployment.name in self.deployments:
                 raise ValueError(f"Deployment {deployment.name} already exists")
             self.deployments[deployment.name] = deployment
+            self._emit(ADDED, "Deployment", deployment.name, deployment)
+
+    def scale_deployment(self, name: str, replicas: int) -> Deployment:
+        with self._lock:
+            deployment = self.deployments.get(name)
+            if not deployment:
+                raise KeyError(f"Deployment {name} not found")
+            deployment.replicas = replicas
+            self._emit(MODIFIED, "Deployment", name, deployment)
+            return deployment
+
+    def remove_deployment(self, name: str) -> None:
+        """Delete a deployment; its pods are left for the caller to remove."""
+        with self._lock:
+            deployment = self.deployments.pop(name, None)
+            if not deployment:
+                raise KeyError(f"Deployment {name} not found")
+            self._pod_templates.pop(name, None)
+            self._emit(DELETED, "Deployment", name, deployment)
 
     def restore_counters(self, uid_counter: int, vip_counter: int) -> None:
         with self._lock:
@@ -206,23 +948,25 @@ class ClusterState:
             self._vip_counter = vip_counter
 
     def select_pods(self, selector: Dict[str, str]) -> List[Pod]:
-        def matches(pod: Pod) -> bool:
-            return all(pod.spec.labels.get(k) == v for k, v in selector.items())
-
         with self._lock:
-            return [pod for pod in self.pods.values() if matches(pod)]
+            return [self.pods[uid] for uid in self._label_index.select(selector)]
 
     def refresh_service_endpoints(self) -> None:
+        """Rebuild every service's endpoints from scratch.
+
+        Endpoints are maintained incrementally, so this is only needed to
+        resynchronise after pods or services were changed behind the state's
+        back.
+        """
         with self._lock:
+            self._pod_services.clear()
             for service in self.services.values():
-                matched = [pod for pod in self.pods.values() if all(pod.spec.labels.get(k) == v for k, v in service.selector.items())]
-                service.endpoints = [pod.uid for pod in matched if pod.status.phase == "Running"]
+                self._rebuild_endpoints(service)
+                self._emit(MODIFIED, "Service", service.name, service)
 
     def list_nodes(self) -> List[Node]:
-        with self._lock:
-            return list(self.nodes.values())
+        return list(self.snapshot(wait=True).nodes.values())
 
     def list_pods(self) -> List[Pod]:
-        with self._lock:
-            return list(self.pods.values())
+        return list(self.snapshot(wait=True).pods.values())
 
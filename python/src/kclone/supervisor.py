@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import selectors
+import subprocess
+import threading
+
+ExitCallback = Callable[[str, subprocess.Popen, int], None]
+
+
+class ProcessSupervisor:
+    """Reports pod worker exits as soon as they happen.
+
+    Each watched process gets a pidfd registered with a selector, so the
+    supervisor thread sleeps in ``select`` using no CPU while every worker is
+    alive and wakes within milliseconds of an exit. Where pidfds are not
+    available (non-Linux, Python < 3.9, or a kernel that refuses them) those
+    processes are polled every ``poll_interval`` seconds instead. Handles
+    that report their own exit through ``add_exit_callback`` (workers forked
+    by the zygote, which only the zygote can reap) need neither.
+
+    ``on_exit(uid, proc, returncode)`` runs on the supervisor thread.
+    """
+
+    def __init__(self, on_exit: ExitCallback, poll_interval: float = 1.0) -> None:
+        self._on_exit = on_exit
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._procs: Dict[str, subprocess.Popen] = {}
+        # uid -> pidfd for processes registered with the selector
+        self._pidfds: Dict[str, int] = {}
+        # uids whose process has no pidfd and must be polled
+        self._polled: Dict[str, None] = {}
+        # (op, uid, pidfd) changes for the supervisor thread to apply
+        self._changes: List[Tuple[str, str, int]] = []
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="kclone-supervisor", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._procs)
+
+    def watch(self, uid: str, proc: subprocess.Popen) -> None:
+        add_exit_callback = getattr(proc, "add_exit_callback", None)
+        if add_exit_callback is not None:
+            with self._lock:
+                self._procs[uid] = proc
+            add_exit_callback(lambda: self._exited(uid))
+            return
+        pidfd = self._open_pidfd(proc.pid)
+        with self._lock:
+            self._procs[uid] = proc
+            if pidfd is None:
+                self._polled[uid] = None
+            else:
+                self._changes.append(("add", uid, pidfd))
+        self._wake()
+
+    def unwatch(self, uid: str) -> None:
+        with self._lock:
+            if self._procs.pop(uid, None) is None:
+                return
+            self._polled.pop(uid, None)
+            self._changes.append(("remove", uid, -1))
+        self._wake()
+
+    def _exited(self, uid: str) -> None:
+        with self._lock:
+            self._changes.append(("exited", uid, -1))
+        self._wake()
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake()
+        self._thread.join(timeout=2)
+        wake_r, wake_w, self._wake_r, self._wake_w = self._wake_r, self._wake_w, -1, -1
+        os.close(wake_r)
+        os.close(wake_w)
+
+    @staticmethod
+    def _open_pidfd(pid: int) -> Optional[int]:
+        pidfd_open = getattr(os, "pidfd_open", None)
+        if pidfd_open is None:
+            return None
+        try:
+            return pidfd_open(pid)
+        except OSError:
+            return None
+
+    def _wake(self) -> None:
+        if self._wake_w < 0:
+            return
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _apply_changes(self) -> None:
+        with self._lock:
+            changes, self._changes = self._changes, []
+        for op, uid, pidfd in changes:
+            if op == "exited":
+                self._reap(uid)
+            elif op == "add":
+                if uid in self._pidfds:
+                    self._drop_pidfd(uid)
+                self._selector.register(pidfd, selectors.EVENT_READ, uid)
+                self._pidfds[uid] = pidfd
+            else:
+                self._drop_pidfd(uid)
+
+    def _drop_pidfd(self, uid: str) -> None:
+        pidfd = self._pidfds.pop(uid, None)
+        if pidfd is not None:
+            self._selector.unregister(pidfd)
+            os.close(pidfd)
+
+    def _reap(self, uid: str) -> None:
+        with self._lock:
+            proc = self._procs.get(uid)
+        if proc is None:
+            self._drop_pidfd(uid)
+            return
+        ret = proc.poll()
+        if ret is None:
+            return
+        with self._lock:
+            if self._procs.get(uid) is proc:
+                del self._procs[uid]
+            self._polled.pop(uid, None)
+        self._drop_pidfd(uid)
+        try:
+            self._on_exit(uid, proc, ret)
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while not self._stopped:
+            timeout = self.poll_interval if self._polled else None
+            events = self._selector.select(timeout)
+            self._apply_changes()
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._reap(key.data)
+            with self._lock:
+                polled = list(self._polled)
+            for uid in polled:
+                self._reap(uid)
+        for uid in list(self._pidfds):
+            self._drop_pidfd(uid)
+        self._selector.close()
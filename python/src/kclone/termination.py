@@ -0,0 +1,89 @@
+"""Background termination of pod worker processes."""
+from __future__ import annotations
+
+from typing import Iterable, List, Optional
+import subprocess
+import threading
+import time
+
+
+class TerminationPipeline:
+    """Stops worker processes without making the caller wait for them.
+
+    ``submit`` sends SIGTERM to a whole batch at once and returns. A
+    background thread then waits on every process in flight concurrently;
+    each batch shares one grace deadline, after which its stragglers get
+    SIGKILL. Processes must no longer be watched by anyone else, since the
+    pipeline reaps them.
+    """
+
+    def __init__(self, grace_period: float = 2.0, poll_interval: float = 0.01) -> None:
+        self.grace_period = grace_period
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        # [deadline, proc]; the deadline becomes inf once SIGKILL was sent
+        self._inflight: List[list] = []
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def submit(self, procs: Iterable[subprocess.Popen]) -> None:
+        procs = list(procs)
+        if not procs:
+            return
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        deadline = time.monotonic() + self.grace_period
+        with self._cond:
+            self._inflight.extend([deadline, proc] for proc in procs)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kclone-terminator", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted process has exited."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._inflight, timeout)
+
+    def close(self) -> None:
+        self.join(self.grace_period + 1.0)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._inflight or self._stopped)
+                if self._stopped:
+                    return
+                batch = list(self._inflight)
+            now = time.monotonic()
+            done = set()
+            for entry in batch:
+                deadline, proc = entry
+                try:
+                    if proc.poll() is not None:
+                        done.add(id(entry))
+                        continue
+                    if now >= deadline:
+                        proc.kill()
+                        entry[0] = float("inf")
+                except Exception:
+                    done.add(id(entry))
+            with self._cond:
+                if done:
+                    self._inflight = [e for e in self._inflight if id(e) not in done]
+                    if not self._inflight:
+                        self._cond.notify_all()
+                        continue
+            time.sleep(self.poll_interval)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from threading import Condition
+from typing import Any, List, Optional
+import time
+
+ADDED = "ADDED"
+MODIFIED = "MODIFIED"
+DELETED = "DELETED"
+
+
+@dataclass
+class WatchEvent:
+    type: str  # ADDED, MODIFIED, DELETED
+    kind: str  # Node, Pod, Service, Deployment
+    name: str  # node/service/deployment name or pod uid
+    obj: Any
+    resource_version: int
+
+
+class TooOldResourceVersion(Exception):
+    """The requested version has been evicted from the event log; relist."""
+
+
+class EventLog:
+    """Fixed-size ring buffer of watch events.
+
+    Every event carries the next resource version, so the event for version
+    ``rv`` lives in slot ``rv % capacity`` and reading from any version is a
+    direct index rather than a search. Any number of watchers may read; one
+    that falls more than ``capacity`` events behind gets
+    ``TooOldResourceVersion``.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self._slots: List[Optional[WatchEvent]] = [None] * capacity
+        self._latest = 0
+        self._cond = Condition()
+
+    @property
+    def latest(self) -> int:
+        return self._latest
+
+    def append(self, event: WatchEvent) -> None:
+        with self._cond:
+            if event.resource_version != self._latest + 1:
+                raise ValueError(f"event version {event.resource_version} does not follow {self._latest}")
+            self._slots[event.resource_version % self.capacity] = event
+            self._latest = event.resource_version
+            self._cond.notify_all()
+
+    def since(self, version: int, timeout: Optional[float] = None) -> List[WatchEvent]:
+        """Return events newer than ``version``, waiting up to ``timeout`` for one."""
+        with self._cond:
+            if timeout and self._latest <= version:
+                self._cond.wait_for(lambda: self._latest > version, timeout)
+            if version < self._latest - self.capacity:
+                raise TooOldResourceVersion(f"resource version {version} is too old, relist")
+            return [self._slots[rv % self.capacity] for rv in range(version + 1, self._latest + 1)]
+
+
+class Watcher:
+    """One consumer's cursor into an ``EventLog``, optionally filtered by kind."""
+
+    def __init__(self, log: EventLog, kind: Optional[str], since_version: int) -> None:
+        self._log = log
+        self.kind = kind
+        self.resource_version = since_version
+        self._stopped = False
+
+    def poll(self, timeout: Optional[float] = None) -> List[WatchEvent]:
+        """Return new matching events, waiting up to ``timeout`` seconds.
+
+        Raises ``TooOldResourceVersion`` if events were dropped since the last
+        poll; the consumer should relist and start a new watch.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stopped:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            events = self._log.since(self.resource_version, remaining if remaining is not None else 1.0)
+            if events:
+                self.resource_version = events[-1].resource_version
+                matching = [e for e in events if self.kind is None or e.kind == self.kind]
+                if matching:
+                    return matching
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return []
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def __iter__(self):
+        while not self._stopped:
+            yield from self.poll(timeout=1.0)
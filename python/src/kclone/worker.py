@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+from typing import Optional
 import argparse
+import os
 import time
 import sys
 
 
-def run_worker(uid: str, image: str) -> None:
+def run_worker(uid: str, image: str, heartbeat_interval: float = 5.0, heartbeat_fd: Optional[int] = None) -> None:
     # Very small simulated workload. This keeps the process alive and
     # periodically prints a heartbeat so supervisors can observe liveness.
+    # With heartbeat_fd the heartbeat also goes to the control plane's
+    # shared heartbeat pipe as "<uid>\n".
     print(f"worker starting for pod {uid} image={image}")
     sys.stdout.flush()
+    beat = f"{uid}\n".encode()
     try:
         while True:
             print(f"heartbeat {uid}")
             sys.stdout.flush()
-            time.sleep(5)
+            if heartbeat_fd is not None:
+                try:
+                    os.write(heartbeat_fd, beat)
+                except OSError:
+                    # the control plane went away
+                    heartbeat_fd = None
+            time.sleep(heartbeat_interval)
     except KeyboardInterrupt:
         print(f"worker {uid} shutting down")
         sys.stdout.flush()
@@ -24,8 +35,10 @@ def main() -> None:
     p = argparse.ArgumentParser()
     p.add_argument("--uid", required=True)
     p.add_argument("--image", required=True)
+    p.add_argument("--heartbeat-interval", type=float, default=5.0)
+    p.add_argument("--heartbeat-fd", type=int, default=None)
     args = p.parse_args()
-    run_worker(args.uid, args.image)
+    run_worker(args.uid, args.image, args.heartbeat_interval, args.heartbeat_fd)
 
 
 if __name__ == "__main__":
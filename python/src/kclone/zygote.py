@@ -0,0 +1,229 @@
+"""Fork server that starts pod workers without a fresh interpreter each time.
+
+The zygote is one long-lived ``python -m kclone.zygote`` process that has
+already imported ``kclone.worker``. The control plane sends it one JSON line
+per pod on stdin; it forks, the child runs the worker, and the zygote replies
+with the child's pid. It also reaps its children and reports each exit code,
+so callers get a ``Popen``-like handle for every worker.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+import argparse
+import json
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+
+from .worker import run_worker
+
+
+def _exit_code(status: int) -> int:
+    # same convention as Popen.returncode: -N when killed by signal N
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _write(msg: dict) -> None:
+    # replies go straight to fd 1 so forked children inherit no buffered output
+    os.write(1, (json.dumps(msg) + "\n").encode())
+
+
+def _fork_worker(uid: str, image: str, close_fds: List[int], heartbeat_interval: float, heartbeat_fd: Optional[int]) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        os.setsid()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in close_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        run_worker(uid, image, heartbeat_interval, heartbeat_fd)
+    except BaseException:
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def serve(heartbeat_interval: float = 5.0, heartbeat_fd: Optional[int] = None) -> None:
+    """Zygote main loop: fork workers on request and report their exits."""
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    sel = selectors.DefaultSelector()
+    sel.register(0, selectors.EVENT_READ)
+    sel.register(wake_r, selectors.EVENT_READ)
+    pending = b""
+    while True:
+        for key, _ in sel.select():
+            if key.fd == wake_r:
+                try:
+                    while os.read(wake_r, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                while True:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    _write({"exit": pid, "code": _exit_code(status)})
+                continue
+            data = os.read(0, 65536)
+            if not data:
+                # control plane went away; workers keep running like exec'd ones
+                return
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if not line:
+                    continue
+                req = json.loads(line)
+                try:
+                    pid = _fork_worker(req["uid"], req["image"], [sel.fileno(), wake_r, wake_w], heartbeat_interval, heartbeat_fd)
+                    _write({"uid": req["uid"], "pid": pid})
+                except OSError as e:
+                    _write({"uid": req["uid"], "error": str(e)})
+
+
+class ZygoteWorker:
+    """``Popen``-like handle for a worker forked by the zygote."""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self._exited = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(f"zygote worker {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def add_exit_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if self.returncode is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def _set_exited(self, code: int) -> None:
+        with self._lock:
+            self.returncode = code
+            callbacks, self._callbacks = self._callbacks, []
+        self._exited.set()
+        for callback in callbacks:
+            callback()
+
+
+class Zygote:
+    """Client for a zygote process; ``spawn`` is safe to call from any thread."""
+
+    def __init__(
+        self,
+        env: Optional[Dict[str, str]] = None,
+        heartbeat_interval: float = 5.0,
+        heartbeat_fd: Optional[int] = None,
+    ) -> None:
+        cmd = [sys.executable, "-m", "kclone.zygote", "--heartbeat-interval", str(heartbeat_interval)]
+        if heartbeat_fd is not None:
+            cmd += ["--heartbeat-fd", str(heartbeat_fd)]
+        self._proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+            pass_fds=() if heartbeat_fd is None else (heartbeat_fd,),
+        )
+        self._lock = threading.Lock()
+        # replies arrive in request order; each waiter is [event, worker]
+        self._waiting: Deque[list] = deque()
+        self._workers: Dict[int, ZygoteWorker] = {}
+        self._reader = threading.Thread(target=self._read_loop, name="kclone-zygote", daemon=True)
+        self._reader.start()
+
+    @property
+    def pid(self) -> int:
+        return self._proc.pid
+
+    def spawn(self, uid: str, image: str, timeout: float = 10.0) -> ZygoteWorker:
+        waiter: list = [threading.Event(), None]
+        with self._lock:
+            self._waiting.append(waiter)
+            self._proc.stdin.write((json.dumps({"uid": uid, "image": image}) + "\n").encode())
+            self._proc.stdin.flush()
+        if not waiter[0].wait(timeout) or waiter[1] is None:
+            raise RuntimeError(f"zygote failed to start worker for pod {uid}")
+        return waiter[1]
+
+    def _read_loop(self) -> None:
+        for line in self._proc.stdout:
+            msg = json.loads(line)
+            if "exit" in msg:
+                worker = self._workers.pop(msg["exit"], None)
+                if worker is not None:
+                    worker._set_exited(msg["code"])
+                continue
+            waiter = self._waiting.popleft()
+            if "pid" in msg:
+                worker = ZygoteWorker(msg["pid"])
+                self._workers[worker.pid] = worker
+                waiter[1] = worker
+            waiter[0].set()
+        # zygote is gone: fail outstanding requests
+        while self._waiting:
+            self._waiting.popleft()[0].set()
+
+    def close(self) -> None:
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--heartbeat-interval", type=float, default=5.0)
+    p.add_argument("--heartbeat-fd", type=int, default=None)
+    args = p.parse_args()
+    serve(args.heartbeat_interval, args.heartbeat_fd)
+
+
+if __name__ == "__main__":
+    main()
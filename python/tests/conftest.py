@@ -0,0 +1,35 @@
+import ctypes
+import sys
+
+import psutil
+import pytest
+
+from kclone.state import ClusterState
+
+if sys.platform.startswith("linux"):
+    # PR_SET_CHILD_SUBREAPER: workers orphaned when a zygote exits are
+    # reparented to this process, so the fixture below still finds them
+    ctypes.CDLL(None).prctl(36, 1, 0, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def _reap_workers(monkeypatch):
+    """Stop every ClusterState a test created and kill the workers it left running."""
+    states = []
+    original_init = ClusterState.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        states.append(self)
+
+    monkeypatch.setattr(ClusterState, "__init__", tracking_init)
+    yield
+    for state in states:
+        state.close()
+    children = psutil.Process().children(recursive=True)
+    for child in children:
+        try:
+            child.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(children, timeout=2)
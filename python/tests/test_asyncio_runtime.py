@@ -0,0 +1,51 @@
+import os
+import signal
+import threading
+import time
+
+from kclone.models import HealthCheck, Node, PodSpec
+from kclone.state import ClusterState
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_asyncio_runtime_supervises_workers_with_bounded_threads():
+    state = ClusterState(runtime="asyncio", restart_backoff=0.05)
+    state.add_node(Node(name="n", cpu_capacity=20, mem_capacity=20 * 128))
+    threads_before = threading.active_count()
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="x")) for i in range(20)]
+    for pod in pods:
+        state.bind_pod(pod.uid, "n")
+    assert all(pod.pid for pod in pods)
+    assert threading.active_count() - threads_before <= 2
+
+    crashed = pods[0]
+    first_pid = crashed.pid
+    os.kill(first_pid, signal.SIGKILL)
+    assert _wait_for(lambda: crashed.status.restart_count == 1 and crashed.pid not in (None, first_pid))
+
+    state.remove_pods([pod.uid for pod in pods[1:]])
+    assert state.nodes["n"].cpu_allocated == 1
+    assert state._terminator.join(3)
+    state.close()
+
+
+def test_asyncio_runtime_restarts_workers_that_stop_heartbeating():
+    hc = HealthCheck(enabled=True, period_sec=0.05, timeout_sec=0.1, failure_threshold=2)
+    state = ClusterState(runtime="asyncio", restart_backoff=0.05, heartbeat_interval=0.05)
+    state.add_node(Node(name="n", cpu_capacity=1, mem_capacity=256))
+    pod = state.add_pod(PodSpec(name="p", image="x", health_check=hc))
+    state.bind_pod(pod.uid, "n")
+    assert _wait_for(lambda: pod.status.restart_count == 0 and pod.status.healthy)
+    first_pid = pod.pid
+    time.sleep(0.3)
+    assert pod.pid == first_pid  # heartbeating workers are left alone
+    os.kill(first_pid, signal.SIGSTOP)
+    assert _wait_for(lambda: pod.status.restart_count == 1)
+    assert pod.status.message.startswith("process exited with code -9")
+    state.close()
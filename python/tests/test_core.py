@@ -1,7 +1,13 @@
+import json
+import threading
+
+import pytest
+
 from kclone.controllers import create_deployment, reconcile_deployments
 from kclone.lifecycle import create_pod
 from kclone.models import Node
-from kclone.persistence import load_state, save_state
+from kclone import persistence
+from kclone.persistence import load_state, open_stream, save_state
 from kclone.scheduler import schedule_pending_pods
 from kclone.service import create_service, route_request
 from kclone.state import ClusterState
@@ -54,3 +60,49 @@ def test_state_persistence(tmp_path):
     for uid, pod in loaded.pods.items():
         assert pod.status.phase == state.pods[uid].status.phase
         assert pod.status.node_name == state.pods[uid].status.node_name
+
+
+@pytest.mark.parametrize("name", ["state.json", "state.json.gz", "state.json.xz"])
+def test_state_streams_one_record_per_line(tmp_path, name):
+    state = ClusterState()
+    state.add_node(Node(name="node-a", cpu_capacity=4, mem_capacity=1024))
+    for i in range(3):
+        create_pod(state, f"p{i}", "nginx", 1, 128, labels={"app": "web"})
+    create_service(state, "web", selector={"app": "web"}, port=80, target_port=80)
+    path = tmp_path / name
+    save_state(state, path)
+
+    with open_stream(path) as f:
+        kinds = [json.loads(line)["kind"] for line in f]
+    assert kinds == ["Header", "Node", "Pod", "Pod", "Pod", "Service", "Checksum"]
+    loaded = load_state(path)
+    assert loaded.pods.keys() == state.pods.keys()
+    assert loaded.services["web"].endpoints == state.services["web"].endpoints
+    assert create_pod(loaded, "p3", "nginx", 1, 128, labels={}).uid not in state.pods
+
+
+def test_save_state_lets_writers_run_during_the_export(tmp_path, monkeypatch):
+    state = ClusterState()
+    state.add_node(Node(name="node-a", cpu_capacity=2, mem_capacity=1024))
+    dump_records = persistence.dump_records
+
+    def dump_while_writing(f, tables, *counters):
+        writer = threading.Thread(target=state.add_node, args=(Node(name="node-b", cpu_capacity=1, mem_capacity=1),))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive()
+        dump_records(f, tables, *counters)
+
+    monkeypatch.setattr(persistence, "dump_records", dump_while_writing)
+    path = tmp_path / "state.json"
+    save_state(state, path)
+    # the file holds the version the export started from
+    assert list(load_state(path).nodes) == ["node-a"]
+    assert sorted(state.nodes) == ["node-a", "node-b"]
+
+
+def test_load_state_reads_single_document_json(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps({"uid_counter": 4, "nodes": [{"name": "n", "cpu_capacity": 1, "mem_capacity": 1}]}, indent=2))
+    loaded = load_state(path)
+    assert list(loaded.nodes) == ["n"] and loaded._uid_counter == 4
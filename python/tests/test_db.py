@@ -1,8 +1,29 @@
 from pathlib import Path
+import sqlite3
 
-from kclone.db import init_db, load_state_from_db, save_state_to_db, control_loop_iteration
-from kclone.models import Node
+import pytest
+
+from kclone import db as db_module
+from kclone.db import (
+    MIGRATIONS,
+    SCHEMA,
+    ControlLoop,
+    close_databases,
+    control_loop,
+    control_loop_iteration,
+    get_database,
+    init_db,
+    load_state_from_db,
+    pending_pods,
+    pods_by_label,
+    pods_on_node,
+    query_pods,
+    save_state_to_db,
+    watch_pods,
+)
+from kclone.models import Node, PodSpec, Service
 from kclone.controllers import create_deployment
+from kclone.journal import recover_state
 
 
 def test_db_load_save(tmp_path):
@@ -28,3 +49,295 @@ def test_control_loop_iteration_creates_pods(tmp_path):
     new_state = control_loop_iteration(db)
     pods = [p for p in new_state.list_pods() if p.spec.labels.get("app") == "app"]
     assert len(pods) == 2
+
+
+def test_incremental_save_writes_only_changes(tmp_path):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n1", cpu_capacity=2, mem_capacity=512))
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="nginx", labels={"app": "web"})) for i in range(3)]
+    save_state_to_db(state, db)
+
+    state.set_pod_labels(pods[0].uid, {"app": "api"})
+    state.remove_pod(pods[1].uid)
+    snap, changes = state.take_changes()
+    assert changes["Pod"] == {pods[0].uid: False, pods[1].uid: True} and not changes["Node"]
+    state.restore_changes(changes)
+
+    save_state_to_db(state, db)
+    loaded = load_state_from_db(db)
+    assert sorted(p.uid for p in loaded.list_pods()) == sorted([pods[0].uid, pods[2].uid])
+    assert loaded.get_pod(pods[0].uid).spec.labels == {"app": "api"}
+    assert "n1" in loaded.nodes
+
+    # a failed save keeps the changes for the next attempt
+    state.set_pod_labels(pods[2].uid, {"app": "db"})
+    broken = tmp_path / "broken.db"
+    conn = sqlite3.connect(broken)
+    conn.execute("CREATE TABLE pods (uid TEXT)")  # no unique key to upsert on
+    conn.close()
+    with pytest.raises(sqlite3.OperationalError):
+        save_state_to_db(state, broken)
+    save_state_to_db(state, db)
+    assert load_state_from_db(db).get_pod(pods[2].uid).spec.labels == {"app": "db"}
+
+
+def test_save_to_another_database_writes_everything(tmp_path):
+    a, b, c = (tmp_path / f"{name}.db" for name in "abc")
+    state = load_state_from_db(a)
+    state.add_node(Node(name="n1", cpu_capacity=2, mem_capacity=512))
+    state.add_pod(PodSpec(name="p", image="nginx"))
+    save_state_to_db(state, a)
+
+    # the change set is relative to a.db; other databases get a full save
+    save_state_to_db(load_state_from_db(a), b)
+    save_state_to_db(state, c)
+    for path in (b, c):
+        loaded = load_state_from_db(path)
+        assert "n1" in loaded.nodes and len(loaded.pods) == 1
+    assert state.changes_base == str(c.resolve())
+    close_databases()
+
+
+def test_database_shares_wal_connections_and_reads_during_writes(tmp_path):
+    path = tmp_path / "cluster.db"
+    db = get_database(path)
+    assert get_database(str(path)) is db
+    with db.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM nodes")  # readers are query-only
+
+    state = load_state_from_db(path)
+    state.add_node(Node(name="n1", cpu_capacity=2, mem_capacity=512))
+    save_state_to_db(state, path)
+    with db.writer() as conn:
+        conn.execute("UPDATE nodes SET total_cpu = 8")
+        # uncommitted writes block neither readers nor their view
+        assert load_state_from_db(path).nodes["n1"].cpu_capacity == 2
+    assert load_state_from_db(path).nodes["n1"].cpu_capacity == 8
+    close_databases()
+
+
+def test_control_loop_applies_external_changes_only(tmp_path):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n1", cpu_capacity=4, mem_capacity=2048))
+    create_deployment(state, "web", "nginx", replicas=1, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    save_state_to_db(state, db)
+    state.close()
+
+    loop = ControlLoop(db)
+    assert len(loop.state.list_pods()) == 1
+    assert not loop.step()  # nothing changed: no reconcile, no write
+
+    # another process scales the deployment and adds a node
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("UPDATE replica_sets SET replicas_count = 3 WHERE name = 'web'")
+        conn.execute("INSERT INTO nodes (id, total_cpu, total_ram, status) VALUES ('n2', 2, 512, 'Ready')")
+    assert loop.step()
+    assert "n2" in loop.state.nodes
+    assert len(loop.state.list_pods()) == 3
+    # the loop's own writes are stored but not fed back to it
+    assert conn.execute("SELECT COUNT(*) FROM pods").fetchone()[0] == 3
+    assert not loop.step()
+
+    with conn:
+        conn.execute("DELETE FROM replica_sets")
+        conn.execute("DELETE FROM nodes WHERE id = 'n2'")
+    assert loop.step()
+    assert "web" not in loop.state.deployments and "n2" not in loop.state.nodes
+    conn.close()
+    loop.close()
+    close_databases()
+
+
+def test_control_loop_applies_whole_external_rows(tmp_path):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n1", cpu_capacity=4, mem_capacity=2048))
+    create_deployment(state, "web", "nginx", replicas=1, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    state.add_service(Service(name="web", selector={"app": "web"}, port=80, target_port=80, virtual_ip=state.allocate_virtual_ip()))
+    save_state_to_db(state, db)
+    state.close()
+
+    loop = ControlLoop(db)
+    (pod,) = loop.state.list_pods()
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("UPDATE nodes SET total_cpu = 8, labels = '{\"zone\": \"a\"}'")
+        conn.execute("UPDATE pods SET image = 'busybox', current_status = 'Pending', node_id = NULL")
+        conn.execute("UPDATE services SET port = 8080, selector = '{\"app\": \"api\"}'")
+        conn.execute("UPDATE replica_sets SET pod_template = json_set(pod_template, '$.image', 'httpd')")
+    assert loop.step()
+
+    node = loop.state.nodes["n1"]
+    assert (node.cpu_capacity, node.labels) == (8, {"zone": "a"})
+    assert loop.state.pods[pod.uid].spec.image == "busybox"
+    assert (loop.state.services["web"].port, loop.state.services["web"].selector) == (8080, {"app": "api"})
+    assert loop.state.deployments["web"].image == "httpd"
+    # the edits survive the loop's own save
+    assert conn.execute("SELECT image FROM pods WHERE uid = ?", (pod.uid,)).fetchone()[0] == "busybox"
+    assert conn.execute("SELECT total_cpu, port FROM nodes, services").fetchone() == (8, 8080)
+    conn.close()
+    loop.close()
+    close_databases()
+
+
+def test_control_loop_schedules_pending_pods_when_a_node_appears(tmp_path):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    create_deployment(state, "web", "nginx", replicas=2, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    save_state_to_db(state, db)
+    state.close()
+
+    loop = ControlLoop(db)
+    assert [p.status.phase for p in loop.state.list_pods()] == ["Pending", "Pending"]
+    assert not loop.step()
+
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("INSERT INTO nodes (id, total_cpu, total_ram, status) VALUES ('n1', 4, 1024, 'Ready')")
+    assert loop.step()
+    assert [p.status.node_name for p in loop.state.list_pods()] == ["n1", "n1"]
+    assert conn.execute("SELECT COUNT(*) FROM pods WHERE node_id = 'n1'").fetchone()[0] == 2
+    conn.close()
+    loop.close()
+    close_databases()
+
+
+def test_migration_adds_indexes_and_label_queries(tmp_path):
+    db = tmp_path / "old.db"
+    conn = sqlite3.connect(db)
+    conn.executescript(SCHEMA.split("-- rows written by other processes")[0])
+    conn.execute("INSERT INTO pods (uid, name, node_id, current_status, labels) VALUES ('pod-1', 'a', 'n1', 'Running', '{\"app\": \"web\"}')")
+    conn.commit()
+    conn.close()
+
+    assert get_database(db).schema_version == len(MIGRATIONS)
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n1", cpu_capacity=4, mem_capacity=1024))
+    b = state.add_pod(PodSpec(name="b", image="x", labels={"app": "web", "tier": "be"}))
+    c = state.add_pod(PodSpec(name="c", image="x", labels={"app": "db"}))
+    save_state_to_db(state, db)
+
+    assert [p.uid for p in pods_by_label(db, {"app": "web"})] == ["pod-1", b.uid]
+    assert [p.uid for p in pods_by_label(db, {"app": "web", "tier": "be"})] == [b.uid]
+    assert [p.uid for p in pods_on_node(db, "n1")] == ["pod-1"]
+    assert [p.uid for p in pending_pods(db)] == [b.uid, c.uid]
+    assert [p.uid for p in query_pods(db, {"app": "web"}, phase="Running")] == ["pod-1"]
+
+    state.set_pod_labels(c.uid, {"app": "web"})
+    state.remove_pod(b.uid)
+    save_state_to_db(state, db)
+    assert [p.uid for p in pods_by_label(db, {"app": "web"})] == ["pod-1", c.uid]
+    with get_database(db).reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM pod_labels WHERE uid = ?", (b.uid,)).fetchone()[0] == 0
+        plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN SELECT * FROM pods WHERE node_id = 'n1'"))
+        assert "pods_node_id" in plan
+    close_databases()
+
+
+def test_control_loop_journals_its_changes(tmp_path, monkeypatch):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n1", cpu_capacity=4, mem_capacity=1024))
+    create_deployment(state, "web", "nginx", replicas=2, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    save_state_to_db(state, db)
+    state.close()
+
+    monkeypatch.setattr(ControlLoop, "run", lambda self, interval: self.step())
+    control_loop(db, journal_dir=tmp_path / "journal")
+    recovered = recover_state(tmp_path / "journal")
+    assert sorted(p.status.node_name for p in recovered.pods.values()) == ["n1", "n1"]
+    recovered.close()
+    close_databases()
+
+
+def test_watch_pods_streams_changes_other_processes_commit(tmp_path):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    web = state.add_pod(PodSpec(name="a", image="nginx", labels={"app": "web"}))
+    state.add_pod(PodSpec(name="b", image="nginx", labels={"app": "api"}))
+    save_state_to_db(state, db)
+    state.close()
+
+    listed = query_pods(db, selector={"app": "web"})
+    events = watch_pods(db, listed, selector={"app": "web"}, interval=0.01)
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("INSERT INTO pods (uid, name, image, current_status, labels) VALUES ('pod-9', 'c', 'nginx', 'Pending', '{\"app\": \"web\"}')")
+    # committed between the listing and the watch: still reported
+    event = next(events)
+    assert (event.type, event.name) == ("ADDED", "pod-9")
+
+    with conn:
+        conn.execute("UPDATE pods SET current_status = 'Running', node_id = 'n1' WHERE uid = ?", (web.uid,))
+    event = next(events)
+    assert (event.type, event.name, event.obj.status.phase) == ("MODIFIED", web.uid, "Running")
+
+    with conn:
+        conn.execute("UPDATE pods SET labels = '{\"app\": \"api\"}' WHERE uid = 'pod-9'")
+    event = next(events)
+    assert (event.type, event.name) == ("DELETED", "pod-9")
+    conn.close()
+    close_databases()
+
+
+def test_change_log_is_trimmed_and_a_lagging_loop_rereads_everything(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, "CHANGE_LOG_LIMIT", 2)
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    create_deployment(state, "web", "nginx", replicas=0, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    save_state_to_db(state, db)
+    state.close()
+    loop = ControlLoop(db)
+
+    # CLI commands: each saves one node and trims the log
+    cli_state = load_state_from_db(db)
+    for i in range(5):
+        cli_state.add_node(Node(name=f"n{i}", cpu_capacity=1, mem_capacity=128))
+        save_state_to_db(cli_state, db)
+    cli_state.close()
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 2
+    with conn:
+        conn.execute("DELETE FROM replica_sets")
+    assert loop.step()
+    assert sorted(loop.state.nodes) == [f"n{i}" for i in range(5)]
+    assert "web" not in loop.state.deployments
+    assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+
+    # back in step: only logged rows again
+    with conn:
+        conn.execute("UPDATE nodes SET total_cpu = 2 WHERE id = 'n0'")
+    assert loop.step()
+    assert loop.state.nodes["n0"].cpu_capacity == 2
+    conn.close()
+    loop.close()
+    close_databases()
+
+
+def test_reload_charges_running_pods_to_their_nodes(tmp_path):
+    db = tmp_path / "cluster.db"
+    init_db(db)
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("INSERT INTO nodes (id, total_cpu, total_ram, status) VALUES ('n1', 4, 1024, 'Ready'), ('n2', 4, 1024, 'Ready')")
+        for i in range(2):
+            conn.execute("INSERT INTO pods (uid, name, node_id, image, current_status, cpu_request, mem_request, labels) VALUES (?, ?, 'n1', 'nginx', 'Running', 1, 128, '{}')", (f"pod-{i + 1}", f"p{i}"))
+
+    loop = ControlLoop(db)
+    n1 = loop.state.nodes["n1"]
+    assert (n1.cpu_allocated, n1.mem_allocated) == (2, 256)
+    assert loop.state.nodes["n2"].cpu_allocated == 0
+
+    # the next pod goes to the emptier node, not the first of two "equal" ones
+    with conn:
+        conn.execute("INSERT INTO pods (uid, name, image, current_status, cpu_request, mem_request, labels) VALUES ('pod-9', 'new', 'nginx', 'Pending', 1, 128, '{}')")
+    assert loop.step()
+    assert loop.state.pods["pod-9"].status.node_name == "n2"
+    conn.close()
+    loop.close()
+    close_databases()
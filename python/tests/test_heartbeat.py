@@ -0,0 +1,38 @@
+import os
+import signal
+import time
+
+import pytest
+
+from kclone.lifecycle import health_check_pod
+from kclone.models import HealthCheck, Node, PodSpec
+from kclone.state import ClusterState
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.parametrize("spawn_mode", ["exec", "zygote"])
+def test_workers_heartbeat_and_failed_probes_restart_them(spawn_mode):
+    hc = HealthCheck(enabled=True, period_sec=0.05, timeout_sec=0.1, failure_threshold=2)
+    state = ClusterState(spawn_mode=spawn_mode, restart_backoff=0.05, heartbeat_interval=0.05)
+    state.add_node(Node(name="n", cpu_capacity=2, mem_capacity=512))
+    probed = state.add_pod(PodSpec(name="probed", image="x", health_check=hc))
+    plain = state.add_pod(PodSpec(name="plain", image="x"))
+    state.bind_pod(probed.uid, "n")
+    state.bind_pod(plain.uid, "n")
+    attached = state._heartbeats.last_seen(plain.uid)
+    assert _wait_for(lambda: state._heartbeats.last_seen(plain.uid) > attached)
+    time.sleep(0.3)
+    assert probed.status.restart_count == 0 and health_check_pod(state, probed.uid)
+
+    os.kill(probed.pid, signal.SIGSTOP)
+    os.kill(plain.pid, signal.SIGSTOP)
+    assert _wait_for(lambda: probed.status.restart_count == 1 and probed.status.phase == "Running")
+    assert plain.status.restart_count == 0  # no health check, never probed
+    os.kill(plain.pid, signal.SIGCONT)
+    state.close()
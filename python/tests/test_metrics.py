@@ -0,0 +1,77 @@
+import os
+import time
+
+from kclone.controllers import create_deployment
+from kclone.db import ControlLoop, close_databases, control_loop, load_state_from_db, node_metrics, pod_metrics, save_state_to_db
+from kclone.metrics import MetricsCollector, RingBuffer, read_usage
+from kclone.models import Node, PodSpec
+from kclone.state import ClusterState
+
+
+def test_ring_buffer_keeps_last_values_in_order():
+    ring = RingBuffer(3)
+    assert ring.latest() is None and ring.values() == []
+    for v in range(5):
+        ring.append(v)
+    assert len(ring) == 3
+    assert ring.values() == [2.0, 3.0, 4.0]
+    assert ring.latest() == 4.0
+
+
+def test_read_usage_skips_dead_pids():
+    usage = read_usage([os.getpid(), 2**22 + 1])
+    cpu, rss = usage[os.getpid()]
+    assert cpu > 0 and rss > 0
+    assert len(usage) == 1
+
+
+def test_collector_samples_running_pods_and_rolls_up_nodes():
+    state = ClusterState(spawn_mode="zygote")
+    state.add_node(Node(name="n", cpu_capacity=2, mem_capacity=512))
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="x")) for i in range(2)]
+    for pod in pods:
+        state.bind_pod(pod.uid, "n")
+    collector = MetricsCollector(state, history=4)
+    collector.sample()
+    collector.sample()
+    rows = collector.pod_table()
+    assert sorted(r["uid"] for r in rows) == sorted(p.uid for p in pods)
+    assert all(r["cpu%"] is not None and r["rss_mb"] > 0 for r in rows)
+    (node,) = collector.node_table()
+    assert node["pods"] == 2 and node["rss_mb"] == round(sum(collector.pod(p.uid).rss.latest() for p in pods) / 2**20, 1)
+
+    state.remove_pod(pods[0].uid)
+    collector.sample()
+    assert collector.pod(pods[0].uid) is None
+    state.close()
+
+
+def test_control_loop_publishes_worker_usage_for_top(tmp_path, monkeypatch):
+    db = tmp_path / "cluster.db"
+    state = load_state_from_db(db)
+    state.add_node(Node(name="n", cpu_capacity=2, mem_capacity=512))
+    create_deployment(state, "web", "nginx", replicas=2, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    save_state_to_db(state, db)
+    state.close()
+
+    seen = {}
+
+    def run(self, interval):
+        self.step()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            rows = pod_metrics(db)
+            if len(rows) == 2 and all(r["cpu%"] is not None for r in rows):
+                break
+            time.sleep(0.01)
+        seen["pods"], seen["nodes"] = pod_metrics(db), node_metrics(db)
+
+    monkeypatch.setattr(ControlLoop, "run", run)
+    control_loop(db, metrics_interval=0.01)
+    assert [r["node"] for r in seen["pods"]] == ["n", "n"]
+    assert all(r["cpu%"] is not None and r["rss_mb"] > 0 for r in seen["pods"])
+    (node,) = seen["nodes"]
+    assert node["name"] == "n" and node["pods"] == 2
+    # stale samples go with the loop
+    assert pod_metrics(db) == []
+    close_databases()
@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+
+from kclone.restart import RestartTimer, backoff_delay
+
+
+def test_backoff_doubles_up_to_cap_with_jitter():
+    assert [backoff_delay(n, 10, 300, rand=lambda: 0.5) for n in (1, 2, 3, 6, 20)] == [10, 20, 40, 300, 300]
+    assert backoff_delay(1, 10, 300, rand=lambda: 0.0) == pytest.approx(8.0)
+    assert backoff_delay(1, 10, 300, rand=lambda: 1.0) == pytest.approx(12.0)
+
+
+def test_restart_timer_fires_once_per_key_and_honours_cancel():
+    fired = []
+    done = threading.Event()
+
+    def callback(key):
+        fired.append(key)
+        if key == "last":
+            done.set()
+
+    timer = RestartTimer(callback)
+    timer.schedule("a", 10)
+    timer.schedule("a", 0.01)  # replaces the first deadline
+    timer.schedule("b", 0.01)
+    timer.cancel("b")
+    timer.schedule("last", 0.05)
+    assert done.wait(2)
+    assert fired == ["a", "last"]
+    assert len(timer) == 0
+    timer.close()
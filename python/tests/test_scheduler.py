@@ -0,0 +1,227 @@
+import random
+import time
+
+import pytest
+
+from kclone.framework import PROFILES
+from kclone.index import NodeCapacityIndex
+from kclone.models import Node, Pod, PodSpec
+from kclone.scheduler import choose_node, plan_batch, schedule_pending_pods, schedule_pending_pods_batch
+from kclone.scheduling_queue import SchedulingQueue
+from kclone.state import ClusterState
+
+
+def test_node_index_matches_choose_node():
+    rng = random.Random(7)
+    nodes = {}
+    index = NodeCapacityIndex()
+    for i in range(50):
+        node = Node(name=f"n{i}", cpu_capacity=rng.choice([2, 4, 8]), mem_capacity=rng.choice([512, 1024, 4096]))
+        node.cpu_allocated = rng.randint(0, node.cpu_capacity)
+        node.mem_allocated = rng.randint(0, node.mem_capacity)
+        node.ready = rng.random() > 0.1
+        if rng.random() < 0.1:
+            node.taints = ["dedicated"]
+        nodes[node.name] = node
+        index.update(node)
+
+    for _ in range(200):
+        pod = Pod(name="p", spec=PodSpec(name="p", image="x", cpu_request=rng.randint(0, 4), mem_request=rng.randint(0, 2048)))
+        expected = choose_node(list(nodes.values()), pod)
+        got = index.best_fit(nodes, pod.spec.cpu_request, pod.spec.mem_request)
+        assert got is expected
+        if got is not None:
+            got.cpu_allocated += pod.spec.cpu_request
+            got.mem_allocated += pod.spec.mem_request
+            index.update(got)
+
+
+def test_removed_and_readded_node_ties_after_the_others():
+    state = ClusterState()
+    for name in ("a", "b", "c"):
+        state.add_node(Node(name=name, cpu_capacity=2, mem_capacity=512))
+    state.snapshot(wait=True)
+    # a goes away and comes back within one publish: it is now the newest node
+    state.remove_node("a")
+    state.add_node(Node(name="a", cpu_capacity=2, mem_capacity=512))
+
+    assert list(state.nodes) == ["b", "c", "a"]
+    assert [n.name for n in state.list_nodes()] == ["b", "c", "a"]
+    pod = Pod(name="p", spec=PodSpec(name="p", image="x", cpu_request=1, mem_request=64))
+    expected = choose_node(list(state.nodes.values()), pod)
+    assert expected.name == "b"
+    assert state.best_fit_node(1, 64) is expected
+
+
+class CountingDict(dict):
+    lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+def test_node_index_skips_nodes_that_cannot_fit():
+    # worst case for a walk in score order: every node outscores the one
+    # that fits, but has no memory left
+    nodes = CountingDict()
+    index = NodeCapacityIndex()
+    for i in range(5000):
+        node = Node(name=f"full{i}", cpu_capacity=8 + i % 8, mem_capacity=4096, mem_allocated=4096)
+        nodes[node.name] = node
+        index.update(node)
+    spare = nodes["spare"] = Node(name="spare", cpu_capacity=1, mem_capacity=1024)
+    index.update(spare)
+
+    assert index.best_fit(nodes, 1, 512) is spare
+    assert nodes.lookups == 1
+    for node in list(nodes.values())[:4000]:
+        node.mem_allocated = 0
+        index.update(node)
+    assert len(index) == 5001
+    assert index.best_fit(nodes, 1, 512).name == "full7"
+    assert nodes.lookups == 2
+
+
+def test_batch_plan_matches_sequential_placement():
+    pytest.importorskip("numpy")
+    rng = random.Random(11)
+    nodes = [Node(name=f"n{i}", cpu_capacity=rng.choice([2, 4, 8]), mem_capacity=rng.choice([512, 2048])) for i in range(20)]
+    nodes[3].ready = False
+    nodes[5].taints = ["gpu"]
+    pods = [Pod(name=f"p{i}", spec=PodSpec(name=f"p{i}", image="x", cpu_request=rng.randint(1, 3), mem_request=rng.choice([64, 256, 1024]))) for i in range(80)]
+
+    plan = [(pod.name, node.name) for pod, node in plan_batch(nodes, pods)]
+
+    expected = []
+    for pod in pods:
+        node = choose_node(nodes, pod)
+        if node:
+            node.cpu_allocated += pod.spec.cpu_request
+            node.mem_allocated += pod.spec.mem_request
+            expected.append((pod.name, node.name))
+    assert plan == expected
+
+
+def test_batch_scheduling_places_mixed_batches_like_the_sequential_scheduler():
+    pytest.importorskip("numpy")
+
+    def build():
+        rng = random.Random(5)
+        state = ClusterState(spawn_mode="zygote")
+        for i in range(8):
+            node = Node(name=f"n{i}", cpu_capacity=rng.choice([2, 4]), mem_capacity=rng.choice([512, 2048]), labels={"zone": rng.choice("ab")})
+            if i % 4 == 0:
+                node.taints = ["gpu"]
+            state.add_node(node)
+        for i in range(30):
+            spec = PodSpec(name=f"p{i}", image="x", cpu_request=rng.randint(1, 2), mem_request=rng.choice([64, 256]))
+            if i % 3 == 0:
+                spec.tolerations = ["gpu"]
+            if i % 4 == 0:
+                spec.node_selector = {"zone": "a"}
+            state.add_pod(spec)
+        return state
+
+    sequential, batched = build(), build()
+    schedule_pending_pods(sequential)
+    schedule_pending_pods_batch(batched)
+    placements = [{p.name: (p.status.phase, p.status.node_name) for p in s.list_pods()} for s in (sequential, batched)]
+    assert placements[0] == placements[1]
+    assert any(phase == "Pending" for phase, _ in placements[0].values())
+    sequential.close()
+    batched.close()
+
+
+def test_constrained_scheduling_cost_does_not_grow_with_pod_count():
+    def schedule_constrained(existing):
+        state = ClusterState()
+        state._start_pod_process = lambda *args: None  # time placement, not workers
+        for i in range(10):
+            state.add_node(Node(name=f"n{i}", cpu_capacity=10**6, mem_capacity=10**9, taints=["gpu"] if i % 2 else []))
+        for i in range(existing):
+            state.add_pod(PodSpec(name=f"big{i}", image="x", cpu_request=10**7))
+        schedule_pending_pods(state)  # parks them all
+        for i in range(300):
+            state.add_pod(PodSpec(name=f"p{i}", image="x", tolerations=["gpu"]))
+        state.snapshot(wait=True)
+        start = time.perf_counter()
+        schedule_pending_pods(state)
+        elapsed = time.perf_counter() - start
+        assert len(state.pods_in_phase("Running")) == 300
+        state.close()
+        return elapsed
+
+    small = min(schedule_constrained(0) for _ in range(2))
+    large = min(schedule_constrained(20000) for _ in range(2))
+    # every placement lists the nodes; publishing that snapshot must not
+    # copy the 20k-pod table each time
+    assert large < 3 * small + 0.05
+
+
+def test_framework_profiles_and_timings():
+    big = Node(name="big", cpu_capacity=8, mem_capacity=8192, labels={"disk": "ssd"})
+    small = Node(name="small", cpu_capacity=4, mem_capacity=4096)
+    small.cpu_allocated = 2
+    tainted = Node(name="gpu", cpu_capacity=16, mem_capacity=16384, taints=["gpu"])
+    nodes = [big, small, tainted]
+    pod = Pod(name="p", spec=PodSpec(name="p", image="x", cpu_request=1, mem_request=128))
+
+    assert choose_node(nodes, pod) is big
+    binpack = PROFILES["binpack"]()
+    assert binpack.choose(pod, nodes) is small
+    assert {"NodeReady", "TaintToleration", "NodeSelector", "NodeResourcesFit", "MostAllocated"} <= set(binpack.timings)
+    assert all(t.calls == 1 for t in binpack.timings.values())
+
+    tolerant = Pod(name="t", spec=PodSpec(name="t", image="x", tolerations=["gpu"]))
+    assert choose_node(nodes, tolerant) is tainted
+    pinned = Pod(name="s", spec=PodSpec(name="s", image="x", node_selector={"disk": "ssd"}))
+    assert binpack.choose(pinned, nodes) is big
+
+
+def test_scheduling_queue_backoff_and_requeue():
+    now = [0.0]
+    q = SchedulingQueue(initial_backoff=1.0, max_backoff=4.0, clock=lambda: now[0])
+    q.add("a")
+    q.add("b")
+    assert q.pop_all() == ["a", "b"]
+    q.mark_unschedulable("a")
+    q.mark_unschedulable("b")
+    assert q.pop_all() == []
+    assert q.counts()["unschedulable"] == 2
+
+    # first retry after a capacity event is immediate
+    q.move_all_to_active()
+    assert q.pop_all() == ["a", "b"]
+    q.mark_unschedulable("a")
+    q.move_all_to_active()
+    # second failure backs off for initial_backoff
+    assert q.pop_all() == []
+    now[0] = 1.0
+    assert q.pop_all() == ["a"]
+
+    q.remove("b")
+    assert "b" not in q
+
+
+def test_popping_drops_pods_that_stopped_waiting():
+    state = ClusterState()
+    waiting, finished = (state.add_pod(PodSpec(name=n, image="x", cpu_request=2)) for n in ("w", "f"))
+    finished.status.phase = "Succeeded"  # e.g. restored from a store
+    assert state.pop_pending_pods() == [waiting]
+    assert finished.uid not in state._sched_queue
+    state.mark_pod_unschedulable(waiting.uid)
+    state.remove_pod(waiting.uid)
+    assert len(state._sched_queue) == 0 and not state._sched_queue._seq
+
+
+def test_unschedulable_pod_waits_for_node_add():
+    state = ClusterState()
+    pod = state.add_pod(PodSpec(name="p", image="x", cpu_request=2))
+    schedule_pending_pods(state)
+    assert pod.status.phase == "Pending"
+    assert state.pop_pending_pods() == []
+    state.add_node(Node(name="n", cpu_capacity=4, mem_capacity=1024))
+    schedule_pending_pods(state)
+    assert pod.status.node_name == "n"
+    state.remove_pod(pod.uid)
@@ -0,0 +1,82 @@
+import gzip
+import time
+
+import pytest
+
+from kclone.models import HealthCheck, Node, PodSpec, Service
+from kclone.persistence import ChecksumError, load_state, save_state
+from kclone.snapshot import Snapshotter, SnapshotFormatError, open_snapshot
+from kclone.controllers import create_deployment
+from kclone.state import ClusterState
+
+
+def _cluster() -> ClusterState:
+    state = ClusterState()
+    state.add_node(Node(name="n1", cpu_capacity=4, mem_capacity=1024, labels={"zone": "a"}, taints=["gpu"]))
+    state.add_node(Node(name="n0", cpu_capacity=2, mem_capacity=512))
+    hc = HealthCheck(enabled=True, period_sec=3)
+    for i in range(50):
+        spec = PodSpec(name="web", image="nginx", labels={"app": "web"}, health_check=hc if i % 2 else HealthCheck(), tolerations=["gpu"])
+        state.add_pod(spec, name=f"web-{i}")
+    state.bind_pod("pod-7", "n1")
+    state.add_service(Service(name="web", selector={"app": "web"}, port=80, target_port=8080, virtual_ip=state.allocate_virtual_ip()))
+    create_deployment(state, "api", "api:1", replicas=0, selector={"app": "api"}, labels={"app": "api"}, cpu_request=1, mem_request=64)
+    return state
+
+
+def test_binary_snapshot_round_trips_and_decodes_lazily(tmp_path):
+    state = _cluster()
+    path = tmp_path / "cluster.snap"
+    save_state(state, path)
+    snap = state.snapshot()
+
+    with open_snapshot(path) as f:
+        view = f.snapshot()
+        assert view.resource_version == snap.resource_version
+        assert len(view.pods) == 50 and list(view.pods) == list(snap.pods)
+        pod = view.pods["pod-7"]
+        assert pod.status.node_name == "n1" and pod.status.phase == snap.pods["pod-7"].status.phase
+        assert pod.spec == snap.pods["pod-7"].spec
+        assert "pod-51" not in view.pods
+        with pytest.raises(KeyError):
+            view.pods["pod-51"]
+        assert view.nodes["n1"].taints == ["gpu"] and view.nodes["n1"].cpu_allocated == 1
+        assert [p.uid for p in view.pods.values()] == list(snap.pods)
+
+    loaded = load_state(path)
+    assert sorted(loaded.pods) == sorted(snap.pods)
+    assert loaded.services["web"].virtual_ip == snap.services["web"].virtual_ip
+    assert "api" in loaded.deployments
+    assert loaded.add_pod(PodSpec(name="x", image="x")).uid == "pod-51"
+
+
+def test_open_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.snap"
+    path.write_bytes(b"{}" * 100)
+    with pytest.raises(SnapshotFormatError):
+        open_snapshot(path)
+
+
+@pytest.mark.parametrize("name", ["cluster.snap", "cluster.json.gz"])
+def test_snapshotter_writes_atomically_and_verifies_checksum(tmp_path, name):
+    state = _cluster()
+    path = tmp_path / name
+    snapshotter = Snapshotter(state, path, interval=0.01)
+    snapshotter.start()
+    deadline = time.monotonic() + 5
+    while snapshotter.saved_version != state.resource_version and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(load_state(path).pods) == sorted(state.pods)
+
+    state.remove_pod("pod-3")
+    snapshotter.stop()  # writes a final snapshot
+    assert not snapshotter.save()  # nothing changed since
+    assert "pod-3" not in load_state(path).pods
+    assert [p.name for p in tmp_path.iterdir()] == [name]  # no temp files left
+
+    # flip one byte in the payload
+    data = bytearray(path.read_bytes() if name.endswith(".snap") else gzip.decompress(path.read_bytes()))
+    data[len(data) // 2] ^= 0x20
+    path.write_bytes(bytes(data) if name.endswith(".snap") else gzip.compress(bytes(data)))
+    with pytest.raises(ChecksumError):
+        load_state(path)
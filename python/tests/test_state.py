@@ -0,0 +1,273 @@
+import os
+import random
+import signal
+import threading
+import time
+
+import psutil
+
+from kclone.controllers import create_deployment, reconcile_deployments
+from kclone.models import DEFAULT_HEALTH_CHECK, Node, PodSpec, Service
+from kclone.scheduler import schedule_pending_pods
+from kclone.state import _GONE, ClusterState, _SnapshotTable
+
+
+def test_select_pods_uses_label_index():
+    state = ClusterState()
+    a = state.add_pod(PodSpec(name="a", image="x", labels={"app": "web", "tier": "fe"}))
+    b = state.add_pod(PodSpec(name="b", image="x", labels={"app": "web", "tier": "be"}))
+    c = state.add_pod(PodSpec(name="c", image="x", labels={"app": "db"}))
+
+    assert [p.uid for p in state.select_pods({"app": "web"})] == [a.uid, b.uid]
+    assert [p.uid for p in state.select_pods({"app": "web", "tier": "be"})] == [b.uid]
+    assert state.select_pods({"app": "missing"}) == []
+    assert [p.uid for p in state.select_pods({})] == [a.uid, b.uid, c.uid]
+
+    state.set_pod_labels(c.uid, {"app": "web", "tier": "be"})
+    assert [p.uid for p in state.select_pods({"tier": "be"})] == [b.uid, c.uid]
+    state.remove_pod(b.uid)
+    assert [p.uid for p in state.select_pods({"app": "web"})] == [a.uid, c.uid]
+
+
+def test_service_endpoints_follow_pod_changes():
+    state = ClusterState()
+    state.add_node(Node(name="n", cpu_capacity=4, mem_capacity=1024))
+    a = state.add_pod(PodSpec(name="a", image="x", labels={"app": "web"}))
+    b = state.add_pod(PodSpec(name="b", image="x", labels={"app": "web"}))
+    state.add_service(Service(name="web", selector={"app": "web"}, port=80, target_port=80, virtual_ip="10.96.0.1"))
+    assert state.services["web"].endpoints == []
+
+    state.bind_pod(a.uid, "n")
+    state.bind_pod(b.uid, "n")
+    published = state.service_endpoints("web")
+    assert published == [a.uid, b.uid]
+
+    state.set_pod_labels(a.uid, {"app": "api"})
+    assert state.service_endpoints("web") == [b.uid]
+    assert published == [a.uid, b.uid]  # earlier readers keep a stable list
+    state.mark_pod_failed(b.uid, "boom")
+    assert state.snapshot().services["web"].endpoints == []
+    for uid in (a.uid, b.uid):
+        state.remove_pod(uid)
+
+
+def test_snapshot_is_isolated_and_never_blocks():
+    state = ClusterState()
+    a = state.add_pod(PodSpec(name="a", image="x", labels={"app": "web"}))
+    snap = state.snapshot()
+    assert snap.resource_version == state.resource_version
+    assert list(snap.pods) == [a.uid]
+
+    state.set_pod_labels(a.uid, {"app": "api"})
+    b = state.add_pod(PodSpec(name="b", image="x"))
+    assert snap.pods[a.uid].spec.labels == {"app": "web"}
+    assert b.uid not in snap.pods
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with state._lock:
+            state.remove_pod(b.uid)
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    held.wait(5)
+    stale = state.snapshot()  # writer holds the lock: served the last version
+    assert stale is snap
+    listed = []
+    reader = threading.Thread(target=lambda: listed.extend(state.list_pods()))
+    reader.start()  # waits for the writer instead
+    release.set()
+    t.join()
+    reader.join()
+    assert [p.uid for p in listed] == [a.uid]
+    fresh = state.snapshot()
+    assert list(fresh.pods) == [a.uid]
+    assert fresh.pods[a.uid].spec.labels == {"app": "api"}
+    # the immutable spec is shared, the mutable status copied
+    live = state.pods[a.uid]
+    assert fresh.pods[a.uid].spec is live.spec and fresh.pods[a.uid].status is not live.status
+
+
+def test_snapshot_tables_publish_only_changes_and_read_like_a_dict():
+    rng = random.Random(3)
+    table, expected, versions = _SnapshotTable({}), {}, []
+    for step in range(300):
+        changes = {f"k{rng.randint(0, 30)}": (_GONE if rng.random() < 0.3 else step) for _ in range(rng.choice([1, 1, 3, 12]))}
+        for key, value in changes.items():
+            if value is _GONE:
+                expected.pop(key, None)
+            else:
+                expected[key] = value
+        table = table.updated(changes)
+        versions.append((table, dict(expected)))
+        if step % 7 == 0:
+            list(table)
+        assert len(table._layers) < 12
+        assert len(table) == len(expected)
+        assert all(table.get(f"k{i}") == expected.get(f"k{i}") for i in range(31))
+    # older versions are untouched, and iterate in dict order
+    for old, contents in versions:
+        assert list(old.items()) == list(contents.items())
+
+
+def test_endpoints_are_republished_once_per_read():
+    state = ClusterState()
+    state._start_pod_process = lambda *args: None
+    state.add_node(Node(name="n", cpu_capacity=10**6, mem_capacity=10**9))
+    state.add_service(Service(name="web", selector={"app": "web"}, port=80, target_port=80, virtual_ip="10.96.0.1"))
+    watcher = state.watch("Service")
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="x", labels={"app": "web"})) for i in range(500)]
+    schedule_pending_pods(state)
+    assert watcher.poll(0) == []  # no event, and no list copy, per bind
+    assert state.service_endpoints("web") == [p.uid for p in pods]
+    (event,) = watcher.poll(0)
+    assert event.obj.endpoints == [p.uid for p in pods]
+    state.remove_pod(pods[0].uid)
+    assert len(state.snapshot().services["web"].endpoints) == 499
+    assert len(watcher.poll(0)) == 1
+
+
+def test_replicas_share_template_spec_until_relabelled():
+    state = ClusterState()
+    create_deployment(state, "web", "nginx", replicas=2, selector={"app": "web"}, labels={"app": "web"}, cpu_request=1, mem_request=128)
+    reconcile_deployments(state)
+    a, b = state.select_pods({"app": "web"})
+    assert a.spec is b.spec and a.name != b.name
+    assert not hasattr(a, "__dict__") and not hasattr(a.spec, "__dict__")
+    assert a.spec.health_check is DEFAULT_HEALTH_CHECK
+
+    state.set_pod_labels(a.uid, {"app": "web", "canary": "yes"})
+    assert b.spec.labels == {"app": "web"}
+    assert [p.uid for p in state.select_pods({"canary": "yes"})] == [a.uid]
+
+    # the template lives in the state, and goes with its deployment
+    assert state._pod_templates["web"][1] is b.spec
+    assert "web" not in ClusterState()._pod_templates
+    state.remove_deployment("web")
+    assert "web" not in state._pod_templates
+
+
+def test_phase_and_node_indexes_drive_drain():
+    state = ClusterState()
+    state.add_node(Node(name="a", cpu_capacity=2, mem_capacity=1024))
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="x")) for i in range(3)]
+    assert [p.uid for p in state.pods_in_phase("Pending")] == [p.uid for p in pods]
+    state.bind_pod(pods[0].uid, "a")
+    state.bind_pod(pods[1].uid, "a")
+    assert [p.uid for p in state.pods_on_node("a")] == [pods[0].uid, pods[1].uid]
+    assert [p.uid for p in state.pods_in_phase("Running")] == [pods[0].uid, pods[1].uid]
+
+    state.add_node(Node(name="b", cpu_capacity=4, mem_capacity=1024))
+    evicted = state.drain_node("a")
+    assert evicted == [pods[0].uid, pods[1].uid]
+    assert state.pods_on_node("a") == []
+    assert state.nodes["a"].cpu_allocated == 0
+    schedule_pending_pods(state)
+    assert {p.uid for p in state.pods_on_node("b")} == {p.uid for p in pods}
+    assert state.pods_in_phase("Pending") == []
+    for p in pods:
+        state.remove_pod(p.uid)
+    assert state.pods_on_node("b") == [] and state.pods_in_phase("Running") == []
+
+
+def test_worker_runtime_starts_with_the_first_worker():
+    threads = threading.active_count()
+    states = [ClusterState() for _ in range(50)]
+    for state in states:
+        state.add_node(Node(name="n", cpu_capacity=1, mem_capacity=256))
+        state.add_pod(PodSpec(name="p", image="x"))
+    assert threading.active_count() == threads
+    assert all(state._supervisor is None and state._heartbeats is None for state in states)
+
+    state = states[0]
+    schedule_pending_pods(state)
+    assert state._supervisor is not None and state._heartbeats is not None
+    assert threading.active_count() > threads
+    state.close()
+
+
+def test_supervisor_reacts_to_worker_exit_quickly():
+    state = ClusterState()
+    state.add_node(Node(name="n", cpu_capacity=1, mem_capacity=256))
+    pod = state.add_pod(PodSpec(name="p", image="x", restart_policy="Never"))
+    state.bind_pod(pod.uid, "n")
+    assert pod.pid is not None
+    os.kill(pod.pid, signal.SIGKILL)
+    start = time.monotonic()
+    while pod.status.phase != "Failed" and time.monotonic() - start < 2:
+        time.sleep(0.005)
+    assert pod.status.phase == "Failed"
+    assert time.monotonic() - start < 0.5
+    assert state.nodes["n"].cpu_allocated == 0
+    state.close()
+
+
+def test_zygote_mode_forks_workers_and_reports_exits():
+    state = ClusterState(spawn_mode="zygote")
+    state.add_node(Node(name="n", cpu_capacity=2, mem_capacity=512))
+    a = state.add_pod(PodSpec(name="a", image="x", restart_policy="Never"))
+    b = state.add_pod(PodSpec(name="b", image="x", restart_policy="Never"))
+    state.bind_pod(a.uid, "n")
+    state.bind_pod(b.uid, "n")
+    zygote_pid = state._zygote.pid
+    for pod in (a, b):
+        assert psutil.Process(pod.pid).ppid() == zygote_pid
+    os.kill(a.pid, signal.SIGKILL)
+    start = time.monotonic()
+    while a.status.phase != "Failed" and time.monotonic() - start < 2:
+        time.sleep(0.005)
+    assert a.status.message == f"process exited with code {-signal.SIGKILL}"
+    assert state.nodes["n"].cpu_allocated == 1
+    state.remove_pod(b.uid)
+    assert state._terminator.join(2)
+    assert not psutil.pid_exists(b.pid)
+    state.close()
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_crashed_pod_restarts_in_place_with_backoff():
+    state = ClusterState(spawn_mode="zygote", restart_backoff=0.05)
+    state.add_node(Node(name="n", cpu_capacity=1, mem_capacity=256))
+    pod = state.add_pod(PodSpec(name="p", image="x"))
+    state.bind_pod(pod.uid, "n")
+    first_pid = pod.pid
+    os.kill(first_pid, signal.SIGKILL)
+    assert _wait_for(lambda: pod.status.phase == "CrashLoopBackOff")
+    assert state.nodes["n"].cpu_allocated == 1
+    assert _wait_for(lambda: pod.pid is not None)
+    assert pod.status.phase == "Running" and pod.status.restart_count == 1
+    assert pod.pid != first_pid and list(state.pods) == [pod.uid]
+
+    os.kill(pod.pid, signal.SIGKILL)
+    assert _wait_for(lambda: pod.status.restart_count == 2)
+    assert "restarting in 0.1s" in pod.status.message
+    state.remove_pod(pod.uid)
+    assert pod.uid not in state._restarts
+    state.close()
+
+
+def test_scale_down_releases_capacity_and_terminates_in_background():
+    state = ClusterState(spawn_mode="zygote", termination_grace_period=0.2)
+    state.add_node(Node(name="n", cpu_capacity=4, mem_capacity=1024))
+    pods = [state.add_pod(PodSpec(name=f"p{i}", image="x")) for i in range(4)]
+    for pod in pods:
+        state.bind_pod(pod.uid, "n")
+    os.kill(pods[0].pid, signal.SIGSTOP)  # ignores SIGTERM until killed
+    start = time.monotonic()
+    state.remove_pods([pod.uid for pod in pods])
+    assert time.monotonic() - start < 0.1
+    assert state.nodes["n"].cpu_allocated == 0 and state.pods == {}
+    assert len(state._terminator) >= 1  # the stopped worker waits for SIGKILL
+    assert state._terminator.join(2)
+    assert not any(psutil.pid_exists(pod.pid) for pod in pods)
+    state.close()
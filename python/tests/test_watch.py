@@ -0,0 +1,42 @@
+import pytest
+
+from kclone.controllers import DeploymentController, create_deployment
+from kclone.models import Node, PodSpec
+from kclone.state import ClusterState
+from kclone.watch import ADDED, DELETED, MODIFIED, EventLog, TooOldResourceVersion, Watcher, WatchEvent
+
+
+def test_watch_delivers_versioned_events_per_kind():
+    state = ClusterState()
+    pods = state.watch("Pod")
+    everything = state.watch()
+    pod = state.add_pod(PodSpec(name="p", image="x"))
+    state.add_node(Node(name="n", cpu_capacity=1, mem_capacity=256))
+    state.remove_pod(pod.uid)
+
+    events = pods.poll(timeout=0)
+    assert [(e.type, e.name) for e in events] == [(ADDED, pod.uid), (DELETED, pod.uid)]
+    assert [e.kind for e in everything.poll(timeout=0)] == ["Pod", "Node", "Pod"]
+    assert events[0].resource_version < events[1].resource_version == state.resource_version
+    assert pods.poll(timeout=0) == []
+
+
+def test_lagging_watcher_must_relist():
+    log = EventLog(capacity=4)
+    watcher = Watcher(log, None, 0)
+    for rv in range(1, 7):
+        log.append(WatchEvent(MODIFIED, "Pod", "p", None, rv))
+    with pytest.raises(TooOldResourceVersion):
+        watcher.poll(timeout=0)
+    assert [e.resource_version for e in Watcher(log, None, 2).poll(timeout=0)] == [3, 4, 5, 6]
+
+
+def test_deployment_controller_reacts_to_deltas():
+    state = ClusterState()
+    create_deployment(state, "api", "nginx", replicas=2, selector={"app": "api"}, labels={"app": "api"}, cpu_request=1, mem_request=128)
+    controller = DeploymentController(state)
+    assert len(state.select_pods({"app": "api"})) == 2
+    assert controller.sync() == set()
+    state.scale_deployment("api", 3)
+    assert controller.sync() == {"api"}
+    assert len(state.select_pods({"app": "api"})) == 3